@@ -1,7 +1,10 @@
-from flask import Flask, jsonify
+import click
+from flask import Flask
+from flask.cli import AppGroup
 from flask_cors import CORS
 from config import Config
 from .extensions import db, migrate, login_manager
+from .serializers import json_response
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -26,19 +29,19 @@ def create_app(config_class=Config):
     
     # Import models to ensure they are registered with SQLAlchemy
     from . import models
+    from .identity import load_identity
     
     with app.app_context():
-        # Enable foreign key support for SQLite
-        if 'sqlite' in app.config['SQLALCHEMY_DATABASE_URI']:
-            def _fk_pragma_on_connect(dbapi_con, con_record):
-                dbapi_con.execute('pragma foreign_keys=ON')
-            
-            from sqlalchemy import event, text
-            event.listen(db.engine, 'connect', _fk_pragma_on_connect)
-            
-            # Ensure foreign keys are enabled for the current connection
-            db.session.execute(text('PRAGMA foreign_keys=ON'))
-            db.session.commit()
+        # Enable foreign keys and the configured performance profile for SQLite
+        from .database import configure_sqlite, init_routing
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                configure_sqlite(app, engine)
+        init_routing(app, db)
+        
+        # Opt-in query counts, Server-Timing and slow-query log
+        from .instrumentation import init_instrumentation
+        init_instrumentation(app, db)
         
         # Create or upgrade database
         db.create_all()
@@ -47,15 +50,29 @@ def create_app(config_class=Config):
             models.update_existing_timestamps()
         except Exception as e:
             print(f"Note: Could not update timestamps: {e}")
+        
+        # Backfill the balance ledger for databases that predate it
+        from . import ledger
+        try:
+            ledger.ensure_populated()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Note: Could not populate balance ledger: {e}")
+        
+        # SQLite full-text index behind user search
+        from . import user_search
+        user_search.ensure_index()
+    
+    register_commands(app)
     
     # Configure login manager
     @login_manager.user_loader
     def load_user(id):
-        return models.User.query.get(int(id))
+        return load_identity(int(id))
     
     @login_manager.unauthorized_handler
     def unauthorized():
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': 'Authentication required',
             'data': None
@@ -71,6 +88,9 @@ def create_app(config_class=Config):
     from .expenses import expenses as expenses_blueprint
     app.register_blueprint(expenses_blueprint, url_prefix='/api/expenses')
     
+    from .dashboard import dashboard as dashboard_blueprint
+    app.register_blueprint(dashboard_blueprint, url_prefix='/api/dashboard')
+    
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
     
@@ -80,7 +100,7 @@ def create_app(config_class=Config):
     # CSRF token route
     @app.route('/api/csrf-token', methods=['GET'])
     def get_csrf_token():
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'CSRF token retrieved',
             'data': {
@@ -89,3 +109,58 @@ def create_app(config_class=Config):
         })
     
     return app
+
+def register_commands(app):
+    ledger_cli = AppGroup('ledger', help='Maintain the materialized balance ledger.')
+
+    @ledger_cli.command('rebuild')
+    @click.option('--group-id', type=int, default=None, help='Only rebuild this group.')
+    def rebuild_ledger(group_id):
+        """Regenerate balance_ledger from expense and expense_split."""
+        from . import ledger
+        totals = ledger.rebuild(group_id)
+        db.session.commit()
+        click.echo(f'Balance ledger rebuilt from {totals} payer/debtor totals.')
+
+    app.cli.add_command(ledger_cli)
+
+    changes_cli = AppGroup('changes', help='Maintain the group change log.')
+
+    @changes_cli.command('compact')
+    @click.option('--days', type=int, default=None,
+                  help='Keep this many days of changes (default: CHANGE_LOG_RETENTION_DAYS).')
+    @click.option('--group-id', type=int, default=None, help='Only compact this group.')
+    def compact_changes(days, group_id):
+        """Delete change log entries older than the retention period."""
+        from datetime import datetime, timedelta
+        from . import changes
+        if days is None:
+            days = app.config['CHANGE_LOG_RETENTION_DAYS']
+        deleted = changes.compact(datetime.utcnow() - timedelta(days=days), group_id)
+        db.session.commit()
+        click.echo(f'Deleted {deleted} change log entries older than {days} days.')
+
+    app.cli.add_command(changes_cli)
+
+    groups_cli = AppGroup('groups', help='Maintain groups.')
+
+    @groups_cli.command('purge')
+    def purge_groups():
+        """Finish deleting groups whose background deletion was interrupted."""
+        from . import deletion
+        for group_id in deletion.pending():
+            deleted = deletion.purge(group_id, app.config['GROUP_DELETE_BATCH_SIZE'])
+            click.echo(f'Deleted group {group_id} and its remaining {deleted} expenses.')
+
+    app.cli.add_command(groups_cli)
+
+    replica_cli = AppGroup('replica', help='Manage read replica binds.')
+
+    @replica_cli.command('sync')
+    def sync_replicas():
+        """Copy the primary SQLite database into each replica bind."""
+        from .database import sync_sqlite_replicas
+        for path in sync_sqlite_replicas(db):
+            click.echo(f'Synced replica {path}.')
+
+    app.cli.add_command(replica_cli)
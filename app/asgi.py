@@ -0,0 +1,397 @@
+"""ASGI serving mode: async reads, everything else through the Flask app.
+
+:func:`create_asgi_app` wraps the WSGI app for an ASGI server such as
+uvicorn (see ``asgi.py`` at the project root). GET requests for the group
+view, the group list, the dashboard and the group event stream are served
+on the event loop, running the statements from :mod:`app.reads` on an
+async driver (``sqlite+aiosqlite`` for the default database). Every other
+route, and so every write, runs the existing Flask views on a thread pool
+of ``ASGI_WSGI_THREADS`` through the small WSGI bridge at the end of this
+module.
+
+The async handlers only answer requests they can answer exactly like the
+Flask views. Anything else falls through to Flask: no login in the
+session, a failed session protection check, an identity that is not
+cached yet, a group the user cannot see, a full event hub. Errors,
+redirects and remember-me logins therefore behave as before.
+
+Needs the packages in requirements-asgi.txt.
+"""
+import asyncio
+import io
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, request, session
+from flask_login.utils import _create_identifier
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from config import Config
+from . import changes, create_app, events, instrumentation, reads
+from .dashboard import dashboard_payload
+from .database import apply_pragmas
+from .groups import group_view_response, groups_response, not_modified
+from .identity import cached_identity
+from .serializers import json_response
+
+_GROUP_PATH = re.compile(r'/api/groups/(\d+)(/events)?')
+
+# Request bodies for Flask past this size are spooled to a temporary file
+WSGI_BODY_IN_MEMORY = 64 * 1024
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_database_uri(config):
+    """``ASYNC_DATABASE_URI``, or the primary database URI with an async driver."""
+    if config.get('ASYNC_DATABASE_URI'):
+        return config['ASYNC_DATABASE_URI']
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver known for {backend!r}; set ASYNC_DATABASE_URI')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_db_engine(app):
+    engine = create_async_engine(async_database_uri(app.config), **app.config.get('ASYNC_ENGINE_OPTIONS', {}))
+    if engine.dialect.name == 'sqlite':
+        pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+
+        @event.listens_for(engine.sync_engine, 'connect')
+        def _apply_pragmas_on_connect(dbapi_connection, connection_record):
+            apply_pragmas(dbapi_connection, pragmas)
+    if app.config.get('SQL_INSTRUMENTATION'):
+        instrumentation.instrument_engine(engine.sync_engine, instrumentation.slow_query_seconds(app.config))
+    return engine
+
+
+def create_asgi_app(config_class=Config):
+    app = create_app(config_class)
+    return AsyncApp(app, create_async_db_engine(app))
+
+
+class AsyncApp:
+    """ASGI application that serves the read routes natively and hands the
+    rest to the Flask app."""
+
+    def __init__(self, flask_app, engine):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.sessions = async_sessionmaker(engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=flask_app.config.get('ASGI_WSGI_THREADS', 32),
+            thread_name_prefix='wsgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD') and await self._dispatch(scope, receive, send):
+            return
+        await self._call_flask(scope, receive, send)
+
+    async def _call_flask(self, scope, receive, send):
+        """Run the Flask app for the request on the WSGI thread pool."""
+        if scope['type'] != 'http':
+            raise ValueError(f'Cannot serve {scope["type"]!r} connections')
+        with tempfile.SpooledTemporaryFile(max_size=WSGI_BODY_IN_MEMORY) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, _run_wsgi, self.flask_app, _environ(scope, body), send, loop)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _dispatch(self, scope, receive, send):
+        """Serve the request on the event loop. False lets Flask handle it."""
+        path = scope['path']
+        if path == '/api/dashboard':
+            handler, args = self._get_dashboard, ()
+        elif path == '/api/groups/':
+            handler, args = self._get_groups, ()
+        else:
+            match = _GROUP_PATH.fullmatch(path)
+            if match is None:
+                return False
+            if match.group(2):
+                if scope['method'] != 'GET':
+                    # HEAD gets the headers from Flask, without holding a stream open
+                    return False
+                return await self._group_events(scope, receive, send, int(match.group(1)))
+            handler, args = self._view_group, (int(match.group(1)),)
+
+        with self.flask_app.request_context(_environ(scope)):
+            user_id = _session_user_id()
+            if user_id is None:
+                return False
+            if self.flask_app.config.get('SQL_INSTRUMENTATION'):
+                # Ended, and turned into Server-Timing, by process_response
+                instrumentation.begin_request(self.flask_app.config.get('SQL_SLOWEST_PER_REQUEST', 3))
+            async with self.sessions() as db:
+                response = await handler(db, user_id, *args)
+            if response is None:
+                return False
+            response = self.flask_app.process_response(response)
+        await _send_response(scope, send, response)
+        return True
+
+    async def _view_group(self, db, user_id, group_id):
+        # Same steps as groups.view_group
+        version = (await db.execute(reads.member_version(group_id, user_id))).scalar()
+        if version is None:
+            return None
+        etag = reads.group_etag(group_id, version, user_id)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+        row = (await db.execute(reads.group_detail(group_id))).one()
+        limit = current_app.config['EXPENSES_PER_PAGE']
+        expenses, next_cursor = reads.split_page(
+            (await db.scalars(reads.expense_page(group_id, limit=limit))).all(), limit)
+        paid, owed = reads.contributions(group_id)
+        balances = reads.net_contributions(row.Group, (await db.execute(paid)).all(), (await db.execute(owed)).all())
+        return group_view_response(row, expenses, next_cursor, balances, etag)
+
+    async def _get_groups(self, db, user_id):
+        # Same steps as groups.get_groups
+        include_members = request.args.get('include_members', 'false').lower() in ('1', 'true', 'yes')
+        versions = (await db.execute(reads.group_versions(user_id))).all()
+        etag = reads.groups_etag(user_id, versions, include_members)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+        rows = (await db.execute(reads.group_summaries(user_id, include_members))).all()
+        return groups_response(rows, include_members, etag)
+
+    async def _get_dashboard(self, db, user_id):
+        return json_response(dashboard_payload(
+            (await db.execute(reads.group_balances(user_id))).all(),
+            (await db.execute(reads.counterparty_balances(user_id))).all(),
+            (await db.scalars(reads.recent_expenses(user_id))).all()
+        ))
+
+    async def _group_events(self, scope, receive, send, group_id):
+        # Same protocol as groups.group_events, waiting on the event loop
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        with self.flask_app.request_context(_environ(scope)):
+            user_id = _session_user_id()
+            if user_id is None:
+                return False
+            if self.flask_app.config.get('SQL_INSTRUMENTATION'):
+                # Ended, and turned into Server-Timing, by process_response
+                instrumentation.begin_request(self.flask_app.config.get('SQL_SLOWEST_PER_REQUEST', 3))
+            async with self.sessions() as db:
+                version = (await db.execute(reads.member_version(group_id, user_id))).scalar()
+            if version is None:
+                return False
+            try:
+                since = int(request.headers.get('Last-Event-ID') or request.args.get('since', version))
+            except ValueError:
+                since = version
+            config = current_app.config
+            heartbeat = config['EVENTS_HEARTBEAT_SECONDS']
+            page = config['CHANGES_PER_PAGE']
+            response = self.flask_app.process_response(current_app.response_class(
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            ))
+            # Last step before the try below, so the slot is always released
+            try:
+                subscription = events.get_hub().subscribe(
+                    group_id, wake=lambda: loop.call_soon_threadsafe(ready.set))
+            except events.HubFull:
+                return False
+
+        disconnected = asyncio.ensure_future(_disconnect(receive))
+        try:
+            await _send_start(send, response)
+            await _send_body(send, f'retry: {config["EVENTS_RETRY_MS"]}\n\n')
+            frames, last = await self._catch_up(group_id, user_id, max(since, 0), page)
+            while frames is not None:
+                if frames:
+                    await _send_body(send, ''.join(frames))
+                woken = asyncio.ensure_future(ready.wait())
+                await asyncio.wait((woken, disconnected), timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if disconnected.done():
+                    break
+                ready.clear()
+                notifications, overflowed = subscription.drain()
+                if not notifications and not overflowed:
+                    if woken.done() and not woken.cancelled():
+                        frames = []
+                        continue
+                    await _send_body(send, ': heartbeat\n\n')
+                    frames, last = await self._catch_up(group_id, user_id, last, page)
+                    continue
+                frames, last, status = events.live_frames(notifications, last)
+                if status == 'closed':
+                    await _send_body(send, ''.join(frames))
+                    break
+                if overflowed or status == 'gap':
+                    more, last = await self._catch_up(group_id, user_id, last, page)
+                    frames = None if more is None else frames + more
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            events.get_hub().unsubscribe(subscription)
+        return True
+
+    async def _catch_up(self, group_id, user_id, last, page):
+        # Same as groups._catch_up
+        async with self.sessions() as db:
+            version = (await db.execute(reads.member_version(group_id, user_id))).scalar()
+            if version is None:
+                return None, last
+            frames = []
+            while last != version:
+                result = None
+                if last < version:
+                    entries = (await db.scalars(changes.since_statement(group_id, last, page))).all()
+                    result = changes.check_page(entries, last, page)
+                if result is None:
+                    frames.append(events.sse_frame({'kind': 'resync', 'version': version}, version))
+                    return frames, version
+                entries, _ = result
+                frames.extend(
+                    events.sse_frame(changes.notification(entry.seq, entry.kind, entry.entity_id), entry.seq)
+                    for entry in entries
+                )
+                last = entries[-1].seq
+            return frames, last
+
+
+def _environ(scope, body=None):
+    """The WSGI environ for an HTTP scope; ``body`` is the request body as a
+    file, and an empty one by default."""
+    server = scope.get('server') or ('localhost', 80)
+    script_name = scope.get('root_path', '').encode().decode('latin-1')
+    path_info = scope['path'].encode().decode('latin-1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO() if body is None else body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _session_user_id():
+    """The user id of a session login the async handlers can trust as is.
+
+    None when Flask-Login would have to do more than read the session:
+    log in from a remember cookie, apply session protection, or load an
+    identity that is not cached.
+    """
+    user_id = session.get('_user_id')
+    if user_id is None:
+        return None
+    protection = current_app.config.get('SESSION_PROTECTION', current_app.login_manager.session_protection)
+    if protection in ('basic', 'strong') and session.get('_id') != _create_identifier():
+        return None
+    identity = cached_identity(int(user_id))
+    return identity.id if identity is not None else None
+
+
+async def _disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_start(send, response):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+
+
+async def _send_body(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+
+async def _send_response(scope, send, response):
+    await _send_start(send, response)
+    body = b'' if scope['method'] == 'HEAD' else response.get_data()
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _run_wsgi(wsgi_app, environ, send, loop):
+    """Call ``wsgi_app`` on this worker thread and pass its response to the
+    ASGI ``send`` running on ``loop``, chunk by chunk so streams stay live."""
+    def emit(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    start = None
+    started = False
+
+    def start_response(status, headers, exc_info=None):
+        nonlocal start
+        if exc_info is not None and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        start = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }
+
+    chunks = wsgi_app(environ, start_response)
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if not started:
+                started = True
+                emit(start)
+            emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        # Ends a streamed response's request context
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    if not started:
+        emit(start)
+    emit({'type': 'http.response.body', 'body': b''})
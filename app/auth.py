@@ -1,11 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from flask_login import login_user, login_required, logout_user, current_user
 from .models import User, db
-from werkzeug.security import check_password_hash
+from .passwords import HasherBusy, get_hasher
+from .serializers import USER, json_response
 
 # Create auth blueprint
 auth = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+@auth.app_errorhandler(HasherBusy)
+def password_hasher_busy(e):
+    response = json_response({
+        'status': 'error',
+        'message': str(e)
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -18,7 +28,7 @@ def login():
             password = request.form.get('password')
         
         if not username or not password:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Missing username or password'
             }), 400
@@ -26,25 +36,23 @@ def login():
         # Check if user exists
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            # Persists the hash if check_password upgraded it
+            db.session.commit()
             login_user(user)
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'message': 'Login successful',
                 'data': {
-                    'user': {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email
-                    }
+                    'user': USER.dump(user)
                 }
             })
         else:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Invalid username or password'
             }), 401
     
-    return jsonify({
+    return json_response({
         'status': 'error',
         'message': 'Method not allowed'
     }), 405
@@ -64,20 +72,20 @@ def register():
         
         # Validate required fields
         if not username or not email or not password:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Missing required fields'
             }), 400
         
         # Check if user already exists
         if User.query.filter_by(username=username).first():
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Username already exists'
             }), 400
         
         if User.query.filter_by(email=email).first():
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Email already registered'
             }), 400
@@ -86,12 +94,11 @@ def register():
             # Create new user
             new_user = User(username=username, email=email)
             new_user.set_password(password)
-            print(f"Setting password for {username}: {password}")  # Debug line
             
             db.session.add(new_user)
             db.session.commit()
             
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'message': 'Registration successful',
                 'data': {
@@ -104,12 +111,12 @@ def register():
         except Exception as e:
             db.session.rollback()
             print(f"Registration error: {str(e)}")  # Debug line
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }), 500
     
-    return jsonify({
+    return json_response({
         'status': 'error',
         'message': 'Method not allowed'
     }), 405
@@ -117,22 +124,26 @@ def register():
 @auth.route('/user')
 @login_required
 def get_current_user():
-    return jsonify({
+    return json_response({
         'status': 'success',
         'data': {
-            'user': {
-                'id': current_user.id,
-                'username': current_user.username,
-                'email': current_user.email
-            }
+            'user': USER.dump(current_user)
         }
     })
 
+@auth.route('/password-hashing/stats')
+@login_required
+def password_hashing_stats():
+    return json_response({
+        'status': 'success',
+        'data': get_hasher().stats()
+    })
+
 @auth.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return jsonify({
+    return json_response({
         'status': 'success',
         'message': 'Logged out successfully'
     })
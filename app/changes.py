@@ -0,0 +1,115 @@
+"""Per-group change log behind delta sync.
+
+Every mutation of a group appends one ``group_change`` row per affected
+entity in the same transaction as the change itself. Appending advances the
+group's version, and each row's ``seq`` is the version it produced, so a
+client that loaded a group at version ``v`` catches up by reading the rows
+with ``seq > v`` instead of downloading the group again.
+
+Sequence numbers of a group are contiguous from its first logged change.
+A group starts at version 0 and logs its creation as seq 1, so a client
+that has never loaded it syncs from ``since=0``. Compaction deletes a prefix
+of that range, so a client whose ``since`` falls before the oldest retained
+row (or before logging began) gets a gap and must reload the group;
+:func:`changes_since` reports that as ``None``.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from .models import db, GroupChange, bump_group_version
+from .events import publish_after_commit
+
+GROUP_CREATED = 'group_created'
+EXPENSE_CREATED = 'expense_created'
+EXPENSE_DELETED = 'expense_deleted'
+SPLITS_REPLACED = 'splits_replaced'
+SPLIT_SETTLED = 'split_settled'
+MEMBERS_CHANGED = 'members_changed'
+GROUP_RENAMED = 'group_renamed'
+
+
+def record(group_id, kind, entity_id=None, data=None):
+    """Log one change to ``group_id``. Nothing is committed."""
+    return record_many(group_id, kind, [(entity_id, data)])
+
+
+def record_many(group_id, kind, entries):
+    """Log ``(entity_id, data)`` changes of one kind with a single version bump
+    and one executemany insert, and notify event streams once committed.
+    Returns the group's new version."""
+    entries = list(entries)
+    if not entries:
+        return None
+    version = bump_group_version(group_id, len(entries))
+    first = version - len(entries) + 1
+    now = datetime.utcnow()
+    db.session.execute(GroupChange.__table__.insert(), [{
+        'group_id': group_id,
+        'seq': first + offset,
+        'kind': kind,
+        'entity_id': entity_id,
+        'data': data,
+        'created_at': now
+    } for offset, (entity_id, data) in enumerate(entries)])
+    for offset, (entity_id, _) in enumerate(entries):
+        publish_after_commit(db.session, group_id, notification(first + offset, kind, entity_id))
+    return version
+
+
+def notification(seq, kind, entity_id=None):
+    """The small message event streams send for one change."""
+    return {'seq': seq, 'kind': kind, 'entity_id': entity_id}
+
+
+def changes_since(group_id, since, version, limit):
+    """Up to ``limit`` changes after ``since`` for a group now at ``version``.
+
+    Returns ``(changes, has_more)``, or ``None`` when the log no longer
+    covers ``since`` and the client has to reload the group.
+    """
+    if since > version:
+        return None
+    if since == version:
+        return [], False
+    return check_page(db.session.scalars(since_statement(group_id, since, limit)).all(), since, limit)
+
+
+def since_statement(group_id, since, limit):
+    """The log entries after ``since``, plus one to detect another page."""
+    return select(GroupChange)\
+        .where(GroupChange.group_id == group_id, GroupChange.seq > since)\
+        .order_by(GroupChange.seq)\
+        .limit(limit + 1)
+
+
+def check_page(changes, since, limit):
+    """``(changes, has_more)`` for the rows of :func:`since_statement`, or
+    None if they do not continue directly from ``since``."""
+    if not changes or changes[0].seq != since + 1:
+        return None
+    return changes[:limit], len(changes) > limit
+
+
+def compact(before, group_id=None):
+    """Delete log entries created before ``before``. Returns the number deleted.
+
+    Per group, everything up to the newest expired entry goes, so the log
+    that remains is still one contiguous range.
+    """
+    horizons = db.session.query(GroupChange.group_id, func.max(GroupChange.seq))\
+        .filter(GroupChange.created_at < before)
+    if group_id is not None:
+        horizons = horizons.filter(GroupChange.group_id == group_id)
+    horizons = horizons.group_by(GroupChange.group_id).all()
+    if not horizons:
+        return 0
+
+    table = GroupChange.__table__
+    statement = table.delete()\
+        .where(table.c.group_id == db.bindparam('target_group_id'))\
+        .where(table.c.seq <= db.bindparam('horizon'))
+    result = db.session.execute(statement, [
+        {'target_group_id': target, 'horizon': horizon} for target, horizon in horizons
+    ])
+    return result.rowcount
@@ -0,0 +1,75 @@
+"""The signed-in user's summary: balances per group and per person, plus
+their latest expenses, in three queries whatever the number of groups.
+
+The statements live in :mod:`app.reads`, shared with the async read path.
+"""
+from flask import Blueprint
+from flask_login import login_required, current_user
+
+from . import reads
+from .models import db
+from .money import to_major
+from .serializers import Attr, DateTime, Method, Money, Nested, Schema, USER, USER_REF, json_response
+
+dashboard = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+
+def group_balances(user_id):
+    """``(group, balance_minor)`` for every group of ``user_id``, in one query."""
+    return db.session.execute(reads.group_balances(user_id)).all()
+
+
+def counterparty_balances(user_id):
+    """``(user, currency, balance_minor)`` per person, summed over groups of one currency."""
+    return db.session.execute(reads.counterparty_balances(user_id)).all()
+
+
+def recent_expenses(user_id, limit=reads.RECENT_EXPENSES):
+    """The newest expenses ``user_id`` paid or shares, with payer and group loaded."""
+    return db.session.scalars(reads.recent_expenses(user_id, limit)).all()
+
+
+GROUP_BALANCE = Schema(
+    'group_balance',
+    group=Method(lambda row: {'id': row[0].id, 'name': row[0].name, 'currency': row[0].currency}),
+    balance=Method(lambda row: to_major(row[1], row[0].currency))
+)
+
+COUNTERPARTY_BALANCE = Schema(
+    'counterparty_balance',
+    user=Nested(USER_REF, 'User'),
+    currency=Attr(),
+    balance=Method(lambda row: to_major(row[2], row.currency))
+)
+
+RECENT_EXPENSE = Schema(
+    'recent_expense',
+    id=Attr(),
+    description=Attr(),
+    amount=Money('amount_minor'),
+    currency=Attr(),
+    date=DateTime(),
+    group=Method(lambda expense: {'id': expense.group.id, 'name': expense.group.name}),
+    payer=Nested(USER)
+)
+
+
+def dashboard_payload(groups, counterparties, recent):
+    return {
+        'status': 'success',
+        'data': {
+            'groups': GROUP_BALANCE.dump_many(groups),
+            'counterparties': COUNTERPARTY_BALANCE.dump_many(counterparties),
+            'recent_expenses': RECENT_EXPENSE.dump_many(recent)
+        }
+    }
+
+
+@dashboard.route('', methods=['GET'])
+@login_required
+def get_dashboard():
+    return json_response(dashboard_payload(
+        group_balances(current_user.id),
+        counterparty_balances(current_user.id),
+        recent_expenses(current_user.id)
+    ))
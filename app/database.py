@@ -0,0 +1,151 @@
+"""Engine configuration and read/write routing.
+
+``Config.SQLITE_PRAGMAS`` is applied to every new connection from the
+``connect`` event, and :func:`check_pragmas` reads the values back once at
+startup so a setting the database refused (e.g. WAL on an in-memory
+database) shows up in the log instead of going unnoticed.
+
+:class:`RoutingSession` sends SELECTs issued by safe (GET/HEAD/OPTIONS)
+requests to one of the ``READ_REPLICA_BINDS``. Everything else goes to the
+primary: writes, any request that is not safe, work outside a request,
+and reads by a client that wrote within the last
+``READ_AFTER_WRITE_SECONDS``, so users always see their own changes.
+"""
+import random
+import sqlite3
+import time
+
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# PRAGMA values that SQLite reports back as integers
+_SYNCHRONOUS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+_TEMP_STORE = {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2}
+
+# busy_timeout goes first so switching the journal mode waits for locks
+_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+
+def _ordered(pragmas):
+    names = [name for name in _ORDER if name in pragmas]
+    return names + [name for name in pragmas if name not in _ORDER]
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run ``PRAGMA name=value`` for each entry on a raw DB-API connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA foreign_keys=ON')
+        for name in _ordered(pragmas):
+            cursor.execute(f'PRAGMA {name}={pragmas[name]}')
+    finally:
+        cursor.close()
+
+
+def _expected(name, value):
+    if name == 'journal_mode':
+        return str(value).lower()
+    if name == 'synchronous' and isinstance(value, str):
+        return _SYNCHRONOUS.get(value.upper(), value)
+    if name == 'temp_store' and isinstance(value, str):
+        return _TEMP_STORE.get(value.upper(), value)
+    return int(value)
+
+
+def check_pragmas(connection, pragmas):
+    """Return ``{name: (expected, actual)}`` for settings that did not take effect."""
+    mismatches = {}
+    for name in _ordered(pragmas):
+        actual = connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        if isinstance(actual, str):
+            actual = actual.lower()
+        expected = _expected(name, pragmas[name])
+        if actual != expected:
+            mismatches[name] = (expected, actual)
+    return mismatches
+
+
+def configure_sqlite(app, engine):
+    """Apply the pragma profile to ``engine`` and verify it on one connection."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas_on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    with engine.connect() as connection:
+        mismatches = check_pragmas(connection, pragmas)
+    for name, (expected, actual) in mismatches.items():
+        app.logger.warning('SQLite PRAGMA %s is %r, expected %r', name, actual, expected)
+    return mismatches
+
+
+class RoutingSession(Session):
+    """Session that serves read-only requests from a replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+        if self._flushing or not getattr(clause, 'is_select', False):
+            # Writes, and statements we cannot classify, stick to the primary
+            # for the rest of the request
+            self.info['wrote'] = True
+            return engine
+        return self._replica() or engine
+
+    def _replica(self):
+        if self.info.get('wrote') or not has_request_context() or request.method not in SAFE_METHODS:
+            return None
+        if 'replica' not in self.info:
+            self.info['replica'] = _choose_replica(self._db.engines)
+        return self.info['replica']
+
+
+def _choose_replica(engines):
+    binds = [key for key in current_app.config.get('READ_REPLICA_BINDS', ()) if key in engines]
+    if not binds:
+        return None
+    last_write = session.get('_last_write')
+    if last_write and time.time() - last_write < current_app.config.get('READ_AFTER_WRITE_SECONDS', 5):
+        return None
+    return engines[random.choice(binds)]
+
+
+def init_routing(app, db):
+    """Remember when a client last wrote, for read-after-write consistency."""
+    if not app.config.get('READ_REPLICA_BINDS'):
+        return
+
+    @app.after_request
+    def _remember_write(response):
+        if db.session().info.get('wrote'):
+            session['_last_write'] = time.time()
+        return response
+
+
+def sync_sqlite_replicas(db):
+    """Copy the primary SQLite database into every replica bind.
+
+    Uses SQLite's online backup API, so it is safe while the app runs.
+    Returns the replica paths that were refreshed.
+    """
+    primary = db.engines[None]
+    synced = []
+    for key in current_app.config.get('READ_REPLICA_BINDS', ()):
+        replica = db.engines[key]
+        if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+            raise ValueError(f'Replica bind {key!r} is not a SQLite file')
+        source = primary.raw_connection()
+        target = sqlite3.connect(replica.url.database)
+        try:
+            source.driver_connection.backup(target)
+        finally:
+            target.close()
+            source.close()
+        replica.dispose()
+        synced.append(replica.url.database)
+    return synced
@@ -0,0 +1,112 @@
+"""Deleting groups in bounded batches.
+
+Deleting a group used to remove its expenses one by one in a single
+transaction that held the SQLite write lock throughout. Now
+:func:`mark_deleting` first detaches the group in one short transaction:
+the group gets a ``deleting_at`` stamp and loses its members, ledger rows
+and change log, so it drops out of every member's views and accepts no
+new expenses. :func:`purge` then removes the expenses and splits with
+set-based statements, ``GROUP_DELETE_BATCH_SIZE`` expenses per
+transaction, and finally the group row.
+
+Groups with up to ``GROUP_DELETE_BACKGROUND_THRESHOLD`` expenses are
+purged during the request. Larger ones are purged by a background thread,
+which pauses between batches so other writers get the lock. A purge that
+stopped with its process is finished by ``flask groups purge``.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from .models import db, BalanceLedger, Expense, ExpenseSplit, Group, GroupChange, group_members
+from . import events
+
+_lock = threading.Lock()
+_executor = None
+_running = set()
+
+
+def mark_deleting(group):
+    """Detach ``group`` from its members and stamp it for purging. Nothing is committed."""
+    group.deleting_at = datetime.utcnow()
+    db.session.execute(group_members.delete().where(group_members.c.group_id == group.id))
+    db.session.execute(delete(BalanceLedger).where(BalanceLedger.group_id == group.id))
+    db.session.execute(delete(GroupChange).where(GroupChange.group_id == group.id))
+    events.publish_after_commit(db.session, group.id, {'kind': 'group_deleted'})
+
+
+def expense_count(group_id):
+    return db.session.scalar(select(func.count(Expense.id)).where(Expense.group_id == group_id))
+
+
+def delete_batch(group_id, batch_size):
+    """Delete up to ``batch_size`` expenses of the group with their splits.
+    Returns the number of expenses deleted. Nothing is committed."""
+    batch = select(Expense.id)\
+        .where(Expense.group_id == group_id)\
+        .order_by(Expense.id)\
+        .limit(batch_size)
+    # Both statements select the same ids: the first does not touch expense
+    db.session.execute(delete(ExpenseSplit).where(ExpenseSplit.expense_id.in_(batch)))
+    return db.session.execute(delete(Expense).where(Expense.id.in_(batch))).rowcount
+
+
+def purge(group_id, batch_size, pause=0):
+    """Delete a group marked by :func:`mark_deleting`, committing every batch.
+
+    Sleeps ``pause`` seconds between batches. Returns the number of
+    expenses deleted.
+    """
+    deleted = 0
+    while True:
+        count = delete_batch(group_id, batch_size)
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    # Nothing is left for the foreign keys to cascade to
+    db.session.execute(delete(Group).where(Group.id == group_id, Group.deleting_at.is_not(None)))
+    db.session.commit()
+    return deleted
+
+
+def pending():
+    """Ids of groups marked for deletion that still exist."""
+    return db.session.scalars(select(Group.id).where(Group.deleting_at.is_not(None)).order_by(Group.id)).all()
+
+
+def start_purge(app, group_id):
+    """Purge ``group_id`` on the background thread, unless that is already
+    happening. Returns False if a purge was already running."""
+    global _executor
+    with _lock:
+        if group_id in _running:
+            return False
+        _running.add(group_id)
+        if _executor is None:
+            # One writer at a time is all SQLite allows anyway
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='group-delete')
+    _executor.submit(_run_purge, app, group_id)
+    return True
+
+
+def _run_purge(app, group_id):
+    try:
+        with app.app_context():
+            try:
+                purge(
+                    group_id,
+                    app.config.get('GROUP_DELETE_BATCH_SIZE', 500),
+                    app.config.get('GROUP_DELETE_BATCH_PAUSE', 0.05)
+                )
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Purging group %s failed; it stays marked for deletion', group_id)
+    finally:
+        with _lock:
+            _running.discard(group_id)
@@ -0,0 +1,205 @@
+"""In-process fan-out of group changes to Server-Sent Events streams.
+
+:mod:`app.changes` queues a small notification (seq, kind, entity id) on
+the session for every change it logs, and once the transaction commits
+they are handed to the process wide :class:`EventHub`. The hub has no
+threads of its own: publishing appends to each subscriber's bounded buffer
+and wakes it, so an idle subscriber costs a buffer and an ``Event``.
+Streams should be served by a gevent or eventlet worker (or the ASGI
+entry point), where a waiting subscriber is a parked greenlet rather than
+an OS thread.
+
+A subscriber that falls ``EVENTS_QUEUE_SIZE`` notifications behind is not
+allowed to grow without bound. Its buffer is dropped and it catches up
+from the change log instead, which is also how reconnecting clients resume
+from ``Last-Event-ID`` and how changes committed by other processes
+arrive, at the latest one heartbeat later.
+"""
+import threading
+from collections import defaultdict, deque
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .serializers import dumps
+
+_lock = threading.Lock()
+_hub = None
+
+
+class HubFull(RuntimeError):
+    """Raised when the process already serves ``EVENTS_MAX_SUBSCRIBERS`` streams."""
+
+
+class Subscription:
+    """One stream's view of a group: a bounded buffer of notifications."""
+
+    def __init__(self, group_id, queue_size, wake=None):
+        self.group_id = group_id
+        self.queue_size = queue_size
+        self.overflowed = False
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # Called after every put, e.g. to wake an asyncio waiter from the
+        # publishing thread
+        self._wake = wake
+
+    def put(self, notification):
+        with self._lock:
+            if self.overflowed:
+                return False
+            if len(self._buffer) >= self.queue_size:
+                # Too slow to keep up: drop the backlog, catch up from the log
+                self._buffer.clear()
+                self.overflowed = True
+            else:
+                self._buffer.append(notification)
+            self._ready.set()
+            delivered = not self.overflowed
+        if self._wake is not None:
+            self._wake()
+        return delivered
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds, then :meth:`drain`."""
+        self._ready.wait(timeout)
+        return self.drain()
+
+    def drain(self):
+        """Return ``(notifications, overflowed)`` and reset both, so the next
+        call only sees newer notifications."""
+        with self._lock:
+            notifications = list(self._buffer)
+            overflowed = self.overflowed
+            self._buffer.clear()
+            self.overflowed = False
+            self._ready.clear()
+        return notifications, overflowed
+
+
+class EventHub:
+    """Routes published notifications to the subscriptions of their group."""
+
+    def __init__(self, queue_size, max_subscribers):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._groups = defaultdict(set)
+        self._count = 0
+        self._published = 0
+        self._delivered = 0
+        self._overflows = 0
+        self._rejected = 0
+
+    def subscribe(self, group_id, wake=None):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self._rejected += 1
+                raise HubFull(f'{self._count} event streams already open')
+            subscription = Subscription(group_id, self.queue_size, wake)
+            self._groups[group_id].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._groups.get(subscription.group_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._groups[subscription.group_id]
+            self._count -= 1
+
+    def publish(self, group_id, notifications):
+        with self._lock:
+            subscribers = list(self._groups.get(group_id, ()))
+            self._published += len(notifications)
+        delivered = overflows = 0
+        for subscription in subscribers:
+            for notification in notifications:
+                if subscription.put(notification):
+                    delivered += 1
+                else:
+                    overflows += 1
+                    break
+        with self._lock:
+            self._delivered += delivered
+            self._overflows += overflows
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'groups': len(self._groups),
+                'max_subscribers': self.max_subscribers,
+                'queue_size': self.queue_size,
+                'published': self._published,
+                'delivered': self._delivered,
+                'overflows': self._overflows,
+                'rejected': self._rejected,
+            }
+
+
+def get_hub():
+    """The process wide :class:`EventHub`, created from the app config."""
+    global _hub
+    if _hub is None:
+        with _lock:
+            if _hub is None:
+                config = current_app.config
+                _hub = EventHub(
+                    config.get('EVENTS_QUEUE_SIZE', 100),
+                    config.get('EVENTS_MAX_SUBSCRIBERS', 1000)
+                )
+    return _hub
+
+
+def sse_frame(data, event_id=None):
+    """One Server-Sent Events message with a JSON payload."""
+    frame = f'data: {dumps(data).decode()}\n\n'
+    return frame if event_id is None else f'id: {event_id}\n{frame}'
+
+
+def live_frames(notifications, last):
+    """Turn published notifications into frames for a stream at ``last``.
+
+    Returns ``(frames, last, status)``. The status is None to keep going,
+    ``'gap'`` when a notification skipped ahead (committed out of order, or
+    missed) and the rest must come from the log, or ``'closed'`` once the
+    group was deleted.
+    """
+    frames = []
+    for notification in notifications:
+        if notification['kind'] == 'group_deleted':
+            frames.append(sse_frame(notification))
+            return frames, last, 'closed'
+        if notification['seq'] <= last:
+            continue
+        if notification['seq'] > last + 1:
+            return frames, last, 'gap'
+        frames.append(sse_frame(notification, notification['seq']))
+        last = notification['seq']
+    return frames, last, None
+
+
+def publish_after_commit(session, group_id, notification):
+    """Queue ``notification`` for ``group_id`` until ``session`` commits."""
+    session.info.setdefault('group_events', defaultdict(list))[group_id].append(notification)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    pending = session.info.pop('group_events', None)
+    if not pending or _hub is None:
+        # Without a hub nobody in this process is subscribed
+        return
+    for group_id, notifications in pending.items():
+        _hub.publish(group_id, notifications)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('group_events', None)
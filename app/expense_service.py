@@ -0,0 +1,121 @@
+"""Creating expenses and their splits.
+
+Shared by the single-expense endpoint and the bulk importer. Members are
+validated against the group with one query, and expenses, splits, the
+balance ledger and the change log are each written with a single
+executemany statement, so
+the number of queries does not depend on how many people share an expense.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from .models import db, Expense, ExpenseSplit, group_members
+from .money import allocate
+from .serializers import CHANGED_EXPENSE
+from . import changes, ledger
+
+
+class ExpenseError(ValueError):
+    """Raised when an expense or its split is invalid."""
+
+
+def group_member_ids(group_id, user_ids=None):
+    """Return the ids of ``group_id``'s members, optionally limited to ``user_ids``."""
+    query = db.session.query(group_members.c.user_id).filter(group_members.c.group_id == group_id)
+    if user_ids is not None:
+        query = query.filter(group_members.c.user_id.in_(user_ids))
+    return {user_id for (user_id,) in query}
+
+
+def normalize_split(payer_id, split_with, member_ids=None, group_id=None):
+    """Validate ``split_with`` and return it as a list of ints.
+
+    Membership is checked against ``member_ids`` when given, otherwise
+    against ``group_id`` with a single query.
+    """
+    if not split_with or not isinstance(split_with, list):
+        raise ExpenseError('At least one member must be selected for splitting')
+
+    member_list = []
+    for member_id in split_with:
+        try:
+            member_list.append(int(member_id))
+        except (ArithmeticError, TypeError, ValueError):
+            raise ExpenseError(f'Invalid member ID: {member_id}')
+
+    # Validate that payer is not creating an expense for themselves only
+    if len(member_list) == 1 and payer_id in member_list:
+        raise ExpenseError('Cannot create an expense for yourself only. Please include other members.')
+
+    # Validate that at least one other member is included
+    if not [member_id for member_id in member_list if member_id != payer_id]:
+        raise ExpenseError('At least one other member must be included in the expense split')
+
+    if member_ids is None:
+        member_ids = group_member_ids(group_id, set(member_list))
+    for member_id in member_list:
+        if member_id not in member_ids:
+            raise ExpenseError(f'Invalid member ID: {member_id}')
+
+    return member_list
+
+
+def create_expenses(group, entries):
+    """Insert already validated expenses into ``group``.
+
+    ``entries`` are dicts with ``description``, ``amount_minor``,
+    ``payer_id``, ``split_with`` and optionally ``date``. Splits share the
+    amount exactly, with leftover minor units going to the first members.
+    Returns one dict per entry with the stored values, the new ``id`` and
+    its ``splits``. Nothing is committed.
+    """
+    if not entries:
+        return []
+
+    now = datetime.utcnow()
+    expense_rows = [{
+        'description': entry['description'],
+        'amount_minor': entry['amount_minor'],
+        'date': entry.get('date') or now,
+        'payer_id': entry['payer_id'],
+        'group_id': group.id,
+        'currency': group.currency
+    } for entry in entries]
+    expense_ids = db.session.scalars(
+        Expense.__table__.insert().returning(Expense.id, sort_by_parameter_order=True),
+        expense_rows
+    ).all()
+
+    split_rows = []
+    deltas = defaultdict(int)
+    for expense_id, row, entry in zip(expense_ids, expense_rows, entries):
+        row['id'] = expense_id
+        shares = list(zip(entry['split_with'], allocate(row['amount_minor'], len(entry['split_with']))))
+        row['splits'] = [{
+            'expense_id': expense_id,
+            'user_id': member_id,
+            'amount_minor': share,
+            'is_settled': False
+        } for member_id, share in shares]
+        split_rows.extend(row['splits'])
+
+        for key, amount in ledger.split_deltas(row['payer_id'], shares).items():
+            deltas[key] += amount
+
+    db.session.execute(ExpenseSplit.__table__.insert(), split_rows)
+    ledger.apply_deltas(group.id, deltas)
+    changes.record_many(group.id, changes.EXPENSE_CREATED,
+                        ((row['id'], CHANGED_EXPENSE.dump(row)) for row in expense_rows))
+    return expense_rows
+
+
+def create_expense(group, payer_id, description, amount_minor, split_with, date=None):
+    """Validate and insert a single expense. Returns the stored values."""
+    split_with = normalize_split(payer_id, split_with, group_id=group.id)
+    return create_expenses(group, [{
+        'description': description,
+        'amount_minor': amount_minor,
+        'payer_id': payer_id,
+        'split_with': split_with,
+        'date': date
+    }])[0]
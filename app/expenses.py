@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, render_template, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from .models import db, Expense, ExpenseSplit, Group, User
+from flask_wtf.csrf import validate_csrf
+from .models import db, Expense, ExpenseSplit, Group
+from . import changes, ledger, importer, expense_service, money
+from .serializers import CREATED_EXPENSE, json_response
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -13,13 +16,13 @@ def add_expense(group_id):
     try:
         # Get group and verify membership
         group = Group.query.get_or_404(group_id)
-        if current_user not in group.members:
-            return jsonify({'error': 'You are not a member of this group'}), 403
+        if not group.has_member(current_user.id):
+            return json_response({'error': 'You are not a member of this group'}), 403
 
         # Parse request data
         data = request.get_json()
         if not data:
-            return jsonify({'error': 'No data provided'}), 400
+            return json_response({'error': 'No data provided'}), 400
 
         # Validate required fields
         description = data.get('description')
@@ -27,88 +30,92 @@ def add_expense(group_id):
         split_with = data.get('split_with', [])
 
         if not description or not isinstance(description, str):
-            return jsonify({'error': 'Description is required'}), 400
+            return json_response({'error': 'Description is required'}), 400
 
         try:
-            amount = float(amount)
-            if amount <= 0:
-                return jsonify({'error': 'Amount must be greater than 0'}), 400
-        except (TypeError, ValueError):
-            return jsonify({'error': 'Invalid amount'}), 400
+            amount_minor = money.to_minor(amount, group.currency)
+            if amount_minor <= 0:
+                return json_response({'error': 'Amount must be greater than 0'}), 400
+        except ValueError:
+            return json_response({'error': 'Invalid amount'}), 400
 
-        if not split_with or not isinstance(split_with, list):
-            return jsonify({'error': 'At least one member must be selected for splitting'}), 400
-
-        # Validate that payer is not creating an expense for themselves only
-        if len(split_with) == 1 and current_user.id in split_with:
-            return jsonify({'error': 'Cannot create an expense for yourself only. Please include other members.'}), 400
-
-        # Validate that at least one other member is included
-        other_members = [member_id for member_id in split_with if member_id != current_user.id]
-        if not other_members:
-            return jsonify({'error': 'At least one other member must be included in the expense split'}), 400
-
-        # Create expense
-        expense = Expense(
-            description=description,
-            amount=amount,
-            currency=group.currency,
-            payer_id=current_user.id,
-            group_id=group_id,
-            date=datetime.utcnow()
-        )
-        db.session.add(expense)
-        db.session.flush()  # Get the expense ID without committing
-
-        # Calculate split amount based only on selected members
-        total_members = len(split_with)  # Don't include payer in count
-        if total_members == 0:
-            db.session.rollback()
-            return jsonify({'error': 'At least one member must be selected for splitting'}), 400
-
-        split_amount = round(amount / total_members, 2)
-
-        # Create splits only for selected members
-        for member_id in split_with:
-            # Verify member exists and is in the group
-            member = User.query.get(member_id)
-            if not member or member not in group.members:
-                db.session.rollback()
-                return jsonify({'error': f'Invalid member ID: {member_id}'}), 400
-
-            split = ExpenseSplit(
-                expense_id=expense.id,
-                user_id=member_id,
-                amount=split_amount,
-                is_settled=False
+        # Validate the split against the group's members and create the
+        # expense with all of its splits
+        try:
+            expense = expense_service.create_expense(
+                group,
+                payer_id=current_user.id,
+                description=description,
+                amount_minor=amount_minor,
+                split_with=split_with
             )
-            db.session.add(split)
+        except expense_service.ExpenseError as e:
+            db.session.rollback()
+            return json_response({'error': str(e)}), 400
 
         # Commit all changes
         db.session.commit()
 
-        return jsonify({
+        return json_response({
             'message': 'Expense created successfully',
-            'expense': {
-                'id': expense.id,
-                'description': expense.description,
-                'amount': expense.amount,
-                'currency': expense.currency,
-                'date': expense.date.isoformat(),
-                'splits': [{
-                    'user_id': split.user_id,
-                    'amount': split.amount,
-                    'is_settled': split.is_settled
-                } for split in expense.splits]
-            }
+            'expense': CREATED_EXPENSE.dump(expense)
         }), 201
 
     except SQLAlchemyError as e:
         db.session.rollback()
-        return jsonify({'error': 'Database error occurred'}), 500
+        return json_response({'error': 'Database error occurred'}), 500
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}), 500
+
+@expenses.route('/group/<int:group_id>/bulk', methods=['POST'])
+@login_required
+def bulk_import_expenses(group_id):
+    group = Group.query.get_or_404(group_id)
+    if not group.has_member(current_user.id):
+        return json_response({'error': 'You are not a member of this group'}), 403
+
+    try:
+        chunk_size = int(request.args.get('chunk_size', current_app.config['BULK_IMPORT_CHUNK_SIZE']))
+    except ValueError:
+        return json_response({'error': 'Invalid chunk size'}), 400
+    if chunk_size <= 0:
+        return json_response({'error': 'Invalid chunk size'}), 400
+
+    try:
+        summary = importer.import_expenses(
+            group,
+            importer.read_rows(request.stream, request.mimetype),
+            payer_id=current_user.id,
+            can_set_payer=current_user.id == group.created_by_id,
+            chunk_size=chunk_size,
+            max_errors=current_app.config['BULK_IMPORT_MAX_ERRORS']
+        )
+    except importer.ImportFormatError as e:
+        return json_response({'error': str(e)}), 415
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return json_response({'error': 'Database error occurred'}), 500
+
+    stopped = summary['stopped']
+    if stopped is None:
+        return json_response({
+            'message': f"Imported {summary['imported']} expenses",
+            'data': summary
+        }), 201 if summary['imported'] else 400
+    if summary['imported']:
+        # Earlier chunks are committed: retrying the whole body would
+        # duplicate them, so say exactly where to resume
+        return json_response({
+            'status': 'partial',
+            'message': f"Imported {summary['imported']} expenses, then stopped at row {stopped['row']}: "
+                       f"{stopped['error']}",
+            'data': summary
+        }), 207
+    return json_response({
+        'error': stopped['error'],
+        'data': summary
+    }), 400 if stopped['reason'] == 'encoding' else 500
 
 @expenses.route('/<int:expense_id>', methods=['DELETE'])
 @login_required
@@ -119,7 +126,7 @@ def delete_expense(expense_id):
         
         # Only allow expense creator or group admin to delete
         if current_user.id != expense.payer_id and current_user.id != group.created_by_id:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'You are not authorized to delete this expense.',
                 'data': None
@@ -128,14 +135,16 @@ def delete_expense(expense_id):
         # Store group_id before deleting the expense
         group_id = expense.group_id
         
-        # Delete all splits associated with the expense
-        ExpenseSplit.query.filter_by(expense_id=expense_id).delete()
-        
-        # Delete the expense
+        # Take the expense's unsettled splits out of the balance ledger
+        ledger.reverse_expense(expense)
+
+        # Delete the expense; that loaded its splits, which the cascade
+        # deletes along with it
         db.session.delete(expense)
+        changes.record(group_id, changes.EXPENSE_DELETED, expense_id)
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Expense has been deleted.',
             'data': None
@@ -143,14 +152,14 @@ def delete_expense(expense_id):
         
     except SQLAlchemyError as e:
         db.session.rollback()
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': 'Database error occurred',
             'data': None
         }), 500
     except Exception as e:
         db.session.rollback()
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e),
             'data': None
@@ -164,7 +173,7 @@ def settle_expense(expense_id):
         
         # Don't allow payer to settle their own expense
         if current_user.id == expense.payer_id:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'You cannot settle an expense you paid for'
             }), 403
@@ -177,25 +186,35 @@ def settle_expense(expense_id):
                 break
         
         if not user_split:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'You are not involved in this expense'
             }), 404
         
-        # Mark split as settled
+        # Mark split as settled; settling again changes nothing
+        if not ledger.settle_split(expense, user_split):
+            return json_response({
+                'status': 'success',
+                'message': 'Expense already settled'
+            })
         user_split.is_settled = True
         user_split.settled_at = datetime.utcnow()
+        changes.record(expense.group_id, changes.SPLIT_SETTLED, expense.id, {
+            'split_id': user_split.id,
+            'user_id': user_split.user_id,
+            'settled_at': user_split.settled_at.isoformat()
+        })
         
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Expense settled successfully'
         })
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': f'Failed to settle expense: {str(e)}'
         }), 500
@@ -206,7 +225,7 @@ def view_expense(expense_id):
     expense = Expense.query.get_or_404(expense_id)
     
     # Check if user is member of the group
-    if current_user not in expense.group.members:
+    if not expense.group.has_member(current_user.id):
         flash('You are not authorized to view this expense.', 'danger')
         return redirect(url_for('main.dashboard'))
     
@@ -243,20 +262,31 @@ def update_splits(expense_id):
                 flash('Invalid member selected.', 'danger')
                 return redirect(url_for('expenses.view_expense', expense_id=expense_id))
         
-        # Calculate split amount
-        split_amount = expense.amount / len(member_ids)
+        # Calculate exact split amounts
+        shares = list(zip(member_ids, money.allocate(expense.amount_minor, len(member_ids))))
         
         # Delete existing splits
-        ExpenseSplit.query.filter_by(expense_id=expense_id).delete()
+        ledger.reverse_expense(expense)
+        ExpenseSplit.query.filter_by(expense_id=expense_id).delete(synchronize_session='fetch')
+        # The collection still holds the deleted splits
+        db.session.expire(expense, ['splits'])
         
         # Create new splits
-        for member_id in member_ids:
+        for member_id, share in shares:
             split = ExpenseSplit(
                 expense_id=expense_id,
                 user_id=member_id,
-                amount=split_amount
+                amount_minor=share
             )
             db.session.add(split)
+        ledger.record_splits(expense.group_id, expense.payer_id, shares)
+        changes.record(expense.group_id, changes.SPLITS_REPLACED, expense_id, {
+            'splits': [{
+                'user_id': member_id,
+                'amount': money.to_major(share, expense.currency),
+                'is_settled': False
+            } for member_id, share in shares]
+        })
         
         db.session.commit()
         flash('Expense splits updated successfully.', 'success')
@@ -1,6 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, \
+    Response, stream_with_context
 from flask_login import login_required, current_user
-from .models import Group, User, db, Expense, ExpenseSplit, group_members
+from .models import Group, User, db, Expense, ExpenseSplit
+from . import changes, deletion, events, ledger, reads, user_search
+from .settlement import plan_settlements
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+from .money import to_major
+from .serializers import CHANGE, EXPENSE, GROUP, GROUP_SUMMARY, GROUP_SUMMARY_WITH_MEMBERS, USER, USER_REF, \
+    dumps, json_response
 from flask_wtf.csrf import validate_csrf
 from datetime import datetime
 
@@ -23,44 +30,47 @@ def create_group():
         
         if not name:
             if request.is_json:
-                return jsonify({
+                return json_response({
                     'status': 'error',
                     'message': 'Name is required'
                 }), 400
             flash('Group name is required', 'error')
             return redirect(url_for('groups.create_group'))
         
-        # Create new group
+        # Create new group; logging its creation takes it to version 1
         group = Group(
             name=name,
             currency=currency,
-            created_by_id=current_user.id
+            created_by_id=current_user.id,
+            version=0
         )
         
         # Add the creator as the first member
-        group.members.append(current_user)
+        group.members.append(db.session.get(User, current_user.id))
         
         # Add selected members
         if member_ids:
             members = User.query.filter(User.id.in_(member_ids)).all()
             for member in members:
-                if member != current_user and member not in group.members:
+                if member.id != current_user.id and member not in group.members:
                     group.members.append(member)
         
         db.session.add(group)
+        db.session.flush()
+        changes.record(group.id, changes.GROUP_CREATED, group.id, {
+            'name': group.name,
+            'currency': group.currency
+        })
         db.session.commit()
         
         if request.is_json:
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'data': {
                     'id': group.id,
                     'name': group.name,
                     'currency': group.currency,
-                    'members': [{
-                        'id': member.id,
-                        'username': member.username
-                    } for member in group.members]
+                    'members': USER_REF.dump_many(group.members)
                 }
             })
             
@@ -72,97 +82,250 @@ def create_group():
 @groups.route('/<int:group_id>', methods=['GET'])
 @login_required
 def view_group(group_id):
+    # Read the version before the data, so a concurrent change can at worst
+    # make the client fetch again, never keep a stale copy
+    version = _member_version(group_id, current_user.id)
+    if version is None:
+        Group.query.get_or_404(group_id)
+        return json_response({
+            'status': 'error',
+            'message': 'You are not a member of this group.'
+        }), 403
+    etag = reads.group_etag(group_id, version, current_user.id)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    row = db.session.execute(reads.group_detail(group_id)).one()
+    
+    # Only the newest page of expenses; older ones come from group_expenses
+    limit = current_app.config['EXPENSES_PER_PAGE']
+    expenses, next_cursor = reads.split_page(
+        db.session.scalars(reads.expense_page(group_id, limit=limit)).all(), limit)
+    
+    # Calculate member balances
+    paid, owed = reads.contributions(group_id)
+    balances = reads.net_contributions(row.Group, db.session.execute(paid).all(), db.session.execute(owed).all())
+    
+    return group_view_response(row, expenses, next_cursor, balances, etag)
+
+def group_view_response(row, expenses, next_cursor, balances, etag):
+    response = json_response({
+        'status': 'success',
+        'group': GROUP.dump(row),
+        'expenses': EXPENSE.dump_many(expenses),
+        'next_cursor': next_cursor,
+        'balances': balances
+    })
+    return with_etag(response, etag)
+
+def _member_version(group_id, user_id):
+    """The group's version, or None if it does not exist or ``user_id`` is not a member"""
+    return db.session.execute(reads.member_version(group_id, user_id)).scalar()
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+def with_etag(response, etag):
+    # Responses are per user; clients must revalidate before reusing them
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@groups.route('/<int:group_id>/changes', methods=['GET'])
+@login_required
+def group_changes(group_id):
+    """Changes after ``?since=<seq>``, the version the client last synced to."""
+    version = _member_version(group_id, current_user.id)
+    if version is None:
+        Group.query.get_or_404(group_id)
+        return json_response({
+            'status': 'error',
+            'message': 'You are not a member of this group.'
+        }), 403
+    
+    try:
+        since = int(request.args['since'])
+        if since < 0:
+            raise ValueError(since)
+    except (KeyError, ValueError):
+        return json_response({
+            'status': 'error',
+            'message': 'since must be a non-negative group version'
+        }), 400
+    
+    limit = page_size(request.args.get('limit'), current_app.config['CHANGES_PER_PAGE'],
+                      current_app.config['CHANGES_MAX_PER_PAGE'])
+    result = changes.changes_since(group_id, since, version, limit)
+    if result is None:
+        # Compacted away, or older than the log: the client reloads the group
+        return json_response({
+            'status': 'error',
+            'message': f'Changes since version {since} are no longer available; reload the group.',
+            'data': {'version': version}
+        }), 410
+    
+    entries, has_more = result
+    return json_response({
+        'status': 'success',
+        'data': {
+            'changes': CHANGE.dump_many(entries),
+            'next_since': entries[-1].seq if entries else since,
+            'has_more': has_more,
+            'version': version
+        }
+    })
+
+@groups.route('/<int:group_id>/events', methods=['GET'])
+@login_required
+def group_events(group_id):
+    """Server-Sent Events stream of the group's changes.
+    
+    Starts after ``Last-Event-ID`` (sent by reconnecting EventSources) or
+    ``?since=<seq>``, replaying what the client missed from the change log,
+    and otherwise at the current version.
+    """
+    version = _member_version(group_id, current_user.id)
+    if version is None:
+        Group.query.get_or_404(group_id)
+        return json_response({
+            'status': 'error',
+            'message': 'You are not a member of this group.'
+        }), 403
+    
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.args.get('since', version))
+    except ValueError:
+        since = version
+    
+    hub = events.get_hub()
+    try:
+        # Subscribe before catching up, so nothing committed in between is lost
+        subscription = hub.subscribe(group_id)
+    except events.HubFull:
+        response = json_response({
+            'status': 'error',
+            'message': 'Too many open event streams, try again later.'
+        }, 503)
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    # Idle streams must not hold a connection or a read snapshot
+    db.session.close()
+    response = Response(
+        stream_with_context(_event_stream(group_id, current_user.id, max(since, 0), subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The generator's own cleanup never runs if it is never started, as for
+    # HEAD requests; closing the response always releases the slot
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    return response
+
+@groups.route('/events/stats', methods=['GET'])
+@login_required
+def group_events_stats():
+    return json_response({
+        'status': 'success',
+        'data': events.get_hub().stats()
+    })
+
+def _event_stream(group_id, user_id, since, subscription):
+    config = current_app.config
+    try:
+        yield f'retry: {config["EVENTS_RETRY_MS"]}\n\n'
+        frames, last = _catch_up(group_id, user_id, since)
+        while frames is not None:
+            yield from frames
+            notifications, overflowed = subscription.get(config['EVENTS_HEARTBEAT_SECONDS'])
+            if not notifications and not overflowed:
+                # A quiet interval: the log also brings changes committed
+                # by other processes
+                yield ': heartbeat\n\n'
+                frames, last = _catch_up(group_id, user_id, last)
+                continue
+            frames, last, status = events.live_frames(notifications, last)
+            if status == 'closed':
+                yield from frames
+                return
+            if overflowed or status == 'gap':
+                more, last = _catch_up(group_id, user_id, last)
+                frames = None if more is None else frames + more
+    finally:
+        events.get_hub().unsubscribe(subscription)
+
+def _catch_up(group_id, user_id, last):
+    """SSE frames for the logged changes after ``last`` and the new position.
+    
+    Frames are None once the user can no longer see the group.
+    """
+    try:
+        version = _member_version(group_id, user_id)
+        if version is None:
+            return None, last
+        frames = []
+        while last != version:
+            result = changes.changes_since(group_id, last, version, current_app.config['CHANGES_PER_PAGE'])
+            if result is None:
+                frames.append(events.sse_frame({'kind': 'resync', 'version': version}, version))
+                return frames, version
+            entries, _ = result
+            frames.extend(
+                events.sse_frame(changes.notification(entry.seq, entry.kind, entry.entity_id), entry.seq)
+                for entry in entries
+            )
+            last = entries[-1].seq
+        return frames, last
+    finally:
+        db.session.close()
+
+@groups.route('/<int:group_id>/expenses', methods=['GET'])
+@login_required
+def group_expenses(group_id):
     group = Group.query.get_or_404(group_id)
     
     # Check if user is a member of the group
-    if current_user not in group.members:
-        return jsonify({
+    if not group.has_member(current_user.id):
+        return json_response({
             'status': 'error',
             'message': 'You are not a member of this group.'
         }), 403
     
-    # Get group expenses
-    expenses = [{
-        'id': expense.id,
-        'description': expense.description,
-        'amount': expense.amount,
-        'date': expense.date.isoformat() if expense.date else None,
-        'group_id': expense.group_id,
-        'payer_id': expense.payer_id,
-        'currency': expense.currency,
-        'payer': {
-            'id': expense.payer.id,
-            'username': expense.payer.username,
-            'email': expense.payer.email
-        } if expense.payer else None,
-        'splits': [{
-            'id': split.id,
-            'expense_id': split.expense_id,
-            'user_id': split.user_id,
-            'amount': split.amount,
-            'is_settled': split.is_settled,
-            'settled_at': split.settled_at.isoformat() if split.settled_at else None,
-            'user': {
-                'id': split.user.id,
-                'username': split.user.username,
-                'email': split.user.email
-            } if split.user else None
-        } for split in expense.splits]
-    } for expense in group.expenses]
+    limit = page_size(request.args.get('limit'), current_app.config['EXPENSES_PER_PAGE'])
+    try:
+        expenses, next_cursor = reads.split_page(
+            db.session.scalars(reads.expense_page(group.id, request.args.get('cursor'), limit)).all(), limit)
+    except InvalidCursor:
+        return json_response({
+            'status': 'error',
+            'message': 'Invalid cursor'
+        }), 400
     
-    # Calculate member balances
-    balances = {}
-    for member in group.members:
-        # Amount member has paid
-        paid = sum(e.amount for e in group.expenses if e.payer_id == member.id)
-        # Amount member owes
-        owes = sum(s.amount for e in group.expenses for s in e.splits if s.user_id == member.id)
-        balances[member.id] = paid - owes
-    
-    return jsonify({
+    return json_response({
         'status': 'success',
-        'group': {
-            'id': group.id,
-            'name': group.name,
-            'currency': group.currency,
-            'created_by': {
-                'id': group.created_by.id,
-                'username': group.created_by.username
-            },
-            'members': [{
-                'id': member.id,
-                'username': member.username,
-                'email': member.email
-            } for member in group.members],
-            'total_expenses': sum(e.amount for e in group.expenses),
-            'member_count': len(group.members),
-            'created_at': group.created_at.isoformat() if group.created_at else None,
-            'updated_at': group.updated_at.isoformat() if group.updated_at else None
-        },
-        'expenses': expenses,
-        'balances': balances
+        'data': {
+            'expenses': EXPENSE.dump_many(expenses),
+            'next_cursor': next_cursor
+        }
     })
 
 @groups.route('/<int:group_id>/members', methods=['GET', 'POST', 'PUT'])
 @login_required
 def manage_group_members(group_id):
-    group = Group.query.get_or_404(group_id)
+    # Groups being deleted must not gain members again
+    group = Group.query.filter_by(id=group_id, deleting_at=None).first_or_404()
     
     if request.method == 'GET':
         # Check if user is a member of the group
-        if current_user not in group.members:
-            return jsonify({
+        if not group.has_member(current_user.id):
+            return json_response({
                 'status': 'error',
                 'message': 'You are not a member of this group.'
             }), 403
         
-        members = [{
-            'id': member.id,
-            'username': member.username,
-            'email': member.email
-        } for member in group.members]
+        members = USER.dump_many(group.members)
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'members': members
         })
@@ -170,14 +333,14 @@ def manage_group_members(group_id):
     elif request.method == 'PUT':
         # Check if current user is the group creator
         if current_user.id != group.created_by_id:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Only group admin can update members'
             }), 403
         
         data = request.get_json()
         if not data or 'member_ids' not in data:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'No member IDs specified'
             }), 400
@@ -191,16 +354,17 @@ def manage_group_members(group_id):
         # Check if all requested users exist
         missing_ids = set(member_ids) - set(found_ids)
         if missing_ids:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': f'Users not found: {", ".join(map(str, missing_ids))}'
             }), 404
         
         # Update group members
         group.members = users
+        changes.record(group.id, changes.MEMBERS_CHANGED, data={'members': USER_REF.dump_many(users)})
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Group members updated successfully'
         })
@@ -208,14 +372,14 @@ def manage_group_members(group_id):
     else:  # POST method
         # Check if current user is the group creator
         if current_user.id != group.created_by_id:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Only group admin can add members'
             }), 403
         
         data = request.get_json()
         if not data or 'user_id' not in data:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'No user specified'
             }), 400
@@ -224,22 +388,23 @@ def manage_group_members(group_id):
         user = User.query.get(user_id)
         
         if not user:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'User not found'
             }), 404
         
         if user in group.members:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'User is already a member of this group'
             }), 400
         
         # Add user to group
         group.members.append(user)
+        changes.record(group.id, changes.MEMBERS_CHANGED, data={'members': USER_REF.dump_many(group.members)})
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Member added successfully',
             'user': {
@@ -252,29 +417,30 @@ def manage_group_members(group_id):
 @login_required
 def update_group_name(group_id):
     if not request.is_json:
-        return jsonify({'success': False, 'message': 'Invalid request format'}), 400
+        return json_response({'success': False, 'message': 'Invalid request format'}), 400
 
     try:
         validate_csrf(request.headers.get('X-CSRF-TOKEN'))
     except:
-        return jsonify({'success': False, 'message': 'Invalid CSRF token'}), 400
+        return json_response({'success': False, 'message': 'Invalid CSRF token'}), 400
 
-    group = Group.query.get_or_404(group_id)
+    group = Group.query.filter_by(id=group_id, deleting_at=None).first_or_404()
     
     # Only group creator can update the name
     if current_user.id != group.created_by_id:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+        return json_response({'success': False, 'message': 'Unauthorized'}), 403
     
     data = request.get_json()
     new_name = data.get('name', '').strip()
     
     if not new_name:
-        return jsonify({'success': False, 'message': 'Group name cannot be empty'}), 400
+        return json_response({'success': False, 'message': 'Group name cannot be empty'}), 400
         
     group.name = new_name
+    changes.record(group.id, changes.GROUP_RENAMED, data={'name': new_name})
     db.session.commit()
     
-    return jsonify({'success': True})
+    return json_response({'success': True})
 
 @groups.route('/<int:group_id>/expenses/<int:expense_id>/settle', methods=['POST'])
 @login_required
@@ -285,14 +451,14 @@ def settle_expense(group_id, expense_id):
         
         # Verify expense belongs to the group
         if expense.group_id != group_id:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Expense does not belong to this group'
             }), 400
             
         # Check if the current user is the creator of the expense
-        if expense.created_by_id == current_user.id:
-            return jsonify({
+        if expense.payer_id == current_user.id:
+            return json_response({
                 'status': 'error',
                 'message': 'Expense creator cannot settle the expense'
             }), 403
@@ -304,134 +470,236 @@ def settle_expense(group_id, expense_id):
         ).first()
         
         if not user_split:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'You are not part of this expense'
             }), 404
             
-        # Mark the split as settled
+        # Mark the split as settled; settling again changes nothing
+        if not ledger.settle_split(expense, user_split):
+            return json_response({
+                'status': 'success',
+                'message': 'Expense already settled'
+            })
         user_split.is_settled = True
         user_split.settled_at = datetime.utcnow()
+        changes.record(group_id, changes.SPLIT_SETTLED, expense.id, {
+            'split_id': user_split.id,
+            'user_id': user_split.user_id,
+            'settled_at': user_split.settled_at.isoformat()
+        })
         
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Expense settled successfully'
         })
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': f'Failed to settle expense: {str(e)}'
         }), 500
 
+@groups.route('/<int:group_id>/settle-plan', methods=['GET'])
+@login_required
+def settle_plan(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    # Check if user is a member of the group
+    if not group.has_member(current_user.id):
+        return json_response({
+            'status': 'error',
+            'message': 'You are not a member of this group.'
+        }), 403
+    
+    # Plan in exact minor units from one row per member, convert only for
+    # the response
+    transfers = plan_settlements(group.get_net_balances(), precision=0)
+    user_ids = {user_id for transfer in transfers for user_id in transfer[:2]}
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids))) if user_ids else {}
+    
+    return json_response({
+        'status': 'success',
+        'data': {
+            'group_id': group.id,
+            'currency': group.currency,
+            'transfers': [{
+                'from': {
+                    'id': from_id,
+                    'username': usernames[from_id]
+                },
+                'to': {
+                    'id': to_id,
+                    'username': usernames[to_id]
+                },
+                'amount': to_major(amount, group.currency)
+            } for from_id, to_id, amount in transfers]
+        }
+    })
+
 @groups.route('/<int:group_id>', methods=['DELETE'])
 @login_required
 def delete_group(group_id):
-    print(f"Delete request received for group {group_id}")
-    
     group = Group.query.get_or_404(group_id)
-    print(f"Found group: {group.name}")
     
     # Only group creator can delete the group
     if current_user.id != group.created_by_id:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': 'You are not authorized to delete this group'
         }), 403
     
+    if group.deleting_at is not None:
+        # Already detached; resume the purge if its process went away
+        deletion.start_purge(current_app._get_current_object(), group_id)
+        return deletion_response(group_id, deletion.expense_count(group_id))
+    
     try:
-        print("Starting group deletion process")
-        # Delete all expenses in the group
-        expenses = Expense.query.filter_by(group_id=group_id).all()
-        print(f"Found {len(expenses)} expenses to delete")
-        
-        for expense in expenses:
-            # Delete all splits for each expense
-            splits_deleted = ExpenseSplit.query.filter_by(expense_id=expense.id).delete()
-            print(f"Deleted {splits_deleted} splits for expense {expense.id}")
-            db.session.delete(expense)
-        
-        # Delete all user-group associations using the group_members table
-        members_deleted = db.session.execute(group_members.delete().where(group_members.c.group_id == group_id))
-        print(f"Deleted group members associations")
-        
-        # Delete the group
-        db.session.delete(group)
-        print("Group marked for deletion")
-        
+        # One short transaction takes the group out of every view
+        remaining = deletion.expense_count(group_id)
+        deletion.mark_deleting(group)
         db.session.commit()
-        print("Database changes committed")
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Group has been deleted successfully'
-        })
-        
     except Exception as e:
-        print(f"Error during deletion: {str(e)}")
+        current_app.logger.exception('Deleting group %s failed', group_id)
         db.session.rollback()
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': f'Failed to delete group: {str(e)}'
         }), 500
+    
+    if remaining > current_app.config['GROUP_DELETE_BACKGROUND_THRESHOLD']:
+        deletion.start_purge(current_app._get_current_object(), group_id)
+        return deletion_response(group_id, remaining)
+    
+    try:
+        deletion.purge(group_id, current_app.config['GROUP_DELETE_BATCH_SIZE'])
+    except Exception as e:
+        current_app.logger.exception('Purging group %s failed', group_id)
+        db.session.rollback()
+        return json_response({
+            'status': 'error',
+            'message': f'Failed to delete group: {str(e)}'
+        }), 500
+    
+    return json_response({
+        'status': 'success',
+        'message': 'Group has been deleted successfully'
+    })
+
+@groups.route('/<int:group_id>/deletion', methods=['GET'])
+@login_required
+def deletion_status(group_id):
+    # Answers 404 once a background deletion has finished
+    group = Group.query.get_or_404(group_id)
+    if current_user.id != group.created_by_id:
+        return json_response({
+            'status': 'error',
+            'message': 'You are not authorized to view this group'
+        }), 403
+    if group.deleting_at is None:
+        return json_response({
+            'status': 'success',
+            'data': {'group_id': group_id, 'state': 'active'}
+        })
+    return deletion_response(group_id, deletion.expense_count(group_id))
+
+def deletion_response(group_id, remaining):
+    response = json_response({
+        'status': 'success',
+        'message': 'Group is being deleted',
+        'data': {
+            'group_id': group_id,
+            'state': 'deleting',
+            'remaining_expenses': remaining
+        }
+    }, 202)
+    response.headers['Location'] = url_for('groups.deletion_status', group_id=group_id)
+    return response
 
 @groups.route('/', methods=['GET'])
 @login_required
 def get_groups():
-    # Get all groups where the current user is a member
-    user_groups = current_user.groups
+    include_members = request.args.get('include_members', 'false').lower() in ('1', 'true', 'yes')
+    
+    versions = db.session.execute(reads.group_versions(current_user.id)).all()
+    etag = reads.groups_etag(current_user.id, versions, include_members)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
     
-    return jsonify({
+    # Get all groups where the current user is a member
+    rows = db.session.execute(reads.group_summaries(current_user.id, include_members)).all()
+    return groups_response(rows, include_members, etag)
+
+def groups_response(rows, include_members, etag):
+    schema = GROUP_SUMMARY_WITH_MEMBERS if include_members else GROUP_SUMMARY
+    response = json_response({
         'status': 'success',
         'data': {
-            'groups': [{
-                'id': group.id,
-                'name': group.name,
-                'currency': group.currency,
-                'created_by': {
-                    'id': group.created_by.id if group.created_by else None,
-                    'username': group.created_by.username if group.created_by else 'Unknown'
-                },
-                'members': [{
-                    'id': member.id,
-                    'username': member.username,
-                    'email': member.email
-                } for member in group.members],
-                'total_expenses': sum(expense.amount for expense in group.expenses),
-                'member_count': len(group.members),
-                'created_at': group.created_at.isoformat() if group.created_at else None,
-                'updated_at': group.updated_at.isoformat() if group.updated_at else None
-            } for group in user_groups]
+            'groups': schema.dump_many(rows)
         }
     })
+    return with_etag(response, etag)
 
 @groups.route('/users/search', methods=['GET'])
 @login_required
 def search_users():
     query = request.args.get('q', '')
     if not query:
-        return jsonify([])
+        return json_response([])
     
-    users = User.query.filter(User.username.ilike(f'%{query}%')).limit(5).all()
-    return jsonify([{
-        'id': user.id,
-        'username': user.username
-    } for user in users])
+    limit = page_size(
+        request.args.get('limit'),
+        current_app.config['USER_SEARCH_LIMIT'],
+        current_app.config['USER_SEARCH_MAX_LIMIT']
+    )
+    users = user_search.search(query, limit)
+    return json_response(USER.dump_many(users))
 
 @groups.route('/users', methods=['GET'])
 @login_required
 def get_users():
-    users = User.query.all()
-    return jsonify({
+    """List users by id, one page at a time.
+
+    ``?cursor=`` continues after a previous page. With ``?format=ndjson``
+    (or ``Accept: application/x-ndjson``) every user is streamed as one
+    JSON object per line instead, fetched in batches so memory stays flat.
+    """
+    if request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(stream_with_context(_stream_users()), mimetype='application/x-ndjson')
+    
+    limit = page_size(request.args.get('limit'), current_app.config['USERS_PER_PAGE'])
+    query = db.session.query(User.id, User.username, User.email)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            (after_id,) = decode_cursor(cursor, int)
+        except InvalidCursor:
+            return json_response({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }), 400
+        query = query.filter(User.id > after_id)
+    
+    # One extra row tells us whether another page exists
+    users = query.order_by(User.id).limit(limit + 1).all()
+    next_cursor = encode_cursor(users[limit - 1].id) if len(users) > limit else None
+    return json_response({
         'status': 'success',
         'data': {
-            'users': [{
-                'id': user.id,
-                'username': user.username,
-                'email': user.email
-            } for user in users]
+            'users': USER.dump_many(users[:limit]),
+            'next_cursor': next_cursor
         }
     })
+
+def _stream_users():
+    rows = db.session.execute(
+        db.select(User.id, User.username, User.email)
+            .order_by(User.id)
+            .execution_options(yield_per=current_app.config['USERS_STREAM_BATCH_SIZE'])
+    )
+    for user in rows:
+        yield dumps(USER.dump(user)) + b'\n'
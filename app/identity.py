@@ -0,0 +1,129 @@
+"""Cached identity for authenticated requests.
+
+Flask-Login calls the user loader on every request. Instead of loading the
+full ``User`` row (and whatever relationships come with it) each time, the
+loader hands out a small immutable :class:`Identity` that is cached per
+process for ``USER_CACHE_TTL`` seconds. Code that needs the ORM object can
+still reach it: attribute access that the identity cannot answer falls
+through to ``User``, loaded once per request.
+
+Only the id, username and email are cached. Group membership is always
+read from the database, so authorization never relies on cached data.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+from .models import User
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class Identity(UserMixin):
+    """The authenticated principal, detached from any database session."""
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    @property
+    def record(self):
+        """The ``User`` row for this identity, loaded once per request."""
+        records = g.setdefault('_identity_records', {})
+        if self.id not in records:
+            records[self.id] = db.session.get(User, self.id)
+        return records[self.id]
+
+    def __getattr__(self, name):
+        # Only reached for attributes the identity does not carry itself,
+        # e.g. current_user.groups or current_user.get_all_balances()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+    def __eq__(self, other):
+        if isinstance(other, (Identity, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((Identity, self.id))
+
+    def __repr__(self):
+        return f'<Identity {self.username}>'
+
+
+def load_identity(user_id):
+    """Return the cached :class:`Identity` for ``user_id``, or None if it does not exist."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] > now:
+            _cache.move_to_end(user_id)
+            return entry[1]
+
+    row = db.session.query(User.id, User.username, User.email)\
+        .filter(User.id == user_id)\
+        .first()
+    if row is None:
+        invalidate_user(user_id)
+        return None
+
+    identity = Identity(*row)
+    ttl = current_app.config.get('USER_CACHE_TTL', 60)
+    if ttl > 0:
+        with _lock:
+            _cache[user_id] = (now + ttl, identity)
+            _cache.move_to_end(user_id)
+            while len(_cache) > current_app.config.get('USER_CACHE_SIZE', 10000):
+                _cache.popitem(last=False)
+    return identity
+
+
+def cached_identity(user_id):
+    """The cached :class:`Identity` for ``user_id``, or None on a miss. Never queries."""
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+    return None
+
+
+def invalidate_user(*user_ids):
+    """Drop cached identities, e.g. after a profile change."""
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
+    # Invalidate again once the change is visible to other requests
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    invalidate_user(*session.info.pop('changed_user_ids', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_users(session):
+    session.info.pop('changed_user_ids', None)
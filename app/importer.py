@@ -0,0 +1,180 @@
+"""Bulk import of expenses from CSV or NDJSON.
+
+Rows are parsed from the request stream one at a time and validated
+against the group's member ids, which are loaded once up front. Valid rows
+are buffered and written in chunks through
+:func:`expense_service.create_expenses`, one commit per chunk, so a large
+import never holds the write lock for long.
+
+Chunks are not atomic as a whole: when the body turns out not to be UTF-8
+or a chunk fails midway, the chunks committed so far stay, only
+the current chunk is rolled back, and the summary's ``stopped`` entry
+names the first row that was not imported. A client resumes from that row
+instead of retrying the whole body.
+
+Every row accepts ``description``, ``amount`` and ``split_with`` (a list
+of user ids; in CSV separated by ``;``), plus optional ``payer_id`` and an
+ISO 8601 ``date``.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import db
+from .money import to_minor
+from . import expense_service
+
+CSV_TYPES = ('text/csv', 'application/csv')
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+class ImportFormatError(ValueError):
+    """Raised when the request body is not in a supported format."""
+
+
+class RowError(ValueError):
+    """A single row failed validation; the rest of the import continues."""
+
+
+def read_rows(stream, mimetype):
+    """Yield ``(row_number, dict)`` from a binary request stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if mimetype in CSV_TYPES:
+        for number, row in enumerate(csv.DictReader(text), 1):
+            yield number, row
+    elif mimetype in NDJSON_TYPES:
+        for number, line in enumerate(text, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    else:
+        raise ImportFormatError(f'Unsupported content type: {mimetype or "none"}')
+
+
+def parse_row(row, member_ids, default_payer_id, can_set_payer, currency):
+    """Validate one raw row into an entry for ``expense_service.create_expenses``."""
+    if not isinstance(row, dict):
+        raise RowError('Row is not a valid object')
+
+    description = row.get('description')
+    if not description or not isinstance(description, str):
+        raise RowError('Description is required')
+
+    try:
+        amount_minor = to_minor(row.get('amount'), currency)
+    except (ArithmeticError, ValueError):
+        raise RowError('Invalid amount')
+    if amount_minor <= 0:
+        raise RowError('Amount must be greater than 0')
+
+    split_with = row.get('split_with')
+    if isinstance(split_with, str):
+        split_with = [part for part in split_with.replace(',', ';').split(';') if part.strip()]
+
+    payer_id = row.get('payer_id') or default_payer_id
+    try:
+        payer_id = int(payer_id)
+    except (ArithmeticError, TypeError, ValueError):
+        raise RowError('Invalid payer ID')
+    if payer_id != default_payer_id and not can_set_payer:
+        raise RowError('Only the group admin can import expenses paid by other members')
+    if payer_id not in member_ids:
+        raise RowError(f'Invalid payer ID: {payer_id}')
+
+    try:
+        split_with = expense_service.normalize_split(payer_id, split_with, member_ids)
+    except expense_service.ExpenseError as e:
+        raise RowError(str(e))
+
+    date = row.get('date')
+    if date:
+        try:
+            date = datetime.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise RowError('Invalid date')
+    else:
+        date = datetime.utcnow()
+
+    return {
+        'description': description,
+        'amount_minor': amount_minor,
+        'date': date,
+        'payer_id': payer_id,
+        'split_with': split_with
+    }
+
+
+def import_expenses(group, rows, payer_id, can_set_payer, chunk_size=1000, max_errors=1000):
+    """Import parsed ``rows`` into ``group``; returns a summary dict.
+
+    ``stopped`` is None when the whole body was read, otherwise
+    ``{'row', 'reason', 'error'}``: rows from ``row`` on were not imported,
+    and ``reason`` is ``'encoding'``, ``'database'`` or ``'error'`` for
+    anything else that failed a chunk.
+    """
+    member_ids = expense_service.group_member_ids(group.id)
+
+    imported = 0
+    failed = 0
+    errors = []
+    chunk = []
+    # Row number of the first row in ``chunk``, and of the last row read
+    chunk_start = None
+    last = 0
+    stopped = None
+    try:
+        for number, row in rows:
+            last = number
+            try:
+                entry = parse_row(row, member_ids, payer_id, can_set_payer, group.currency)
+            except RowError as e:
+                failed += 1
+                if len(errors) < max_errors:
+                    errors.append({'row': number, 'error': str(e)})
+                continue
+            if not chunk:
+                chunk_start = number
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                imported += _insert_chunk(group, chunk)
+                chunk = []
+        if chunk:
+            imported += _insert_chunk(group, chunk)
+            chunk = []
+    except UnicodeDecodeError:
+        stopped = _stop(chunk, chunk_start, last, 'encoding', 'Request body must be UTF-8')
+    except SQLAlchemyError:
+        stopped = _stop(chunk, chunk_start, last, 'database', 'Database error occurred')
+    except Exception:
+        # Whatever else fails a chunk, the rows committed before it stay
+        # and must be reported
+        current_app.logger.exception('Bulk import into group %s stopped', group.id)
+        stopped = _stop(chunk, chunk_start, last, 'error', 'Import failed')
+
+    return {
+        'imported': imported,
+        'failed': failed,
+        'errors': errors,
+        'errors_truncated': failed > len(errors),
+        'stopped': stopped
+    }
+
+
+def _stop(chunk, chunk_start, last, reason, error):
+    # Earlier chunks are committed; only the current one is dropped
+    db.session.rollback()
+    return {'row': chunk_start if chunk else last + 1, 'reason': reason, 'error': error}
+
+
+def _insert_chunk(group, chunk):
+    expense_service.create_expenses(group, chunk)
+    db.session.commit()
+    return len(chunk)
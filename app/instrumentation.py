@@ -0,0 +1,216 @@
+"""Opt-in SQL instrumentation: query counts, DB time and a slow-query log.
+
+With ``SQL_INSTRUMENTATION`` set, every engine gets ``before_cursor_execute``
+and ``after_cursor_execute`` listeners. They time each statement and add
+it to the current request's :class:`QueryStats`, which goes out as a
+``Server-Timing`` header::
+
+    Server-Timing: db;dur=12.41;desc="7 queries", sql-1;dur=6.02;desc="SELECT expense, user"
+
+Statements slower than ``SLOW_QUERY_MS`` (inside a request or not) are
+written as JSON lines to the rotating ``SLOW_QUERY_LOG``. Each line has
+the normalized SQL, the ``app/`` frame that issued it and the request,
+but only the types of the parameters, never their values.
+
+When the setting is off nothing is registered, so there is no per-query
+cost at all.
+"""
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+_stats = ContextVar('sql_stats', default=None)
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_APP_DIR)
+
+_SPACE = re.compile(r'\s+')
+# String and numeric literals; SQLAlchemy binds most values, but text()
+# statements and rendered LIMITs can carry them inline
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Expanded IN lists differ only in their length
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_TABLE = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+slow_query_logger = logging.getLogger('app.slow_queries')
+
+
+class QueryStats:
+    """Statements executed while handling one request."""
+
+    def __init__(self, keep=3):
+        self.count = 0
+        self.seconds = 0.0
+        self.keep = keep
+        self._slowest = []  # min-heap of (seconds, order, statement)
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.keep <= 0:
+            return
+        entry = (seconds, self.count, statement)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """``(seconds, statement)`` of the slowest statements, slowest first."""
+        return [(seconds, statement) for seconds, _, statement in sorted(self._slowest, reverse=True)]
+
+    def server_timing(self):
+        entries = [f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"']
+        for rank, (seconds, statement) in enumerate(self.slowest(), 1):
+            entries.append(f'sql-{rank};dur={seconds * 1000:.2f};desc="{summarize(statement)}"')
+        return ', '.join(entries)
+
+
+def current_stats():
+    """The :class:`QueryStats` of the request being handled, if it is instrumented."""
+    return _stats.get()
+
+
+def begin_request(keep=3):
+    """Start counting statements for the current request."""
+    stats = QueryStats(keep)
+    _stats.set(stats)
+    return stats
+
+
+def end_request():
+    """Stop counting and return what was counted."""
+    stats = _stats.get()
+    _stats.set(None)
+    return stats
+
+
+def normalize(statement):
+    """``statement`` on one line, with literals and IN lists replaced by placeholders."""
+    statement = _SPACE.sub(' ', statement).strip()
+    statement = _LITERAL.sub('?', statement)
+    return _IN_LIST.sub('(?, ...)', statement)
+
+
+def redact(parameters, executemany=False):
+    """Describe bound parameters without their values."""
+    if executemany:
+        return {'rows': len(parameters)}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def call_site():
+    """``path:line in function`` of the innermost app frame outside this module."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename != __file__:
+            return f'{os.path.relpath(filename, _ROOT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def summarize(statement):
+    """The verb and tables of ``statement``, e.g. ``SELECT expense, user``.
+
+    Short enough for a header and free of quotes, which Server-Timing
+    descriptions would need escaped.
+    """
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    tables = list(dict.fromkeys(_TABLE.findall(statement)))
+    return f"{verb} {', '.join(tables)}".strip()
+
+
+def instrument_engine(engine, slow_seconds):
+    """Time every statement on ``engine`` and log the ones over ``slow_seconds``."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._sql_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context._sql_started
+        stats = _stats.get()
+        if stats is not None:
+            stats.add(statement, seconds)
+        if slow_seconds is not None and seconds >= slow_seconds:
+            log_slow_query(statement, parameters, executemany, seconds)
+
+
+def log_slow_query(statement, parameters, executemany, seconds):
+    slow_query_logger.warning(json.dumps({
+        'time': datetime.utcnow().isoformat(timespec='milliseconds'),
+        'duration_ms': round(seconds * 1000, 2),
+        'statement': normalize(statement),
+        'parameters': redact(parameters, executemany),
+        'call_site': call_site(),
+        'request': f'{request.method} {request.path}' if has_request_context() else None,
+    }))
+
+
+def slow_query_seconds(config):
+    """``SLOW_QUERY_MS`` in seconds, or None when slow queries are not logged."""
+    slow_ms = config.get('SLOW_QUERY_MS')
+    return None if slow_ms is None else slow_ms / 1000
+
+
+def _configure_log(app):
+    path = app.config.get('SLOW_QUERY_LOG')
+    if not path or any(getattr(handler, 'baseFilename', None) == os.path.abspath(path)
+                       for handler in slow_query_logger.handlers):
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=app.config.get('SLOW_QUERY_LOG_BACKUP_COUNT', 5)
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+    # Keep the JSON lines out of the application log
+    slow_query_logger.propagate = False
+
+
+def init_instrumentation(app, db):
+    """Instrument ``db``'s engines and add the ``Server-Timing`` header, if enabled."""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+
+    slow_seconds = slow_query_seconds(app.config)
+    if slow_seconds is not None:
+        _configure_log(app)
+    for engine in db.engines.values():
+        instrument_engine(engine, slow_seconds)
+
+    keep = app.config.get('SQL_SLOWEST_PER_REQUEST', 3)
+    header = app.config.get('SQL_TIMING_HEADER', True)
+
+    @app.before_request
+    def _begin_query_stats():
+        begin_request(keep)
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = end_request()
+        if stats is not None and header:
+            response.headers.add('Server-Timing', stats.server_timing())
+        return response
+
+    @app.teardown_request
+    def _reset_query_stats(exception=None):
+        # after_request does not run when a view raises
+        _stats.set(None)
@@ -0,0 +1,164 @@
+"""Maintenance of the materialized balance ledger.
+
+Every unsettled split moves money from its user (the debtor) to the expense
+payer (the creditor). Instead of re-aggregating ``expense_split`` on every
+balance lookup, the write paths push those movements into ``balance_ledger``
+in the same transaction as the change itself.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func
+
+from .models import db, BalanceLedger, Expense, ExpenseSplit, Group
+
+
+def split_deltas(payer_id, splits, sign=1):
+    """Turn ``(user_id, amount_minor)`` pairs into ledger deltas for one payer.
+
+    Splits owed by the payer to themselves never create a debt and are
+    skipped. Pass ``sign=-1`` to reverse previously recorded splits.
+    """
+    deltas = defaultdict(int)
+    for user_id, amount in splits:
+        if user_id == payer_id or not amount:
+            continue
+        deltas[(payer_id, user_id)] += sign * amount
+    return deltas
+
+
+def apply_deltas(group_id, deltas):
+    """Add ``{(creditor_id, debtor_id): amount}`` to a group's ledger.
+
+    Both mirrored rows are updated. Nothing is committed; callers commit
+    together with the change that produced the deltas.
+    """
+    mirrored = defaultdict(int)
+    for (creditor_id, debtor_id), amount in deltas.items():
+        if not amount:
+            continue
+        mirrored[(creditor_id, debtor_id)] += amount
+        mirrored[(debtor_id, creditor_id)] -= amount
+
+    if not mirrored:
+        return
+
+    rows = [{
+        'group_id': group_id,
+        'creditor_id': creditor_id,
+        'debtor_id': debtor_id,
+        'net_amount': amount
+    } for (creditor_id, debtor_id), amount in mirrored.items()]
+
+    statement = _upsert_statement()
+    if statement is not None:
+        db.session.execute(statement, rows)
+        return
+
+    # Dialects without an upsert fall back to read-modify-write
+    user_ids = {row['creditor_id'] for row in rows}
+    existing = {
+        (entry.creditor_id, entry.debtor_id): entry
+        for entry in BalanceLedger.query
+            .filter(BalanceLedger.group_id == group_id)
+            .filter(BalanceLedger.creditor_id.in_(user_ids))
+            .filter(BalanceLedger.debtor_id.in_(user_ids))
+            .all()
+    }
+    for row in rows:
+        entry = existing.get((row['creditor_id'], row['debtor_id']))
+        if entry is None:
+            db.session.add(BalanceLedger(**row))
+        else:
+            entry.net_amount += row['net_amount']
+
+
+def record_splits(group_id, payer_id, splits, sign=1):
+    """Apply ``(user_id, amount_minor)`` splits of one expense to the ledger."""
+    apply_deltas(group_id, split_deltas(payer_id, splits, sign))
+
+
+def reverse_expense(expense):
+    """Remove the unsettled splits of an expense from the ledger."""
+    record_splits(
+        expense.group_id,
+        expense.payer_id,
+        [(split.user_id, split.amount_minor) for split in expense.splits if not split.is_settled],
+        sign=-1
+    )
+
+
+def settle_split(expense, split):
+    """Clear one split from the ledger. Returns False if it was already settled."""
+    if split.is_settled:
+        return False
+    record_splits(expense.group_id, expense.payer_id, [(split.user_id, split.amount_minor)], sign=-1)
+    return True
+
+
+def rebuild(group_id=None):
+    """Regenerate the ledger from ``expense`` and ``expense_split``.
+
+    Rebuilds a single group when ``group_id`` is given, otherwise the whole
+    table. Groups being deleted get no rows. Returns the number of
+    payer/debtor totals applied. Nothing is committed.
+    """
+    delete = BalanceLedger.query
+    totals = db.session.query(
+            Expense.group_id,
+            Expense.payer_id,
+            ExpenseSplit.user_id,
+            func.sum(ExpenseSplit.amount_minor)
+        )\
+        .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+        .join(Group, Group.id == Expense.group_id)\
+        .filter(Group.deleting_at.is_(None))\
+        .filter(ExpenseSplit.is_settled.is_not(True))\
+        .filter(ExpenseSplit.user_id != Expense.payer_id)\
+        .group_by(Expense.group_id, Expense.payer_id, ExpenseSplit.user_id)
+
+    if group_id is not None:
+        delete = delete.filter(BalanceLedger.group_id == group_id)
+        totals = totals.filter(Expense.group_id == group_id)
+
+    delete.delete(synchronize_session=False)
+
+    by_group = defaultdict(lambda: defaultdict(int))
+    for row_group_id, payer_id, user_id, amount in totals:
+        by_group[row_group_id][(payer_id, user_id)] += amount or 0
+
+    for row_group_id, deltas in by_group.items():
+        apply_deltas(row_group_id, deltas)
+    return sum(len(deltas) for deltas in by_group.values())
+
+
+def ensure_populated():
+    """Build the ledger for databases created before it existed."""
+    if db.session.query(BalanceLedger.group_id).first() is not None:
+        return False
+    has_debts = db.session.query(ExpenseSplit.id)\
+        .join(Expense, ExpenseSplit.expense_id == Expense.id)\
+        .filter(ExpenseSplit.is_settled.is_not(True))\
+        .filter(ExpenseSplit.user_id != Expense.payer_id)\
+        .first()
+    if has_debts is None:
+        return False
+    rebuild()
+    db.session.commit()
+    return True
+
+
+def _upsert_statement():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+
+    table = BalanceLedger.__table__
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.group_id, table.c.creditor_id, table.c.debtor_id],
+        set_={'net_amount': table.c.net_amount + statement.excluded.net_amount}
+    )
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
-from .models import Group, Expense, ExpenseSplit
+from .dashboard import group_balances, recent_expenses
+from .money import to_major
 
 # Create main blueprint
 main = Blueprint('main', __name__)
@@ -19,27 +20,14 @@ def dashboard():
     # Get all balances with other users
     user_balances = current_user.get_all_balances()
     
-    # Calculate group balances
-    group_balances = []
-    for group in user_groups:
-        balance = current_user.get_group_balance(group)
-        if balance != 0:  # Only include non-zero balances
-            group_balances.append({
-                'group': group,
-                'balance': balance
-            })
-    
-    # Get recent expenses
-    recent_expenses = Expense.query\
-        .join(ExpenseSplit)\
-        .filter((Expense.payer_id == current_user.id) | 
-                (ExpenseSplit.user_id == current_user.id))\
-        .order_by(Expense.date.desc())\
-        .limit(5)\
-        .all()
+    # Calculate group balances, non-zero ones only
+    balances_by_group = [{
+        'group': group,
+        'balance': to_major(balance, group.currency)
+    } for group, balance in group_balances(current_user.id) if balance != 0]
     
     return render_template('dashboard.html',
                          user_balances=user_balances,
-                         group_balances=group_balances,
+                         group_balances=balances_by_group,
                          groups=user_groups,
-                         recent_expenses=recent_expenses)
+                         recent_expenses=recent_expenses(current_user.id))
@@ -1,25 +1,29 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from sqlalchemy import func
+from flask import current_app
+from sqlalchemy import func, case, select, union_all
 from .extensions import db
+from .money import to_major
+from . import passwords
 
 # Define the many-to-many relationship table for group members
 group_members = db.Table('group_members',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id', name='fk_group_members_user_id'), primary_key=True),
     db.Column('group_id', db.Integer, db.ForeignKey('group.id', name='fk_group_members_group_id'), primary_key=True)
 )
+# The primary key leads with user_id; per-group lookups need their own index
+db.Index('ix_group_members_group_id', group_members.c.group_id)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     
     # Groups this user is a member of (many-to-many)
     groups = db.relationship('Group', 
                            secondary=group_members,
-                           lazy='subquery',
+                           lazy='select',
                            backref=db.backref('members', lazy=True))
     
     # Groups created by this user
@@ -37,120 +41,112 @@ class User(UserMixin, db.Model):
     __table_args__ = (
         db.UniqueConstraint('username', name='uq_user_username'),
         db.UniqueConstraint('email', name='uq_user_email'),
+        # Case-insensitive prefix search, see app/user_search.py
+        db.Index('ix_user_username_lower', func.lower(username)),
+        db.Index('ix_user_email_lower', func.lower(email)),
     )
     
     def set_password(self, password):
-        print(f"Setting password hash for {self.username}")  # Debug line
-        self.password_hash = generate_password_hash(password)
-        print(f"Password hash set: {self.password_hash}")  # Debug line
+        self.password_hash = passwords.hash_password(password)
         
     def check_password(self, password):
-        print(f"Checking password for {self.username}")  # Debug line
-        print(f"Stored hash: {self.password_hash}")  # Debug line
-        result = check_password_hash(self.password_hash, password)
-        print(f"Password check result: {result}")  # Debug line
-        return result
+        """Verify ``password``, upgrading the stored hash if the configured cost changed.
+
+        The caller commits the session to keep an upgraded hash.
+        """
+        if not passwords.verify_password(self.password_hash, password):
+            return False
+        if passwords.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def get_balance_with_user(self, other_user):
         """Calculate the balance between this user and another user"""
-        # Money this user paid that other_user owes
-        money_owed_to_me = db.session.query(func.sum(ExpenseSplit.amount)).join(Expense)\
-            .filter(Expense.payer_id == self.id)\
-            .filter(ExpenseSplit.user_id == other_user.id)\
-            .scalar() or 0
-
-        # Money other_user paid that this user owes
-        money_i_owe = db.session.query(func.sum(ExpenseSplit.amount)).join(Expense)\
-            .filter(Expense.payer_id == other_user.id)\
-            .filter(ExpenseSplit.user_id == self.id)\
-            .scalar() or 0
-
-        return money_owed_to_me - money_i_owe
+        totals = balance_totals(self.id, counterparty_id=other_user.id)
+        # Sum per group first: each group keeps its own currency's minor units
+        rows = db.session.query(totals.c.balance, Group.currency)\
+            .select_from(totals)\
+            .join(Group, Group.id == totals.c.group_id)\
+            .all()
+        return sum(to_major(balance, currency) for balance, currency in rows)
 
     def get_all_balances(self):
         """Get balances with all users"""
-        balances = []
-        # Get all users this user has transactions with, along with their groups
-        related_users = db.session.query(User, Group).distinct()\
-            .join(ExpenseSplit, ExpenseSplit.user_id == User.id)\
-            .join(Expense, ExpenseSplit.expense_id == Expense.id)\
-            .join(Group, Expense.group_id == Group.id)\
-            .filter(
-                db.or_(
-                    Expense.payer_id == self.id,
-                    db.and_(
-                        ExpenseSplit.user_id != self.id,
-                        Expense.payer_id == ExpenseSplit.user_id
-                    )
-                )
-            )\
-            .filter(User.id != self.id)\
+        # One statement: the per-(counterparty, group) totals joined to the
+        # users and groups they refer to
+        totals = balance_totals(self.id)
+        rows = db.session.query(totals.c.balance, User, Group)\
+            .select_from(totals)\
+            .join(User, User.id == totals.c.counterparty_id)\
+            .join(Group, Group.id == totals.c.group_id)\
+            .filter(totals.c.balance != 0)\
+            .order_by(totals.c.counterparty_id, totals.c.group_id)\
             .all()
 
-        # Group the results by user and calculate balance for each group
-        user_group_balances = {}
-        for user, group in related_users:
-            if user.id not in user_group_balances:
-                user_group_balances[user.id] = []
-            
-            # Calculate balance for this user in this group
-            balance = self.get_balance_with_user_in_group(user, group)
-            if balance != 0:  # Only include non-zero balances
-                user_group_balances[user.id].append({
-                    'group': group,
-                    'balance': balance
-                })
-
-        # Create the final balance list
-        for user_id, group_balances in user_group_balances.items():
-            user = User.query.get(user_id)
-            for group_balance in group_balances:
-                balances.append({
-                    'user': user,
-                    'group': group_balance['group'],
-                    'balance': group_balance['balance']
-                })
-        
-        return balances
+        return [{
+            'user': user,
+            'group': group,
+            'balance': to_major(balance, group.currency)
+        } for balance, user, group in rows]
 
     def get_balance_with_user_in_group(self, other_user, group):
         """Calculate the balance between this user and another user within a specific group"""
-        # Money this user paid that other_user owes in this group
-        money_owed_to_me = db.session.query(func.sum(ExpenseSplit.amount)).join(Expense)\
-            .filter(Expense.payer_id == self.id)\
-            .filter(ExpenseSplit.user_id == other_user.id)\
-            .filter(Expense.group_id == group.id)\
-            .scalar() or 0
-
-        # Money other_user paid that this user owes in this group
-        money_i_owe = db.session.query(func.sum(ExpenseSplit.amount)).join(Expense)\
-            .filter(Expense.payer_id == other_user.id)\
-            .filter(ExpenseSplit.user_id == self.id)\
-            .filter(Expense.group_id == group.id)\
-            .scalar() or 0
-
-        return money_owed_to_me - money_i_owe
+        totals = balance_totals(self.id, group_id=group.id, counterparty_id=other_user.id)
+        return to_major(db.session.query(func.sum(totals.c.balance)).scalar(), group.currency)
 
     def get_group_balance(self, group):
         """Calculate the user's balance within a specific group"""
-        # Money this user paid in group expenses
-        paid_in_group = db.session.query(func.sum(Expense.amount))\
-            .filter(Expense.payer_id == self.id)\
-            .filter(Expense.group_id == group.id)\
-            .scalar() or 0
-
-        # Money this user owes in group expenses
-        owed_in_group = db.session.query(func.sum(ExpenseSplit.amount))\
-            .join(Expense)\
-            .filter(ExpenseSplit.user_id == self.id)\
-            .filter(Expense.group_id == group.id)\
-            .scalar() or 0
-
-        return paid_in_group - owed_in_group
+        totals = balance_totals(self.id, group_id=group.id)
+        return to_major(db.session.query(func.sum(totals.c.balance)).scalar(), group.currency)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
+def balance_totals(user_id, group_id=None, counterparty_id=None):
+    """Net unsettled balances of one user as a subquery.
+
+    Yields ``(group_id, counterparty_id, balance)`` rows where a positive
+    balance, in the group currency's minor units, means the counterparty
+    owes ``user_id``. Reads the materialized
+    ledger when ``BALANCE_LEDGER`` is enabled, otherwise aggregates
+    ``expense`` and ``expense_split`` in a single grouped statement.
+    Built without a session, so the async read path can use it as well.
+    """
+    if current_app.config.get('BALANCE_LEDGER', True):
+        query = select(
+                BalanceLedger.group_id.label('group_id'),
+                BalanceLedger.debtor_id.label('counterparty_id'),
+                BalanceLedger.net_amount.label('balance')
+            )\
+            .where(BalanceLedger.creditor_id == user_id)
+        if group_id is not None:
+            query = query.where(BalanceLedger.group_id == group_id)
+        if counterparty_id is not None:
+            query = query.where(BalanceLedger.debtor_id == counterparty_id)
+        return query.subquery()
+
+    # Splits of expenses this user paid are owed to them; splits they owe
+    # on someone else's expense count against them
+    is_payer = Expense.payer_id == user_id
+    counterparty = case((is_payer, ExpenseSplit.user_id), else_=Expense.payer_id)
+    query = select(
+            Expense.group_id.label('group_id'),
+            counterparty.label('counterparty_id'),
+            func.sum(case((is_payer, ExpenseSplit.amount_minor), else_=-ExpenseSplit.amount_minor)).label('balance')
+        )\
+        .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+        .where(db.or_(is_payer, ExpenseSplit.user_id == user_id))\
+        .where(ExpenseSplit.user_id != Expense.payer_id)\
+        .where(ExpenseSplit.is_settled.is_not(True))
+    if group_id is not None:
+        query = query.where(Expense.group_id == group_id)
+    if counterparty_id is not None:
+        query = query.where(db.or_(
+            db.and_(is_payer, ExpenseSplit.user_id == counterparty_id),
+            Expense.payer_id == counterparty_id
+        ))
+    return query.group_by(Expense.group_id, counterparty).subquery()
+
 def update_existing_timestamps():
     groups = Group.query.all()
     now = datetime.utcnow()
@@ -161,6 +157,16 @@ def update_existing_timestamps():
             group.updated_at = now
     db.session.commit()
 
+def bump_group_version(group_id, count=1):
+    """Advance a group's version by ``count`` and updated_at in the current
+    transaction. Returns the new version."""
+    return db.session.execute(
+        db.update(Group)
+            .where(Group.id == group_id)
+            .values(version=Group.version + count, updated_at=datetime.utcnow())
+            .returning(Group.version)
+    ).scalar_one()
+
 class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -169,6 +175,11 @@ class Group(db.Model):
     currency = db.Column(db.String(3), nullable=False, default='USD')
     created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every change to the group, its members, expenses or splits;
+    # the ETag of the group views is derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Set when the group is being deleted in batches, see app/deletion.py
+    deleting_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     expenses = db.relationship('Expense',
@@ -187,9 +198,16 @@ class Group(db.Model):
 
     def get_total_expenses(self):
         """Get total amount of expenses in this group"""
-        return db.session.query(func.sum(Expense.amount))\
+        total = db.session.query(func.sum(Expense.amount_minor))\
                         .filter(Expense.group_id == self.id)\
-                        .scalar() or 0
+                        .scalar()
+        return to_major(total, self.currency)
+
+    def has_member(self, user_id):
+        """Check membership with a primary key lookup instead of loading all members"""
+        return db.session.query(group_members.c.user_id)\
+                        .filter_by(group_id=self.id, user_id=user_id)\
+                        .first() is not None
 
     def get_member_count(self):
         """Get number of members in this group"""
@@ -197,54 +215,127 @@ class Group(db.Model):
                         .filter_by(group_id=self.id)\
                         .count()
 
-    def get_member_balances(self):
-        """Calculate the current balance for each member in the group"""
+    def get_member_balances(self, minor_units=False):
+        """Calculate the current balance for each member in the group
+
+        Amounts are in the group currency, or in its integer minor units
+        when ``minor_units`` is set.
+        """
         balances = {}
         # Initialize balances for all members
         for member in self.members:
             balances[member.id] = {
                 'user': member,
-                'owes': 0.0,  # Amount they owe to others
-                'owed': 0.0,  # Amount others owe them
+                'owes': 0,  # Amount they owe to others
+                'owed': 0,  # Amount others owe them
                 'details': {}  # Detailed breakdown of who owes whom
             }
             # Initialize details for each other member
             for other_member in self.members:
                 if other_member.id != member.id:
-                    balances[member.id]['details'][other_member.id] = 0.0
-
-        # Calculate balances from all expenses
-        for expense in self.expenses:
-            payer_id = expense.payer_id
-            
-            # For each split in the expense
-            for split in expense.splits:
-                user_id = split.user_id
-                
-                # Skip if it's somehow the payer (shouldn't happen with new logic)
-                if user_id == payer_id:
-                    continue
-                
-                # Only add to balances if not settled
-                if not split.is_settled:
-                    # Add to what this person owes
-                    balances[user_id]['owes'] += split.amount
-                    # Add to what payer is owed
-                    balances[payer_id]['owed'] += split.amount
-                    
-                    # Update the detailed breakdown
-                    balances[user_id]['details'][payer_id] -= split.amount  # User owes payer
-                    balances[payer_id]['details'][user_id] += split.amount  # Payer is owed by user
+                    balances[member.id]['details'][other_member.id] = 0
+
+        # (payer, debtor, amount) of unsettled debts: at most one row per
+        # ordered pair of members, however many expenses the group has
+        debts = self.get_debt_matrix()
+
+        # Former members can still carry unsettled debts
+        missing_ids = {user_id for debt in debts for user_id in debt[:2]} - set(balances)
+        if missing_ids:
+            for user in User.query.filter(User.id.in_(missing_ids)).all():
+                balances[user.id] = {'user': user, 'owes': 0, 'owed': 0, 'details': {}}
+
+        for payer_id, user_id, amount in debts:
+            # Add to what this person owes
+            balances[user_id]['owes'] += amount
+            # Add to what payer is owed
+            balances[payer_id]['owed'] += amount
+
+            # Update the detailed breakdown
+            balances[user_id]['details'][payer_id] = balances[user_id]['details'].get(payer_id, 0) - amount
+            balances[payer_id]['details'][user_id] = balances[payer_id]['details'].get(user_id, 0) + amount
+
+        if not minor_units:
+            for balance in balances.values():
+                balance['owes'] = to_major(balance['owes'], self.currency)
+                balance['owed'] = to_major(balance['owed'], self.currency)
+                balance['details'] = {
+                    user_id: to_major(amount, self.currency)
+                    for user_id, amount in balance['details'].items()
+                }
 
         return balances
 
+    def get_net_balances(self):
+        """Return ``{user_id: owed - owes}`` in minor units, for members who are not square
+
+        One grouped statement with one row per member, without the pairwise
+        breakdown of :meth:`get_member_balances`. Reads the ledger's mirrored
+        rows when ``BALANCE_LEDGER`` is enabled, otherwise both sides of every
+        unsettled split.
+        """
+        if current_app.config.get('BALANCE_LEDGER', True):
+            totals = select(BalanceLedger.creditor_id, func.sum(BalanceLedger.net_amount))\
+                .where(BalanceLedger.group_id == self.id)\
+                .group_by(BalanceLedger.creditor_id)
+        else:
+            splits = select(Expense.payer_id, ExpenseSplit.user_id, ExpenseSplit.amount_minor)\
+                .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+                .where(Expense.group_id == self.id)\
+                .where(ExpenseSplit.user_id != Expense.payer_id)\
+                .where(ExpenseSplit.is_settled.is_not(True))\
+                .subquery()
+            # The payer is owed each split and its user owes it
+            sides = union_all(
+                select(splits.c.payer_id.label('user_id'), splits.c.amount_minor.label('amount')),
+                select(splits.c.user_id, -splits.c.amount_minor)
+            ).subquery()
+            totals = select(sides.c.user_id, func.sum(sides.c.amount)).group_by(sides.c.user_id)
+        return {user_id: amount for user_id, amount in db.session.execute(totals) if amount}
+
+    def get_debt_matrix(self):
+        """Return ``(payer_id, debtor_id, amount_minor)`` for unsettled splits in this group
+
+        One row per direction of each pair. The balance ledger is not used
+        here whatever ``BALANCE_LEDGER`` says: it only keeps the net of a
+        pair, while ``owes`` and ``owed`` of :meth:`get_member_balances` are
+        the gross sums of each direction.
+        """
+        return db.session.query(
+                Expense.payer_id,
+                ExpenseSplit.user_id,
+                func.sum(ExpenseSplit.amount_minor)
+            )\
+            .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+            .filter(Expense.group_id == self.id)\
+            .filter(ExpenseSplit.user_id != Expense.payer_id)\
+            .filter(ExpenseSplit.is_settled.is_not(True))\
+            .group_by(Expense.payer_id, ExpenseSplit.user_id)\
+            .all()
+
+    def get_net_contributions(self):
+        """Return ``{member_id: paid - owed}`` over all expenses, settled or not"""
+        paid = dict(db.session.query(Expense.payer_id, func.sum(Expense.amount_minor))
+                    .filter(Expense.group_id == self.id)
+                    .group_by(Expense.payer_id)
+                    .all())
+        owed = dict(db.session.query(ExpenseSplit.user_id, func.sum(ExpenseSplit.amount_minor))
+                    .join(Expense, ExpenseSplit.expense_id == Expense.id)
+                    .filter(Expense.group_id == self.id)
+                    .group_by(ExpenseSplit.user_id)
+                    .all())
+        return {
+            member.id: to_major((paid.get(member.id) or 0) - (owed.get(member.id) or 0), self.currency)
+            for member in self.members
+        }
+
     def get_user_balance(self, user_id):
         """Get balance summary for a specific user in the group"""
         balances = self.get_member_balances()
         return balances.get(user_id, {
             'user': User.query.get(user_id),
-            'owes': 0.0,
-            'owed': 0.0,
+            'owes': 0,
+            'owed': 0,
             'details': {}
         })
 
@@ -264,7 +355,8 @@ class Expense(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(255), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    # Integer minor units of ``currency`` (cents for USD, yen for JPY)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     group_id = db.Column(
         db.Integer, 
@@ -285,6 +377,18 @@ class Expense(db.Model):
         cascade='all, delete-orphan'
     )
     
+    __table_args__ = (
+        # Serves keyset pagination of a group's expenses by (date, id)
+        db.Index('ix_expense_group_id_date_id', 'group_id', 'date', 'id'),
+        # Newest expenses a user paid, for the dashboard
+        db.Index('ix_expense_payer_id_date', 'payer_id', 'date', 'id'),
+    )
+    
+    @property
+    def amount(self):
+        """The expense amount in ``currency``"""
+        return to_major(self.amount_minor, self.currency)
+    
     def get_currency_symbol(self):
         """Return the currency symbol based on currency code"""
         symbols = {
@@ -310,7 +414,8 @@ class ExpenseSplit(db.Model):
         db.ForeignKey('user.id', ondelete='CASCADE'),
         nullable=False
     )
-    amount = db.Column(db.Float, nullable=False)
+    # Integer minor units of the parent expense's currency
+    amount_minor = db.Column(db.BigInteger, nullable=False)
     is_settled = db.Column(db.Boolean, default=False)
     settled_at = db.Column(db.DateTime)
     
@@ -328,12 +433,18 @@ class ExpenseSplit(db.Model):
     
     __table_args__ = (
         db.Index('ix_expense_split_expense_id', 'expense_id'),
-        db.Index('ix_expense_split_user_id', 'user_id'),
-        db.CheckConstraint('amount >= 0', name='ck_expense_split_amount_positive'),
+        # Covers the user's expense ids without touching the table
+        db.Index('ix_expense_split_user_id_expense_id', 'user_id', 'expense_id'),
+        db.CheckConstraint('amount_minor >= 0', name='ck_expense_split_amount_positive'),
     )
     
     def __repr__(self):
-        return f'<ExpenseSplit {self.id} - User {self.user_id} - Amount {self.amount}>'
+        return f'<ExpenseSplit {self.id} - User {self.user_id} - Amount {self.amount_minor}>'
+    
+    @property
+    def amount(self):
+        """The split amount in the expense's currency"""
+        return to_major(self.amount_minor, self.expense.currency)
     
     def settle(self):
         """Mark this split as settled"""
@@ -344,3 +455,61 @@ class ExpenseSplit(db.Model):
         """Mark this split as unsettled"""
         self.is_settled = False
         self.settled_at = None
+
+class BalanceLedger(db.Model):
+    """Running net balance between two members of a group.
+
+    Rows are kept in mirrored pairs: ``(group, a, b, x)`` always has a twin
+    ``(group, b, a, -x)``. ``net_amount`` is read from the creditor's side,
+    in minor units of the group currency, so a positive value means the
+    debtor owes the creditor.
+    """
+    __tablename__ = 'balance_ledger'
+
+    group_id = db.Column(
+        db.Integer,
+        db.ForeignKey('group.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    creditor_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    debtor_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    net_amount = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_balance_ledger_creditor_id', 'creditor_id', 'group_id'),
+    )
+
+    def __repr__(self):
+        return f'<BalanceLedger {self.group_id} - {self.creditor_id}/{self.debtor_id} - {self.net_amount}>'
+
+class GroupChange(db.Model):
+    """One entry of a group's change log; ``seq`` is the group version it produced."""
+    __tablename__ = 'group_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(
+        db.Integer,
+        db.ForeignKey('group.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    seq = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    entity_id = db.Column(db.Integer)
+    data = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'seq', name='uq_group_change_group_id_seq'),
+        db.Index('ix_group_change_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<GroupChange {self.group_id}#{self.seq} {self.kind}>'
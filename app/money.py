@@ -0,0 +1,66 @@
+"""Money stored as integer minor units.
+
+Amounts are kept as whole cents (or the currency's smallest unit) so SQL
+sums are exact. Conversion to and from the decimal amounts the API speaks
+happens only at the edges, using each currency's exponent.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+# ISO 4217 minor unit exponents that differ from the usual 2
+CURRENCY_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0,
+    'KRW': 0, 'PYG': 0, 'RWF': 0, 'UGX': 0, 'VND': 0, 'VUV': 0, 'XAF': 0,
+    'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+}
+DEFAULT_EXPONENT = 2
+
+# Largest amount accepted, in minor units: 10 trillion in a currency with
+# two decimal places. Columns are
+# 64-bit integers, and this leaves room for a group's sums to stay in range
+MAX_MINOR = 10 ** 15
+
+
+def exponent(currency):
+    """Number of decimal places used by ``currency``."""
+    return CURRENCY_EXPONENTS.get((currency or '').upper(), DEFAULT_EXPONENT)
+
+
+def to_minor(amount, currency):
+    """Convert a decimal amount to integer minor units, rounding half up.
+
+    Raises ValueError for anything that is not a finite number, or whose
+    magnitude is over :data:`MAX_MINOR` minor units.
+    """
+    try:
+        value = Decimal(str(amount))
+        if not value.is_finite():
+            raise ValueError(amount)
+        # Quantizing past the context precision raises InvalidOperation
+        minor = int(value.scaleb(exponent(currency)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (ArithmeticError, TypeError, ValueError):
+        raise ValueError(f'Invalid amount: {amount!r}')
+    if abs(minor) > MAX_MINOR:
+        raise ValueError(f'Invalid amount: {amount!r}')
+    return minor
+
+
+def to_major(minor, currency):
+    """Convert integer minor units back to a JSON friendly decimal amount."""
+    minor = minor or 0
+    places = exponent(currency)
+    if places == 0:
+        return int(minor)
+    return float(Decimal(int(minor)).scaleb(-places))
+
+
+def allocate(total, parts):
+    """Split ``total`` minor units into ``parts`` shares that sum to it exactly.
+
+    The remainder is spread one unit at a time over the first shares, e.g.
+    ``allocate(1000, 3) == [334, 333, 333]``.
+    """
+    if parts <= 0:
+        raise ValueError('Cannot allocate over zero parts')
+    share, remainder = divmod(total, parts)
+    return [share + 1 if index < remainder else share for index in range(parts)]
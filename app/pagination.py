@@ -0,0 +1,49 @@
+"""Helpers for keyset (cursor) pagination.
+
+A cursor is the sort key of the last row of a page, serialized into an
+opaque URL-safe token. The next page is fetched with a range predicate on
+that key instead of an OFFSET, so every page costs the same index seek no
+matter how deep into the result the client is.
+"""
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(*values):
+    """Serialize a sort key into an opaque token."""
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(key, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, *types):
+    """Parse a token from :func:`encode_cursor` back into typed values.
+
+    ``types`` gives the expected type of each key part, e.g.
+    ``decode_cursor(token, datetime, int)``.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+        if not isinstance(key, list) or len(key) != len(types):
+            raise InvalidCursor('Malformed cursor')
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for value, type_ in zip(key, types)
+        )
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Malformed cursor') from e
+
+
+def page_size(requested, default, maximum=100):
+    """Clamp a client supplied ``limit`` to ``1..maximum``."""
+    try:
+        size = int(requested) if requested is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
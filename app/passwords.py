@@ -0,0 +1,129 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow, so running it on the request thread lets a
+burst of logins or registrations starve every other request. Instead the
+work is handed to a small per-process thread pool (hashlib releases the
+GIL while it hashes). At most ``PASSWORD_HASH_QUEUE_SIZE`` jobs may be
+queued or running; once that is reached callers wait up to
+``PASSWORD_HASH_QUEUE_TIMEOUT`` seconds for a slot and then get
+:class:`HasherBusy`, which the API turns into a 503.
+
+``PASSWORD_HASH_METHOD`` sets the algorithm and cost. Hashes made with a
+different method are replaced the next time their owner logs in.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_lock = threading.Lock()
+_hasher = None
+
+
+class HasherBusy(RuntimeError):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs hash and verify calls on ``workers`` threads with a bounded queue."""
+
+    def __init__(self, workers, queue_size, queue_timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_pending = 0
+        self._wait_seconds = 0.0
+
+    def run(self, func, *args):
+        """Call ``func(*args)`` on the pool and wait for the result."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise HasherBusy('Too many password operations in progress, please retry')
+        with self._stats_lock:
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+        try:
+            return self._executor.submit(self._call, time.perf_counter(), func, args).result()
+        finally:
+            with self._stats_lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def _call(self, queued_at, func, args):
+        with self._stats_lock:
+            self._active += 1
+            self._wait_seconds += time.perf_counter() - queued_at
+        try:
+            return func(*args)
+        finally:
+            with self._stats_lock:
+                self._active -= 1
+                self._completed += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self._pending - self._active,
+                'active': self._active,
+                'max_pending': self._max_pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': round(self._wait_seconds * 1000 / self._completed, 2) if self._completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def get_hasher():
+    """The process wide :class:`PasswordHasher`, created from the app config."""
+    global _hasher
+    if _hasher is None:
+        with _lock:
+            if _hasher is None:
+                config = current_app.config
+                _hasher = PasswordHasher(
+                    config.get('PASSWORD_HASH_WORKERS', 2),
+                    config.get('PASSWORD_HASH_QUEUE_SIZE', 32),
+                    config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 0.5)
+                )
+    return _hasher
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # What werkzeug writes in front of the salt, e.g. 'pbkdf2' becomes
+    # 'pbkdf2:sha256:600000'; only computed once per method
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password):
+    return get_hasher().run(generate_password_hash, password, _method())
+
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return get_hasher().run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if ``password_hash`` was made with a different method or cost."""
+    return password_hash.split('$', 1)[0] != _method_prefix(_method())
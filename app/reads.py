@@ -0,0 +1,200 @@
+"""Statements behind the read-heavy JSON endpoints.
+
+Each function builds a ``select()`` without touching a session. The Flask
+views execute them on ``db.session``, and the ASGI entry point
+(:mod:`app.asgi`) executes the same statements on an async driver, so both
+serving modes run identical SQL and return identical payloads.
+"""
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import aliased, contains_eager, joinedload, selectinload
+
+from .models import db, Expense, ExpenseSplit, Group, User, balance_totals, group_members
+from .money import to_major
+from .pagination import decode_cursor, encode_cursor
+
+RECENT_EXPENSES = 5
+
+
+# Group view
+
+def member_version(group_id, user_id):
+    """The group's version, or no row if ``user_id`` is not a member."""
+    return select(Group.version)\
+        .join(group_members, group_members.c.group_id == Group.id)\
+        .where(Group.id == group_id, group_members.c.user_id == user_id)
+
+
+def group_etag(group_id, version, user_id):
+    return f'group-{group_id}-v{version}-u{user_id}'
+
+
+def group_detail(group_id):
+    """``(Group, total_minor)`` with the creator and members loaded."""
+    total = select(func.coalesce(func.sum(Expense.amount_minor), 0))\
+        .where(Expense.group_id == Group.id)\
+        .correlate(Group)\
+        .scalar_subquery()
+    return select(Group, total.label('total_minor'))\
+        .where(Group.id == group_id)\
+        .options(joinedload(Group.created_by), selectinload(Group.members))
+
+
+def expense_page(group_id, cursor=None, limit=10):
+    """One page of a group's expenses, newest first, plus one extra row
+    that tells :func:`split_page` whether another page exists."""
+    query = select(Expense).where(Expense.group_id == group_id)
+    if cursor:
+        date, expense_id = decode_cursor(cursor, datetime, int)
+        query = query.where(db.or_(
+            Expense.date < date,
+            db.and_(Expense.date == date, Expense.id < expense_id)
+        ))
+    return query.options(
+            joinedload(Expense.payer),
+            selectinload(Expense.splits).joinedload(ExpenseSplit.user)
+        )\
+        .order_by(Expense.date.desc(), Expense.id.desc())\
+        .limit(limit + 1)
+
+
+def split_page(expenses, limit):
+    """Return the rows of :func:`expense_page` and the next cursor."""
+    if len(expenses) <= limit:
+        return expenses, None
+    expenses = expenses[:limit]
+    return expenses, encode_cursor(expenses[-1].date, expenses[-1].id)
+
+
+def contributions(group_id):
+    """Statements for ``(user_id, paid_minor)`` and ``(user_id, owed_minor)``."""
+    paid = select(Expense.payer_id, func.sum(Expense.amount_minor))\
+        .where(Expense.group_id == group_id)\
+        .group_by(Expense.payer_id)
+    owed = select(ExpenseSplit.user_id, func.sum(ExpenseSplit.amount_minor))\
+        .join(Expense, ExpenseSplit.expense_id == Expense.id)\
+        .where(Expense.group_id == group_id)\
+        .group_by(ExpenseSplit.user_id)
+    return paid, owed
+
+
+def net_contributions(group, paid, owed):
+    """``{member_id: paid - owed}`` from the rows of :func:`contributions`."""
+    paid = dict(paid)
+    owed = dict(owed)
+    return {
+        member.id: to_major((paid.get(member.id) or 0) - (owed.get(member.id) or 0), group.currency)
+        for member in group.members
+    }
+
+
+# Group list
+
+def group_versions(user_id):
+    """``(id, version)`` of every group of ``user_id``."""
+    return select(Group.id, Group.version)\
+        .join(group_members, group_members.c.group_id == Group.id)\
+        .where(group_members.c.user_id == user_id)\
+        .order_by(Group.id)
+
+
+def groups_etag(user_id, versions, include_members):
+    # The list changes exactly when one of the (group id, version) pairs does
+    digest = hashlib.sha1(repr([tuple(row) for row in versions]).encode()).hexdigest()[:20]
+    return f'groups-u{user_id}-{digest}' + ('-members' if include_members else '')
+
+
+def group_summaries(user_id, include_members=False):
+    """Groups of ``user_id`` with creator, total and member count columns."""
+    # Totals and counts are computed per group row by the database
+    creator = aliased(User)
+    total_expenses = select(func.coalesce(func.sum(Expense.amount_minor), 0))\
+        .where(Expense.group_id == Group.id)\
+        .correlate(Group)\
+        .scalar_subquery()
+    counted_members = group_members.alias('counted_members')
+    member_count = select(func.count(counted_members.c.user_id))\
+        .where(counted_members.c.group_id == Group.id)\
+        .correlate(Group)\
+        .scalar_subquery()
+
+    query = select(
+            Group,
+            creator.id.label('creator_id'),
+            creator.username.label('creator_username'),
+            total_expenses.label('total_minor'),
+            member_count.label('member_count')
+        )\
+        .join(group_members, group_members.c.group_id == Group.id)\
+        .outerjoin(creator, creator.id == Group.created_by_id)\
+        .where(group_members.c.user_id == user_id)\
+        .order_by(Group.id)
+    if include_members:
+        query = query.options(selectinload(Group.members))
+    return query
+
+
+# Dashboard
+
+def group_balances(user_id):
+    """``(group, balance_minor)`` for every group of ``user_id``."""
+    totals = balance_totals(user_id)
+    per_group = select(
+            totals.c.group_id,
+            func.sum(totals.c.balance).label('balance')
+        )\
+        .group_by(totals.c.group_id)\
+        .subquery()
+    return select(Group, func.coalesce(per_group.c.balance, 0))\
+        .join(group_members, group_members.c.group_id == Group.id)\
+        .outerjoin(per_group, per_group.c.group_id == Group.id)\
+        .where(group_members.c.user_id == user_id)\
+        .order_by(Group.id)
+
+
+def counterparty_balances(user_id):
+    """``(user, currency, balance_minor)`` per person, summed over groups of one currency."""
+    totals = balance_totals(user_id)
+    return select(User, Group.currency, func.sum(totals.c.balance))\
+        .select_from(totals)\
+        .join(User, User.id == totals.c.counterparty_id)\
+        .join(Group, Group.id == totals.c.group_id)\
+        .group_by(User.id, Group.currency)\
+        .having(func.sum(totals.c.balance) != 0)\
+        .order_by(User.id, Group.currency)
+
+
+def recent_expenses(user_id, limit=RECENT_EXPENSES):
+    """The newest expenses ``user_id`` paid or shares, with payer and group loaded.
+
+    The union of two index-ordered branches, expenses the user paid
+    (``ix_expense_payer_id_date``) and expenses they have a split in
+    (``ix_expense_split_user_id_expense_id``), each cut to the limit before
+    they are merged. A single ``payer_id = ? OR split.user_id = ?`` filter
+    can use neither index and returns an expense once per split.
+    """
+    order = (Expense.date.desc(), Expense.id.desc())
+    paid = select(Expense.id)\
+        .where(Expense.payer_id == user_id)\
+        .order_by(*order)\
+        .limit(limit)\
+        .subquery()
+    shared = select(Expense.id)\
+        .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+        .where(ExpenseSplit.user_id == user_id)\
+        .order_by(*order)\
+        .limit(limit)\
+        .subquery()
+    expense_ids = union(select(paid.c.id), select(shared.c.id)).subquery()
+
+    payer = aliased(User)
+    return select(Expense)\
+        .join(expense_ids, expense_ids.c.id == Expense.id)\
+        .join(payer, payer.id == Expense.payer_id)\
+        .join(Group, Group.id == Expense.group_id)\
+        .where(Group.deleting_at.is_(None))\
+        .options(contains_eager(Expense.payer.of_type(payer)), contains_eager(Expense.group))\
+        .order_by(*order)\
+        .limit(limit)
@@ -0,0 +1,238 @@
+"""Compiled serializers for API responses.
+
+A :class:`Schema` lists the fields of one response object. When it is
+created, the field list is compiled into plain Python functions, one for a
+single object and one for a list, that build the dicts with direct
+attribute reads and no per-field dispatch. :func:`json_response` then
+encodes the payload to bytes in one pass, with orjson when it is installed
+and the standard library otherwise.
+
+Field sources are attribute paths (``'payer.username'``), or keys when the
+schema is built with ``mapping=True``.
+"""
+import json
+
+from flask import current_app
+
+from .money import to_major
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+class Field:
+    """Copies ``source`` (defaulting to the field's own name) unchanged."""
+
+    def __init__(self, source=None):
+        self.source = source
+
+    def expression(self, key, read, namespace):
+        return read(self.source or key)
+
+
+Attr = Field
+
+
+class DateTime(Field):
+    """ISO 8601 string, or None."""
+
+    def expression(self, key, read, namespace):
+        namespace['_iso'] = _iso
+        return f'_iso({read(self.source or key)})'
+
+
+class Money(Field):
+    """Integer minor units converted to the API's decimal amount."""
+
+    def __init__(self, source, currency='currency'):
+        super().__init__(source)
+        self.currency = currency
+
+    def expression(self, key, read, namespace):
+        namespace['_to_major'] = to_major
+        return f'_to_major({read(self.source)}, {read(self.currency)})'
+
+
+class Nested(Field):
+    """Another schema applied to a related object, or each object of a list."""
+
+    def __init__(self, schema, source=None, many=False):
+        super().__init__(source)
+        self.schema = schema
+        self.many = many
+
+    def expression(self, key, read, namespace):
+        name = f'_nested_{key}'
+        namespace[name] = self.schema.dump
+        value = read(self.source or key)
+        if self.many:
+            return f'[{name}(item) for item in {value}]'
+        return f'({name}(value) if (value := {value}) is not None else None)'
+
+
+class Method(Field):
+    """Result of ``func(obj)``, for values that are not a plain read."""
+
+    def __init__(self, func):
+        super().__init__()
+        self.func = func
+
+    def expression(self, key, read, namespace):
+        name = f'_method_{key}'
+        namespace[name] = self.func
+        return f'{name}(obj)'
+
+
+class Schema:
+    """An ordered set of output fields, compiled to ``dump`` and ``dump_many``."""
+
+    def __init__(self, name, /, mapping=False, **fields):
+        self.name = name
+        self.mapping = mapping
+        self.fields = fields
+        self.dump, self.dump_many = self._compile()
+
+    def extend(self, name, /, **fields):
+        """A new schema with this one's fields followed by ``fields``."""
+        return Schema(name, self.mapping, **{**self.fields, **fields})
+
+    def _read(self, path):
+        if self.mapping:
+            return 'obj' + ''.join(f'[{part!r}]' for part in path.split('.'))
+        return 'obj.' + path
+
+    def _compile(self):
+        namespace = {}
+        body = ',\n'.join(
+            f'        {key!r}: {field.expression(key, self._read, namespace)}'
+            for key, field in self.fields.items()
+        )
+        source = (
+            f'def dump(obj):\n    return {{\n{body}\n    }}\n'
+            f'def dump_many(objs):\n    return [{{\n{body}\n    }} for obj in objs]\n'
+        )
+        exec(compile(source, f'<schema {self.name}>', 'exec'), namespace)
+        return namespace['dump'], namespace['dump_many']
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(value):
+        """Encode ``value`` to JSON bytes."""
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), default=_default)
+
+    def dumps(value):
+        """Encode ``value`` to JSON bytes."""
+        return _encoder.encode(value).encode()
+
+
+def json_response(payload, status=None):
+    """Drop-in for ``jsonify`` that encodes with :func:`dumps`."""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+# Shared response schemas
+
+USER = Schema('user', id=Attr(), username=Attr(), email=Attr())
+USER_REF = Schema('user_ref', id=Attr(), username=Attr())
+
+SPLIT = Schema(
+    'split',
+    id=Attr(),
+    expense_id=Attr(),
+    user_id=Attr(),
+    amount=Money('amount_minor', 'expense.currency'),
+    is_settled=Attr(),
+    settled_at=DateTime(),
+    user=Nested(USER)
+)
+
+EXPENSE = Schema(
+    'expense',
+    id=Attr(),
+    description=Attr(),
+    amount=Money('amount_minor'),
+    date=DateTime(),
+    group_id=Attr(),
+    payer_id=Attr(),
+    currency=Attr(),
+    payer=Nested(USER),
+    splits=Nested(SPLIT, many=True)
+)
+
+# The dict returned by expense_service.create_expense
+CREATED_EXPENSE = Schema(
+    'created_expense',
+    mapping=True,
+    id=Attr(),
+    description=Attr(),
+    amount=Money('amount_minor'),
+    currency=Attr(),
+    date=DateTime(),
+    splits=Method(lambda expense: [{
+        'user_id': split['user_id'],
+        'amount': to_major(split['amount_minor'], expense['currency']),
+        'is_settled': split['is_settled']
+    } for split in expense['splits']])
+)
+
+# Change log payload of a created expense
+CHANGED_EXPENSE = CREATED_EXPENSE.extend('changed_expense', payer_id=Attr())
+
+CHANGE = Schema(
+    'change',
+    seq=Attr(),
+    kind=Attr(),
+    entity_id=Attr(),
+    data=Attr(),
+    created_at=DateTime()
+)
+
+# Rows of reads.group_detail: the Group entity plus its total_minor
+GROUP = Schema(
+    'group',
+    id=Attr('Group.id'),
+    name=Attr('Group.name'),
+    currency=Attr('Group.currency'),
+    created_by=Nested(USER_REF, 'Group.created_by'),
+    members=Nested(USER, 'Group.members', many=True),
+    total_expenses=Money('total_minor', 'Group.currency'),
+    member_count=Method(lambda row: len(row.Group.members)),
+    created_at=DateTime('Group.created_at'),
+    updated_at=DateTime('Group.updated_at'),
+    version=Attr('Group.version')
+)
+
+# Rows of the group listing query: the Group entity plus aggregate columns
+GROUP_SUMMARY = Schema(
+    'group_summary',
+    id=Attr('Group.id'),
+    name=Attr('Group.name'),
+    currency=Attr('Group.currency'),
+    created_by=Method(lambda row: {
+        'id': row.creator_id,
+        'username': row.creator_username if row.creator_username else 'Unknown'
+    }),
+    total_expenses=Money('total_minor', 'Group.currency'),
+    member_count=Attr(),
+    created_at=DateTime('Group.created_at'),
+    updated_at=DateTime('Group.updated_at'),
+    version=Attr('Group.version')
+)
+GROUP_SUMMARY_WITH_MEMBERS = GROUP_SUMMARY.extend(
+    'group_summary_with_members',
+    members=Nested(USER, 'Group.members', many=True)
+)
@@ -0,0 +1,46 @@
+"""Debt simplification for settling up a group.
+
+Given each member's net balance, produce a short list of transfers that
+brings everyone back to zero. The plan greedily matches the largest
+creditor with the largest debtor, which needs at most ``n - 1`` transfers
+and runs in O(n log n) using two heaps.
+"""
+import heapq
+
+
+def plan_settlements(balances, precision=2):
+    """Return ``(from_id, to_id, amount)`` transfers that clear ``balances``.
+
+    ``balances`` maps a user id to their net position: positive when the
+    group owes them money, negative when they owe the group. Amounts are
+    rounded to ``precision`` decimal places and anything smaller is treated
+    as already settled.
+    """
+    tolerance = 10 ** -precision / 2
+    creditors = []
+    debtors = []
+    for user_id, amount in balances.items():
+        amount = round(amount, precision)
+        if amount > tolerance:
+            creditors.append((-amount, user_id))
+        elif amount < -tolerance:
+            debtors.append((amount, user_id))
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor_id = heapq.heappop(creditors)
+        debt, debtor_id = heapq.heappop(debtors)
+        amount = round(min(-credit, -debt), precision)
+        transfers.append((debtor_id, creditor_id, amount))
+
+        # Whoever is left with a remainder goes back on their heap
+        credit = round(credit + amount, precision)
+        debt = round(debt + amount, precision)
+        if credit < -tolerance:
+            heapq.heappush(creditors, (credit, creditor_id))
+        if debt < -tolerance:
+            heapq.heappush(debtors, (debt, debtor_id))
+
+    return transfers
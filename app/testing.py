@@ -0,0 +1,42 @@
+"""Helpers for keeping query counts in check.
+
+Use these around test client calls to catch N+1 regressions::
+
+    with app.app_context(), assert_max_queries(6):
+        client.get(f'/api/groups/{group_id}')
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from .extensions import db
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect every SQL statement executed on ``engine`` inside the block.
+
+    Defaults to ``db.engine``, so it needs an application context. Yields
+    the list the statements are appended to.
+    """
+    engine = engine or db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Fail with the offending statements if the block runs more than ``limit`` queries."""
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = '\n'.join(f'{number}. {statement}' for number, statement in enumerate(statements, 1))
+        raise AssertionError(f'{len(statements)} queries executed, expected at most {limit}:\n{listing}')
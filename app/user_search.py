@@ -0,0 +1,135 @@
+"""User search for the member picker.
+
+Results are ranked in three tiers, each filled only if the previous one
+left room under the limit:
+
+1. usernames starting with the query,
+2. emails starting with the query,
+3. usernames or emails containing the query anywhere.
+
+The prefix tiers are range scans over the ``lower(username)`` and
+``lower(email)`` indexes. Substring matches come from ``user_search``, an
+SQLite FTS5 trigram index over the user table that triggers keep in sync.
+Trigrams need at least three characters; shorter queries, and databases
+without FTS5, fall back to a LIKE scan for that last tier.
+"""
+from sqlalchemy import func, text
+from sqlalchemy.exc import OperationalError
+
+from .models import db, User
+
+FTS_TABLE = 'user_search'
+_MIN_TRIGRAM = 3
+_available = {}
+
+_CREATE_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "username, email, content='user', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON \"user\" BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON \"user\" BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) "
+    "VALUES ('delete', old.id, old.username, old.email); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF username, email ON \"user\" BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) "
+    "VALUES ('delete', old.id, old.username, old.email); "
+    f"INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END",
+)
+
+
+def create_index(connection):
+    """Create the FTS5 table and its triggers and fill it. SQLite only."""
+    for statement in _CREATE_STATEMENTS:
+        connection.execute(text(statement))
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_index():
+    """Create the search index if this SQLite database does not have one yet.
+
+    Returns True if it was created. Other databases, and SQLite builds
+    without FTS5 trigram support, keep using the LIKE fallback.
+    """
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'sqlite' or has_index():
+        return False
+    try:
+        create_index(db.session)
+    except OperationalError:
+        db.session.rollback()
+        return False
+    db.session.commit()
+    _available.pop(str(bind.url), None)
+    return True
+
+
+def has_index():
+    """True if the current bind has the FTS5 table. Cached per database."""
+    url = str(db.session.get_bind().url)
+    if url not in _available:
+        row = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name").columns(),
+            {'name': FTS_TABLE}
+        ).first()
+        _available[url] = row is not None
+    return _available[url]
+
+
+def search(query, limit):
+    """Return up to ``limit`` users matching ``query``, best matches first."""
+    needle = query.strip().lower()
+    if not needle or limit <= 0:
+        return []
+
+    found = []
+    seen = set()
+
+    def take(users):
+        for user in users:
+            if user.id not in seen and len(found) < limit:
+                seen.add(user.id)
+                found.append(user)
+
+    for column in (func.lower(User.username), func.lower(User.email)):
+        if len(found) >= limit:
+            break
+        take(_base_query(seen)
+             .filter(column >= needle, column < needle + '\U0010ffff')
+             .order_by(column, User.id)
+             .limit(limit - len(found)))
+
+    if len(found) < limit:
+        take(_substring_matches(needle, seen, limit - len(found)))
+    return found
+
+
+def _base_query(exclude):
+    query = db.session.query(User.id, User.username, User.email)
+    if exclude:
+        query = query.filter(User.id.not_in(exclude))
+    return query
+
+
+def _substring_matches(needle, exclude, limit):
+    if len(needle) >= _MIN_TRIGRAM and db.session.get_bind().dialect.name == 'sqlite' and has_index():
+        # Quoted as a phrase so punctuation in emails is matched literally.
+        # No ORDER BY rank: ranking every hit of a common fragment such as
+        # a mail domain costs seconds on a large table, LIMIT alone stops early
+        phrase = '"' + needle.replace('"', '""') + '"'
+        ids = db.session.execute(
+            text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase LIMIT :limit').columns(),
+            {'phrase': phrase, 'limit': limit + len(exclude)}
+        ).scalars().all()
+        ids = [user_id for user_id in ids if user_id not in exclude][:limit]
+        if not ids:
+            return []
+        users = {user.id: user for user in _base_query(()).filter(User.id.in_(ids))}
+        return [users[user_id] for user_id in ids if user_id in users]
+
+    pattern = '%' + needle.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return _base_query(exclude)\
+        .filter(func.lower(User.username).like(pattern, escape='\\') |
+                func.lower(User.email).like(pattern, escape='\\'))\
+        .order_by(User.username, User.id)\
+        .limit(limit)\
+        .all()
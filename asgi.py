@@ -0,0 +1,8 @@
+"""ASGI entry point: uvicorn asgi:app
+
+Serves the same /api routes as run.py, with the read-heavy ones on an
+async database driver; see app/asgi.py.
+"""
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,257 @@
+"""Concurrent read load: the WSGI server of run.py against the ASGI mode.
+
+Usage:
+    python benchmarks/bench_asgi.py [--connections 1000] [--requests 5]
+        [--endpoint group|groups|dashboard] [--idle-streams 0] [--mode both]
+
+Builds a database with one user in ``--groups`` groups of ``--expenses``
+expenses each, then starts each server in its own process: werkzeug's
+threaded server (what ``run.py`` uses) and uvicorn running ``asgi:app``.
+``--connections`` clients connect at once and each sends ``--requests``
+GETs to the endpoint. ``--idle-streams`` SSE connections to the group's
+event stream are opened first and held for the whole run, the way idle
+browser tabs would. Reports throughput, latency percentiles, errors, and
+the server's thread count and memory afterwards.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+USER_AGENT = 'bench-asgi'
+
+
+def make_config(database):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database
+        WTF_CSRF_ENABLED = False
+        REMEMBER_COOKIE_SECURE = False
+        EVENTS_MAX_SUBSCRIBERS = 100000
+    return BenchConfig
+
+
+def populate(database, groups, expenses):
+    from app import create_app
+    from app.extensions import db
+    from app.expense_service import create_expenses
+    from app.models import Group, User
+
+    app = create_app(make_config(database))
+    with app.app_context():
+        users = [User(username=f'bench{index}', email=f'bench{index}@example.com') for index in range(4)]
+        for user in users:
+            user.set_password('bench')
+        db.session.add_all(users)
+        db.session.flush()
+        for index in range(groups):
+            group = Group(name=f'Group {index}', currency='USD', created_by_id=users[0].id)
+            group.members.extend(users)
+            db.session.add(group)
+            db.session.flush()
+            create_expenses(group, [{
+                'description': f'Expense {number}',
+                'amount_minor': 1000 + number,
+                'payer_id': users[number % len(users)].id,
+                'split_with': [user.id for user in users]
+            } for number in range(expenses)])
+        db.session.commit()
+        return group.id
+
+
+def serve(mode, database, port):
+    if mode == 'wsgi':
+        from werkzeug import serving
+        from app import create_app
+        serving.LISTEN_QUEUE = 4096
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app = create_app(make_config(database))
+        serving.make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from app.asgi import create_asgi_app
+        app = create_asgi_app(make_config(database))
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+
+
+def start_server(mode, database, port):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode,
+                                '--database', database, '--port', str(port)])
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/csrf-token', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def login(port):
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}/api/auth/login',
+        data=json.dumps({'username': 'bench0', 'password': 'bench'}).encode(),
+        headers={'Content-Type': 'application/json', 'User-Agent': USER_AGENT}
+    )
+    response = urllib.request.urlopen(request)
+    return '; '.join(header.split(';', 1)[0] for header in response.headers.get_all('Set-Cookie'))
+
+
+def server_stats(pid):
+    stats = {}
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            name, _, value = line.partition(':')
+            if name in ('Threads', 'VmRSS'):
+                stats[name] = value.strip()
+    return stats
+
+
+class Client:
+    """A keep-alive HTTP/1.1 connection that reconnects when the server closes it."""
+
+    def __init__(self, port, cookie):
+        self.port = port
+        self.cookie = cookie
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nUser-Agent: {USER_AGENT}\r\n'
+            f'Cookie: {self.cookie}\r\n\r\n'.encode()
+        )
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed')
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+        if status_line.startswith(b'HTTP/1.0') or headers.get('connection', '').lower() == 'close' \
+                or 'content-length' not in headers:
+            await self.close()
+        return int(status_line.split()[1])
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def open_stream(port, cookie, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nUser-Agent: {USER_AGENT}\r\n'
+                 f'Cookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await reader.readline()
+    return writer
+
+
+async def load(port, cookie, path, connections, requests, idle_streams, stream_path):
+    streams = await asyncio.gather(*(open_stream(port, cookie, stream_path) for _ in range(idle_streams)),
+                                   return_exceptions=True)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        client = Client(port, cookie)
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                status = await client.get(path)
+            except (OSError, asyncio.IncompleteReadError, ConnectionError):
+                errors += 1
+                await client.close()
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+        await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    for stream in streams:
+        if not isinstance(stream, BaseException):
+            stream.close()
+    opened = sum(not isinstance(stream, BaseException) for stream in streams)
+    return latencies, errors, elapsed, opened
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--endpoint', choices=('group', 'groups', 'dashboard'), default='group')
+    parser.add_argument('--idle-streams', type=int, default=0)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--expenses', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.database, args.port)
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'bench.db')
+    try:
+        group_id = populate(database, args.groups, args.expenses)
+        path = {'group': f'/api/groups/{group_id}', 'groups': '/api/groups/', 'dashboard': '/api/dashboard'}[args.endpoint]
+        print(f'{args.connections} connections x {args.requests} GET {path}, '
+              f'{args.idle_streams} idle event streams')
+        print(f"{'mode':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'streams':>8} "
+              f"{'threads':>8} {'rss':>10}")
+        modes = ('wsgi', 'asgi') if args.mode == 'both' else (args.mode,)
+        for offset, mode in enumerate(modes):
+            port = args.port + offset
+            process = start_server(mode, database, port)
+            try:
+                cookie = login(port)
+                # Fill the server's identity cache before measuring
+                asyncio.run(Client(port, cookie).get(path))
+                latencies, errors, elapsed, opened = asyncio.run(load(
+                    port, cookie, path, args.connections, args.requests,
+                    args.idle_streams, f'/api/groups/{group_id}/events'
+                ))
+                stats = server_stats(process.pid)
+            finally:
+                process.terminate()
+                process.wait()
+            print(f'{mode:>5} {len(latencies) / elapsed:>8.1f} '
+                  f'{percentile(latencies, 0.5) * 1000:>7.1f}ms {percentile(latencies, 0.95) * 1000:>7.1f}ms '
+                  f'{percentile(latencies, 0.99) * 1000:>7.1f}ms {errors:>7} {opened:>8} '
+                  f'{stats.get("Threads", "?"):>8} {stats.get("VmRSS", "?"):>10}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Concurrent login load test.
+
+Usage:
+    python benchmarks/bench_login.py [--clients 32] [--logins 8] [--workers 2] [--queue 16]
+
+Registers ``--clients`` users, then every client thread logs in
+``--logins`` times through the test client while a separate thread keeps
+requesting a cheap endpoint. It reports login latency percentiles, how
+many logins were turned away with 503, the latency of the cheap requests
+(which should stay low while hashing is saturated) and the hasher's
+queue metrics.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from app import create_app
+from app import passwords
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=Config.PASSWORD_HASH_WORKERS)
+    parser.add_argument('--queue', type=int, default=16)
+    parser.add_argument('--method', default='pbkdf2:sha256:600000')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'bench.db')
+        WTF_CSRF_ENABLED = False
+        PASSWORD_HASH_METHOD = args.method
+        PASSWORD_HASH_WORKERS = args.workers
+        PASSWORD_HASH_QUEUE_SIZE = args.queue
+
+    try:
+        app = create_app(BenchConfig)
+        setup = app.test_client()
+        for index in range(args.clients):
+            setup.post('/api/auth/register', json={
+                'username': f'user{index}', 'email': f'user{index}@example.com', 'password': 'secret'
+            })
+
+        logins, rejected, probes = [], [], []
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def client(index):
+            http = app.test_client()
+            for _ in range(args.logins):
+                start = time.perf_counter()
+                response = http.post('/api/auth/login', json={'username': f'user{index}', 'password': 'secret'})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    (rejected if response.status_code == 503 else logins).append(elapsed)
+
+        def probe():
+            http = app.test_client()
+            while not done.is_set():
+                start = time.perf_counter()
+                http.get('/api/csrf-token')
+                probes.append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+        prober = threading.Thread(target=probe)
+        prober.start()
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        done.set()
+        prober.join()
+
+        print(f'{len(logins)} logins, {len(rejected)} rejected with 503 in {wall:.2f}s '
+              f'({len(logins) / wall:.1f} logins/s)')
+        for label, values in (('login', logins), ('rejected', rejected), ('probe', probes)):
+            if values:
+                print(f'{label:>10}: p50 {percentile(values, 0.5) * 1000:8.1f} ms  '
+                      f'p95 {percentile(values, 0.95) * 1000:8.1f} ms  '
+                      f'p99 {percentile(values, 0.99) * 1000:8.1f} ms  '
+                      f'mean {statistics.mean(values) * 1000:8.1f} ms')
+        print('hasher:', passwords.get_hasher().stats())
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Serialize a large group view: compiled schemas against hand-built dicts.
+
+Usage:
+    python benchmarks/bench_serializers.py [--expenses 1000] [--splits 5] [--repeat 20]
+
+The legacy path is the per-expense comprehension the group view used to
+run, encoded the way ``jsonify`` does (sorted keys through the stdlib
+encoder). The new path is ``serializers.EXPENSE.dump_many`` plus
+``serializers.dumps``, which uses orjson when it is installed. Objects
+are plain namespaces, so only serialization is measured.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import serializers
+from app.money import to_major
+
+
+def make_expenses(count, splits_per_expense):
+    users = [SimpleNamespace(id=index, username=f'user{index}', email=f'user{index}@example.com')
+             for index in range(splits_per_expense)]
+    start = datetime(2024, 1, 1)
+    expenses = []
+    for index in range(count):
+        expense = SimpleNamespace(
+            id=index, description=f'Expense {index}', amount_minor=1000 + index,
+            date=start + timedelta(minutes=index), group_id=1, payer_id=0,
+            currency='USD', payer=users[0], splits=[]
+        )
+        for position, user in enumerate(users):
+            expense.splits.append(SimpleNamespace(
+                id=index * splits_per_expense + position, expense_id=index, user_id=user.id,
+                amount_minor=200 + position, is_settled=position % 2 == 0,
+                settled_at=start if position % 2 == 0 else None, user=user, expense=expense
+            ))
+        expenses.append(expense)
+    return expenses
+
+
+def legacy_serialize_expense(expense):
+    return {
+        'id': expense.id,
+        'description': expense.description,
+        'amount': to_major(expense.amount_minor, expense.currency),
+        'date': expense.date.isoformat() if expense.date else None,
+        'group_id': expense.group_id,
+        'payer_id': expense.payer_id,
+        'currency': expense.currency,
+        'payer': {
+            'id': expense.payer.id,
+            'username': expense.payer.username,
+            'email': expense.payer.email
+        } if expense.payer else None,
+        'splits': [{
+            'id': split.id,
+            'expense_id': split.expense_id,
+            'user_id': split.user_id,
+            'amount': to_major(split.amount_minor, expense.currency),
+            'is_settled': split.is_settled,
+            'settled_at': split.settled_at.isoformat() if split.settled_at else None,
+            'user': {
+                'id': split.user.id,
+                'username': split.user.username,
+                'email': split.user.email
+            } if split.user else None
+        } for split in expense.splits]
+    }
+
+
+def legacy(expenses):
+    payload = {'status': 'success', 'expenses': [legacy_serialize_expense(expense) for expense in expenses]}
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+
+
+def compiled(expenses):
+    return serializers.dumps({'status': 'success', 'expenses': serializers.EXPENSE.dump_many(expenses)})
+
+
+def best_of(func, expenses, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(expenses)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=1000)
+    parser.add_argument('--splits', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    expenses = make_expenses(args.expenses, args.splits)
+    assert json.loads(legacy(expenses)) == json.loads(compiled(expenses)), 'outputs differ'
+
+    encoder = 'orjson' if serializers.orjson is not None else 'json'
+    old = best_of(legacy, expenses, args.repeat)
+    new = best_of(compiled, expenses, args.repeat)
+    print(f'{args.expenses} expenses x {args.splits} splits, encoder: {encoder}')
+    print(f'{"legacy":>10} {old * 1000:>10.2f} ms')
+    print(f'{"compiled":>10} {new * 1000:>10.2f} ms  ({old / new:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Time the settle-up planner against group size.
+
+Usage:
+    python benchmarks/bench_settle_plan.py [--sizes 10,100,1000] [--repeat 5]
+
+Balances are random but zero-sum, like the ones produced by
+Group.get_net_balances().
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.settlement import plan_settlements
+
+
+def random_balances(members, rng):
+    balances = {user_id: round(rng.uniform(-500, 500), 2) for user_id in range(1, members)}
+    # Last member absorbs the remainder so the group nets to zero
+    balances[members] = -round(sum(balances.values()), 2)
+    return balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'members':>10} {'transfers':>10} {'best ms':>10} {'us/member':>10}")
+    for members in (int(size) for size in args.sizes.split(',')):
+        balances = random_balances(members, rng)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            transfers = plan_settlements(balances)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f'{members:>10} {len(transfers):>10} {best * 1000:>10.2f} {best * 1e6 / members:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
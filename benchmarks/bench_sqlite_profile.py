@@ -0,0 +1,122 @@
+"""Mixed read/write throughput with and without the SQLite pragma profile.
+
+Usage:
+    python benchmarks/bench_sqlite_profile.py [--threads 8] [--seconds 5] [--write-ratio 0.2]
+
+Each run uses a fresh database file. Worker threads share one app and
+either add an expense (write) or compute a group's balances (read), and
+the script reports completed operations per second and how many failed
+with "database is locked".
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from app import create_app
+from app.extensions import db
+from app.models import User, Group
+from app import expense_service
+
+GROUPS = 20
+MEMBERS = 5
+
+
+def make_app(path, pragmas):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        SQLITE_PRAGMAS = pragmas
+    return create_app(BenchConfig)
+
+
+def seed(app):
+    with app.app_context():
+        users = [User(username=f'user{index}', email=f'user{index}@example.com')
+                 for index in range(GROUPS * MEMBERS)]
+        for user in users:
+            user.password_hash = 'x'
+        db.session.add_all(users)
+        db.session.flush()
+        groups = []
+        for index in range(GROUPS):
+            group = Group(name=f'group{index}', created_by_id=users[index * MEMBERS].id)
+            group.members.extend(users[index * MEMBERS:(index + 1) * MEMBERS])
+            groups.append(group)
+        db.session.add_all(groups)
+        db.session.commit()
+        return [(group.id, [member.id for member in group.members]) for group in groups]
+
+
+def worker(app, groups, write_ratio, deadline, counts, lock, seed_value):
+    rng = random.Random(seed_value)
+    reads = writes = locked = 0
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            group_id, member_ids = rng.choice(groups)
+            try:
+                if rng.random() < write_ratio:
+                    group = db.session.get(Group, group_id)
+                    expense_service.create_expense(group, member_ids[0], 'bench', rng.randint(100, 10000), member_ids)
+                    db.session.commit()
+                    writes += 1
+                else:
+                    db.session.get(Group, group_id).get_member_balances()
+                    db.session.rollback()
+                    reads += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+    with lock:
+        counts['reads'] += reads
+        counts['writes'] += writes
+        counts['locked'] += locked
+
+
+def run(label, pragmas, args):
+    directory = tempfile.mkdtemp()
+    try:
+        app = make_app(os.path.join(directory, 'bench.db'), pragmas)
+        groups = seed(app)
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        threads = [threading.Thread(target=worker, args=(app, groups, args.write_ratio, deadline, counts, lock, index))
+                   for index in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+        total = counts['reads'] + counts['writes']
+        print(f"{label:>10} {total / args.seconds:>10.0f} {counts['reads'] / args.seconds:>10.0f} "
+              f"{counts['writes'] / args.seconds:>10.0f} {counts['locked']:>8}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'profile':>10} {'ops/s':>10} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    run('default', {}, args)
+    run('tuned', Config.SQLITE_PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""Latency and query counts of the main read and write paths at several data scales.
+
+Usage:
+    python benchmarks/bench_suite.py [--scales small,medium] [--iterations 50]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.25]
+
+For every scale of :mod:`synthetic` the suite builds a fresh database,
+logs in as ``user0`` (a member of every group) and times each case
+through Flask's test client:
+
+    get_all_balances     User.get_all_balances, behind the HTML dashboard
+    dashboard            GET /api/dashboard
+    settle_plan          GET /api/groups/<id>/settle-plan
+    view_group           GET /api/groups/<id>
+    add_expense          POST /api/expenses/group/<id>
+
+The HTML dashboard needs CSRF template globals the API app does not
+install, so ``get_all_balances`` is called directly for ``user0``. Each case reports p50/p95/p99 latency and the
+SQL statements one call executes.
+
+Results are compared with the stored baseline: a case regresses when it
+runs more queries than before, or when its p50 grows by more than
+``--tolerance``. The script exits with status 1 if anything regressed.
+``--save-baseline`` replaces the baseline with this run instead. Latency
+depends on the machine, so save a baseline on the machine that compares
+against it; query counts do not.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from app import create_app
+from app.extensions import db
+from app.models import Group, User
+from app.testing import count_queries
+
+import synthetic
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def make_app(path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        WTF_CSRF_ENABLED = False
+    return create_app(BenchConfig)
+
+
+def cases(app, client, group_id, member_ids):
+    """``{name: callable}``; each callable makes one call and checks it succeeded."""
+
+    def get(path):
+        def call():
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+        return call
+
+    def get_all_balances():
+        with app.app_context():
+            db.session.get(User, member_ids[0]).get_all_balances()
+
+    def add_expense():
+        response = client.post(f'/api/expenses/group/{group_id}', json={
+            'description': 'Benchmark expense',
+            'amount': '12.34',
+            'split_with': member_ids
+        })
+        assert response.status_code in (200, 201), response.status_code
+
+    return {
+        'get_all_balances': get_all_balances,
+        'dashboard': get('/api/dashboard'),
+        'settle_plan': get(f'/api/groups/{group_id}/settle-plan'),
+        'view_group': get(f'/api/groups/{group_id}'),
+        'add_expense': add_expense,
+    }
+
+
+def measure(engine, call, iterations, warmup):
+    for _ in range(warmup):
+        call()
+    timings = []
+    queries = 0
+    # No app context around the calls: each request gets its own, and with
+    # it a fresh session, as it would in production
+    for _ in range(iterations):
+        with count_queries(engine) as statements:
+            start = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - start)
+        queries = max(queries, len(statements))
+    return {
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'queries': queries,
+    }
+
+
+def run_scale(scale, iterations, warmup):
+    directory = tempfile.mkdtemp()
+    try:
+        app = make_app(os.path.join(directory, 'bench.db'))
+        with app.app_context():
+            group_ids = synthetic.populate(scale)
+            group_id = group_ids[0]
+            member_ids = sorted(member.id for member in db.session.get(Group, group_id).members)
+            engine = db.engine
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={'username': 'user0', 'password': synthetic.PASSWORD})
+        assert response.status_code == 200, response.status_code
+        return {
+            name: measure(engine, call, iterations, warmup)
+            for name, call in cases(app, client, group_id, member_ids).items()
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """Print each case next to its baseline. Returns the number of regressions."""
+    regressions = 0
+    print(f"{'scale':<8} {'case':<20} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}  "
+          f"{'base p50':>9} {'base q':>7}  change")
+    for scale_name, scale_results in results.items():
+        for name, result in scale_results.items():
+            before = baseline.get(scale_name, {}).get(name)
+            line = (f"{scale_name:<8} {name:<20} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                    f"{result['p99_ms']:>7.2f}ms {result['queries']:>8}  ")
+            if before is None:
+                print(line + f"{'-':>9} {'-':>7}  new")
+                continue
+            change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            flags = []
+            if result['queries'] > before['queries']:
+                flags.append(f"+{result['queries'] - before['queries']} queries")
+            if change > tolerance:
+                flags.append('slower')
+            regressions += bool(flags)
+            print(line + f"{before['p50_ms']:>7.2f}ms {before['queries']:>7}  {change:+.0%}"
+                  + (f"  REGRESSION: {', '.join(flags)}" if flags else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='small,medium',
+                        help=f"Comma separated, from {', '.join(synthetic.SCALES)}")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p50 growth before a case counts as slower (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    scale_names = args.scales.split(',')
+    for name in scale_names:
+        if name not in synthetic.SCALES:
+            parser.error(f'unknown scale {name!r}')
+
+    results = {}
+    for name in scale_names:
+        started = time.perf_counter()
+        results[name] = run_scale(synthetic.SCALES[name], args.iterations, args.warmup)
+        print(f'{name}: {synthetic.SCALES[name]} measured in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as baseline:
+            json.dump({
+                'machine': platform.platform(),
+                'python': platform.python_version(),
+                'iterations': args.iterations,
+                'results': results
+            }, baseline, indent=2, sort_keys=True)
+            baseline.write('\n')
+        compare(results, {}, args.tolerance)
+        print(f'Saved baseline to {args.baseline}.')
+        return
+
+    with open(args.baseline) as baseline:
+        stored = json.load(baseline)
+    regressions = compare(results, stored['results'], args.tolerance)
+    if regressions:
+        print(f'{regressions} regressions against {args.baseline} ({stored["machine"]}).')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
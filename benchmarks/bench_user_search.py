@@ -0,0 +1,98 @@
+"""User search latency: indexed search against the old ILIKE scan.
+
+Usage:
+    python benchmarks/bench_user_search.py [--users 1000000] [--repeat 20]
+
+Builds a database of synthetic users (the FTS5 index is filled by its
+triggers as rows go in), then times app.user_search.search() and the
+previous ``username ILIKE '%q%' LIMIT 5`` query for a few typical member
+picker inputs.
+"""
+import argparse
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app import user_search
+
+QUERIES = ('a', 'jo', 'john', 'smith', 'ohn.sm', 'example.org', 'zzzq')
+FIRST = ('john', 'jane', 'alex', 'maria', 'sam', 'lee', 'chris', 'priya', 'omar', 'yuki')
+LAST = ('smith', 'jones', 'garcia', 'khan', 'tanaka', 'nguyen', 'brown', 'rossi', 'silva', 'cohen')
+
+
+def make_users(count, rng):
+    for index in range(count):
+        name = f'{rng.choice(FIRST)}.{rng.choice(LAST)}{index}'
+        suffix = ''.join(rng.choices(string.ascii_lowercase, k=3))
+        yield {
+            'username': name,
+            'email': f'{name}{suffix}@example.{rng.choice(("com", "org", "net"))}',
+            'password_hash': 'x'
+        }
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return result, timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=Config.USER_SEARCH_LIMIT)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'bench.db')
+
+    try:
+        app = create_app(BenchConfig)
+        rng = random.Random(args.seed)
+        with app.app_context():
+            start = time.perf_counter()
+            batch = []
+            for row in make_users(args.users, rng):
+                batch.append(row)
+                if len(batch) == 10000:
+                    db.session.execute(User.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                db.session.execute(User.__table__.insert(), batch)
+            db.session.commit()
+            print(f'Inserted {args.users} users in {time.perf_counter() - start:.1f}s '
+                  f'(FTS5 index: {user_search.has_index()})')
+
+            print(f"{'query':>12} {'hits':>5} {'search p50':>12} {'max':>10} {'ilike p50':>12} {'max':>10}")
+            for query in QUERIES:
+                hits, median, worst = timed(lambda: user_search.search(query, args.limit), args.repeat)
+                _, old_median, old_worst = timed(
+                    lambda: User.query.filter(User.username.ilike(f'%{query}%')).limit(args.limit).all(),
+                    max(1, args.repeat // 4)
+                )
+                print(f'{query:>12} {len(hits):>5} {median * 1000:>10.2f}ms {worst * 1000:>8.2f}ms '
+                      f'{old_median * 1000:>10.2f}ms {old_worst * 1000:>8.2f}ms')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
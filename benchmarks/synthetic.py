@@ -0,0 +1,172 @@
+"""Deterministic synthetic data for benchmarks.
+
+Usage:
+    python benchmarks/synthetic.py DATABASE [--scale small] [--users N] [--groups N]
+        [--members N] [--expenses N] [--splits N] [--seed 0]
+
+Fills an empty database with ``users`` users named ``user0``, ``user1``...
+(all with the password ``password``) and ``groups`` groups of ``members``
+members. Every group has ``expenses`` expenses, each split equally
+between ``splits`` of its members, and a ``settled`` fraction of the
+splits is marked settled. ``user0`` belongs to every group, so it sees
+the most data. The same parameters and seed always produce the same rows,
+ids included, so results of different runs are comparable.
+
+Expenses go through :func:`app.expense_service.create_expenses`, so the
+balance ledger and change log are kept as the app keeps them.
+"""
+import argparse
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import Group, User, ExpenseSplit, group_members
+from app import expense_service, ledger
+
+PASSWORD = 'password'
+START = datetime(2024, 1, 1)
+CURRENCIES = ('USD', 'USD', 'USD', 'EUR', 'JPY')
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    groups: int
+    members: int
+    expenses: int
+    splits: int
+    settled: float = 0.2
+    seed: int = 0
+
+    def __post_init__(self):
+        if not 2 <= self.members <= self.users:
+            raise ValueError('members must be between 2 and users')
+        if not 1 <= self.splits <= self.members:
+            raise ValueError('splits must be between 1 and members')
+
+
+SCALES = {
+    'small': Scale(users=50, groups=10, members=5, expenses=100, splits=3),
+    'medium': Scale(users=500, groups=50, members=10, expenses=500, splits=5),
+    'large': Scale(users=2000, groups=100, members=25, expenses=2000, splits=10),
+}
+
+
+def populate(scale):
+    """Insert the data of ``scale`` and commit. Needs an app context.
+
+    Returns the ids of the generated groups.
+    """
+    rng = random.Random(scale.seed)
+    # One cheap hash shared by everybody: generating data should not be
+    # dominated by password hashing
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1')
+    user_ids = db.session.scalars(
+        User.__table__.insert().returning(User.id, sort_by_parameter_order=True),
+        [{
+            'username': f'user{index}',
+            'email': f'user{index}@example.com',
+            'password_hash': password_hash
+        } for index in range(scale.users)]
+    ).all()
+
+    group_ids = []
+    for index in range(scale.groups):
+        members = [user_ids[0]] + rng.sample(user_ids[1:], scale.members - 1)
+        group = Group(
+            name=f'Group {index}',
+            currency=CURRENCIES[index % len(CURRENCIES)],
+            created_by_id=members[0],
+            created_at=START,
+            updated_at=START
+        )
+        db.session.add(group)
+        db.session.flush()
+        db.session.execute(group_members.insert(), [
+            {'group_id': group.id, 'user_id': member_id} for member_id in members
+        ])
+
+        entries = []
+        for number in range(scale.expenses):
+            payer_id = rng.choice(members)
+            others = [member_id for member_id in members if member_id != payer_id]
+            entries.append({
+                'description': f'Expense {number}',
+                'amount_minor': rng.randint(100, 50000),
+                'payer_id': payer_id,
+                # The payer usually shares the cost
+                'split_with': [payer_id] + rng.sample(others, scale.splits - 1)
+                              if scale.splits > 1 else [rng.choice(others)],
+                'date': START + timedelta(minutes=number * 37 + rng.randint(0, 36))
+            })
+        rows = expense_service.create_expenses(group, entries)
+        settled = [{
+            'target_expense_id': row['id'],
+            'target_user_id': split['user_id']
+        } for row in rows for split in row['splits']
+            if split['user_id'] != row['payer_id'] and rng.random() < scale.settled]
+        if settled:
+            table = ExpenseSplit.__table__
+            db.session.execute(
+                table.update()
+                    .where(table.c.expense_id == db.bindparam('target_expense_id'))
+                    .where(table.c.user_id == db.bindparam('target_user_id'))
+                    .values(is_settled=True, settled_at=START),
+                settled
+            )
+        group_ids.append(group.id)
+
+    # Settling in bulk bypassed the ledger
+    ledger.rebuild()
+    db.session.commit()
+    return group_ids
+
+
+def add_arguments(parser):
+    """The ``--scale`` option and per-parameter overrides."""
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in ('users', 'groups', 'members', 'expenses', 'splits', 'seed'):
+        parser.add_argument(f'--{name}', type=int, default=None)
+    parser.add_argument('--settled', type=float, default=None)
+
+
+def scale_from_arguments(args, name=None):
+    """``SCALES[name or args.scale]`` with the overrides given on the command line."""
+    overrides = {
+        field: getattr(args, field) for field in asdict(SCALES['small'])
+        if getattr(args, field, None) is not None
+    }
+    return replace(SCALES[name or args.scale], **overrides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    add_arguments(parser)
+    args = parser.parse_args()
+    scale = scale_from_arguments(args)
+
+    from config import Config
+    from app import create_app
+
+    class SyntheticConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(args.database)
+
+    app = create_app(SyntheticConfig)
+    with app.app_context():
+        if db.session.query(User.id).first() is not None:
+            parser.error(f'{args.database} already has users')
+        group_ids = populate(scale)
+    print(f'Generated {scale.users} users and {len(group_ids)} groups '
+          f'of {scale.expenses} expenses ({scale}).')
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,53 @@ class Config:
         'pool_pre_ping': True,
         'pool_recycle': 300,
     }
+
+    # Applied to every SQLite connection and checked at startup. WAL lets
+    # reads run alongside a writer, and busy_timeout (ms) makes writers wait
+    # for the lock instead of failing with "database is locked".
+    # Set to {} to keep SQLite's defaults.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # durable in WAL mode except on power loss
+        'busy_timeout': 5000,
+        'cache_size': -65536,  # negative values are KiB: 64 MiB per connection
+        'mmap_size': 268435456,  # 256 MiB
+        'temp_store': 'MEMORY',
+    }
+
+    # SQL instrumentation, off by default: per-request query count and DB
+    # time in a Server-Timing header, with the SLOWEST_PER_REQUEST slowest
+    # statements, and statements over SLOW_QUERY_MS (None: no log) written
+    # to a log rotated at MAX_BYTES keeping BACKUP_COUNT files. When off,
+    # no listeners are installed at all.
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    SQL_TIMING_HEADER = True
+    SQL_SLOWEST_PER_REQUEST = 3
+    SLOW_QUERY_MS = 100
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or os.path.join(basedir, 'instance', 'slow_queries.log')
+    SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
+    # ASGI mode (uvicorn asgi:app): read endpoints run on an async driver,
+    # by default the primary URI with sqlite+aiosqlite/postgresql+asyncpg.
+    # Other routes run the Flask views on ASGI_WSGI_THREADS threads.
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+    }
+    ASGI_WSGI_THREADS = 32
+
+    # Read replicas, e.g. READ_REPLICA_URLS=sqlite:////srv/replica.db. Each URL
+    # becomes a bind that serves read-only requests; see app/database.py.
+    # A SQLite copy can be refreshed with `flask replica sync`.
+    SQLALCHEMY_BINDS = {
+        f'replica{index}': url
+        for index, url in enumerate(filter(None, os.environ.get('READ_REPLICA_URLS', '').split(',')))
+    }
+    READ_REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    # Seconds after a write during which the same client reads from the primary
+    READ_AFTER_WRITE_SECONDS = 5
     
     # Flask-Login
     REMEMBER_COOKIE_DURATION = timedelta(days=30)
@@ -25,9 +72,59 @@ class Config:
     REMEMBER_COOKIE_HTTPONLY = True
     SESSION_PROTECTION = 'strong'
     
+    # Password hashing: werkzeug method string (algorithm and cost). Stored
+    # hashes made with another method are upgraded on the next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    # Hashing runs on its own thread pool; at most QUEUE_SIZE jobs may be
+    # waiting or running, further callers wait QUEUE_TIMEOUT seconds and
+    # then get a 503
+    PASSWORD_HASH_WORKERS = min(4, os.cpu_count() or 1)
+    PASSWORD_HASH_QUEUE_SIZE = 32
+    PASSWORD_HASH_QUEUE_TIMEOUT = 0.5
+    
+    # Seconds an authenticated user's identity is cached per process
+    USER_CACHE_TTL = 60
+    USER_CACHE_SIZE = 10000
+    
     # Application specific
     EXPENSES_PER_PAGE = 10
     USERS_PER_PAGE = 20
+    # Rows fetched per round trip when streaming /api/groups/users as NDJSON
+    USERS_STREAM_BATCH_SIZE = 1000
+    # Results returned by /api/groups/users/search, overridable with ?limit=
+    USER_SEARCH_LIMIT = 5
+    USER_SEARCH_MAX_LIMIT = 50
+    
+    # Delta sync: entries per /api/groups/<id>/changes page, and days a
+    # change log entry is kept before `flask changes compact` removes it
+    CHANGES_PER_PAGE = 500
+    CHANGES_MAX_PER_PAGE = 1000
+    CHANGE_LOG_RETENTION_DAYS = 30
+    
+    # Server-Sent Events at /api/groups/<id>/events. Streams send a comment
+    # every HEARTBEAT seconds and also pick up changes made by other
+    # processes then; a stream more than QUEUE_SIZE notifications behind
+    # catches up from the change log. Serve them from gevent/eventlet
+    # workers so open streams do not each hold a thread.
+    EVENTS_HEARTBEAT_SECONDS = 15
+    EVENTS_QUEUE_SIZE = 100
+    EVENTS_MAX_SUBSCRIBERS = 1000
+    EVENTS_RETRY_MS = 3000  # reconnect delay suggested to EventSource
+    
+    # Group deletion: expenses (with their splits) deleted per transaction,
+    # and the size above which a background thread deletes the group,
+    # pausing BATCH_PAUSE seconds between batches to let other writers in
+    GROUP_DELETE_BATCH_SIZE = 500
+    GROUP_DELETE_BACKGROUND_THRESHOLD = 2000
+    GROUP_DELETE_BATCH_PAUSE = 0.05
+    
+    # Bulk expense import: rows per INSERT/commit and per-row errors reported
+    BULK_IMPORT_CHUNK_SIZE = 1000
+    BULK_IMPORT_MAX_ERRORS = 1000
+    
+    # Read balances from the materialized balance_ledger table instead of
+    # aggregating expense_split on every request
+    BALANCE_LEDGER = True
     
     # CSRF Protection
     WTF_CSRF_ENABLED = True
@@ -12,13 +12,13 @@ import { ProtectedRoute } from "@/components/protected-route"
 import { useUser } from "@/contexts/user-context"
 import { api } from "@/lib/api-client"
 import { useToast } from "@/components/ui/use-toast"
-import type { Group, Balance } from "@/types/schema"
+import type { GroupSummary, Balance } from "@/types/schema"
 import { formatCurrency } from "@/lib/utils"
 
 export default function DashboardPage() {
   const { loading: userLoading } = useUser()
   const { toast } = useToast()
-  const [groups, setGroups] = useState<Group[]>([])
+  const [groups, setGroups] = useState<GroupSummary[]>([])
   const [balance, setBalance] = useState<Balance>({
     totalOwed: 0,
     totalOwes: 0,
@@ -1,7 +1,7 @@
 'use client';
 
 import { useEffect, useState, useCallback } from 'react';
-import { Group, Expense, User, GroupResponse, ApiResponse } from '@/types/schema';
+import { Group, Expense, User, GroupResponse, ApiResponse, ExpensePageResponse, UserPageResponse } from '@/types/schema';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { useRouter } from 'next/navigation';
@@ -28,6 +28,21 @@ import { toast } from "sonner";
 import { Trash2 } from "lucide-react";
 import { Badge } from "@/components/ui/badge";
 
+// Follow-up pages of paginated endpoints, which the api client has no
+// helpers for
+const getPage = async <T,>(path: string): Promise<T> => {
+  const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000'}${path}`, {
+    credentials: 'include',
+    headers: {
+      'Accept': 'application/json'
+    }
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to load ${path} (${response.status})`);
+  }
+  return response.json();
+};
+
 interface GroupDetailsProps {
   params: {
     groupId: string;
@@ -69,11 +84,15 @@ export default function GroupDetailsPage({ params }: GroupDetailsProps) {
       const groupData = groupResponse.data as GroupResponse;
       
       if (groupData.status === 'success' && groupData.group) {
+        // The group response only carries the newest page of expenses;
+        // balances need all of them, so load the rest before showing any
+        const allExpenses = [
+          ...(groupData.expenses || []),
+          ...await fetchOlderExpenses(groupData.group.id, groupData.next_cursor)
+        ];
         setGroup(groupData.group);
-        setExpenses(groupData.expenses || []);
-        calculateBalances(groupData.expenses || []);
-        
-        // No need to fetch expenses separately as they're included in group response
+        setExpenses(allExpenses);
+        calculateBalances(allExpenses);
       } else {
         console.error('Failed to fetch group:', groupData.message);
         setError(groupData.message || 'Failed to load group details');
@@ -86,6 +105,18 @@ export default function GroupDetailsPage({ params }: GroupDetailsProps) {
     }
   };
 
+  const fetchOlderExpenses = async (groupId: number, cursor?: string | null) => {
+    const older: Expense[] = [];
+    while (cursor) {
+      const page = await getPage<ExpensePageResponse>(
+        `/api/groups/${groupId}/expenses?limit=100&cursor=${encodeURIComponent(cursor)}`
+      );
+      older.push(...page.data.expenses);
+      cursor = page.data.next_cursor;
+    }
+    return older;
+  };
+
   useEffect(() => {
     fetchGroupDetails();
     fetchCurrentUser();
@@ -106,9 +137,20 @@ export default function GroupDetailsPage({ params }: GroupDetailsProps) {
     try {
       const response = await api.getUsers();
       if (response.data.status === 'success' && response.data.data?.users) {
+        // The directory comes a page at a time; the picker lists everyone
+        const allUsers: User[] = [...response.data.data.users];
+        let cursor: string | null = response.data.data.next_cursor;
+        while (cursor) {
+          const page = await getPage<UserPageResponse>(
+            `/api/groups/users?limit=100&cursor=${encodeURIComponent(cursor)}`
+          );
+          allUsers.push(...page.data.users);
+          cursor = page.data.next_cursor;
+        }
+
         // Filter out users who are already members of the group
         const groupMemberIds = group?.members.map((member: User) => member.id) || [];
-        const availableUsers = response.data.data.users.filter((user: User) => !groupMemberIds.includes(user.id));
+        const availableUsers = allUsers.filter((user: User) => !groupMemberIds.includes(user.id));
         setUsers(availableUsers);
       } else {
         toast.error("Failed to load users");
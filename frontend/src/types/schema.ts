@@ -23,6 +23,12 @@ export interface Group {
   updated_at: string | null;
 }
 
+// A row of GET /api/groups/: members only with ?include_members=true,
+// member_count always
+export interface GroupSummary extends Omit<Group, 'members'> {
+  members?: Group['members'];
+}
+
 export interface Expense {
   id: number;
   description: string;
@@ -82,10 +88,30 @@ export interface GroupResponse {
   status: 'success' | 'error';
   message?: string;
   group: Group;
+  // Newest page only; older pages come from /api/groups/<id>/expenses
   expenses: Expense[];
+  next_cursor: string | null;
   balances: Record<string, number>;
 }
 
+export interface ExpensePageResponse {
+  status: 'success' | 'error';
+  message?: string;
+  data: {
+    expenses: Expense[];
+    next_cursor: string | null;
+  };
+}
+
+export interface UserPageResponse {
+  status: 'success' | 'error';
+  message?: string;
+  data: {
+    users: User[];
+    next_cursor: string | null;
+  };
+}
+
 export interface GroupMembersResponse {
   status: 'success' | 'error';
   message?: string;
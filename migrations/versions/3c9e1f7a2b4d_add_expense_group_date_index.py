@@ -0,0 +1,30 @@
+"""add expense (group_id, date, id) index
+
+Revision ID: 3c9e1f7a2b4d
+Revises: 
+Create Date: 2026-10-18 10:12:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f7a2b4d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table, name):
+    return any(index['name'] == name for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    # create_all() already builds the index on fresh databases
+    if not _has_index('expense', 'ix_expense_group_id_date_id'):
+        op.create_index('ix_expense_group_id_date_id', 'expense', ['group_id', 'date', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_expense_group_id_date_id', table_name='expense')
@@ -0,0 +1,30 @@
+"""add group_members group_id index
+
+Revision ID: 8d2a4b6e0f13
+Revises: 3c9e1f7a2b4d
+Create Date: 2026-10-18 11:04:27.531870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2a4b6e0f13'
+down_revision = '3c9e1f7a2b4d'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table, name):
+    return any(index['name'] == name for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    # create_all() already builds the index on fresh databases
+    if not _has_index('group_members', 'ix_group_members_group_id'):
+        op.create_index('ix_group_members_group_id', 'group_members', ['group_id'])
+
+
+def downgrade():
+    op.drop_index('ix_group_members_group_id', table_name='group_members')
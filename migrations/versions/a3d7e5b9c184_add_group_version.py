@@ -0,0 +1,29 @@
+"""add group version
+
+Revision ID: a3d7e5b9c184
+Revises: f1b6d2a8c390
+Create Date: 2026-10-18 17:08:36.224917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d7e5b9c184'
+down_revision = 'f1b6d2a8c390'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() already adds the column on fresh databases
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('group')}
+    if 'version' not in columns:
+        op.add_column('group', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    # A plain DROP COLUMN (SQLite 3.35+); batch mode would copy the table
+    # and cascade-delete expenses through the foreign keys
+    op.drop_column('group', 'version')
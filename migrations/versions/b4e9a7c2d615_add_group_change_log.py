@@ -0,0 +1,40 @@
+"""add group change log
+
+Revision ID: b4e9a7c2d615
+Revises: d8c2f6a1e937
+Create Date: 2026-10-18 19:12:47.108362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e9a7c2d615'
+down_revision = 'd8c2f6a1e937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() already builds the table on fresh databases
+    if sa.inspect(op.get_bind()).has_table('group_change'):
+        return
+    op.create_table('group_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=32), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=True),
+        sa.Column('data', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id', 'seq', name='uq_group_change_group_id_seq')
+    )
+    op.create_index('ix_group_change_created_at', 'group_change', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_group_change_created_at', table_name='group_change')
+    op.drop_table('group_change')
@@ -0,0 +1,139 @@
+"""store amounts as integer minor units (expand + backfill)
+
+Adds nullable ``amount_minor`` columns to ``expense`` and ``expense_split``
+and fills them from the legacy float ``amount`` columns in bounded id
+ranges, committing after every batch so the write lock is only ever held
+for one batch. On SQLite, triggers keep ``amount_minor`` in sync for rows
+that the previous release writes while the backfill runs.
+
+Deploy in two steps: run this revision with the old code still serving,
+then deploy the new code together with the contract revision that drops
+the float columns. Set ``MIGRATION_BATCH_SIZE`` to tune the batch size
+(default 5000 rows).
+
+Revision ID: b7e4c1d95a20
+Revises: c1a8f5d3b702
+Create Date: 2026-10-18 13:26:52.904417
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c1d95a20'
+down_revision = 'c1a8f5d3b702'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 5000))
+
+# Frozen copy of app.money.CURRENCY_EXPONENTS as of this revision
+CURRENCY_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0,
+    'KRW': 0, 'PYG': 0, 'RWF': 0, 'UGX': 0, 'VND': 0, 'VUV': 0, 'XAF': 0,
+    'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+}
+
+
+def _scale(currency):
+    """SQL expression for 10 ** exponent of ``currency``"""
+    cases = ' '.join(
+        f"WHEN '{code}' THEN {10 ** places}" for code, places in sorted(CURRENCY_EXPONENTS.items())
+    )
+    return f'(CASE UPPER({currency}) {cases} ELSE 100 END)'
+
+
+EXPENSE_MINOR = f'CAST(ROUND(amount * {_scale("currency")}) AS INTEGER)'
+SPLIT_MINOR = (
+    f'CAST(ROUND(amount * {_scale("(SELECT expense.currency FROM expense WHERE expense.id = expense_split.expense_id)")}) AS INTEGER)'
+)
+
+TRIGGERS = {
+    'expense_amount_minor_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS expense_amount_minor_insert
+        AFTER INSERT ON expense WHEN NEW.amount_minor IS NULL
+        BEGIN
+            UPDATE expense SET amount_minor = {EXPENSE_MINOR} WHERE id = NEW.id;
+        END""",
+    'expense_amount_minor_update': f"""
+        CREATE TRIGGER IF NOT EXISTS expense_amount_minor_update
+        AFTER UPDATE OF amount ON expense
+        BEGIN
+            UPDATE expense SET amount_minor = {EXPENSE_MINOR} WHERE id = NEW.id;
+        END""",
+    'expense_split_amount_minor_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS expense_split_amount_minor_insert
+        AFTER INSERT ON expense_split WHEN NEW.amount_minor IS NULL
+        BEGIN
+            UPDATE expense_split SET amount_minor = {SPLIT_MINOR} WHERE id = NEW.id;
+        END""",
+    'expense_split_amount_minor_update': f"""
+        CREATE TRIGGER IF NOT EXISTS expense_split_amount_minor_update
+        AFTER UPDATE OF amount ON expense_split
+        BEGIN
+            UPDATE expense_split SET amount_minor = {SPLIT_MINOR} WHERE id = NEW.id;
+        END""",
+}
+
+
+def _set_foreign_keys(enabled):
+    # The pragma is a no-op inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(f'PRAGMA foreign_keys={"ON" if enabled else "OFF"}')
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _backfill(table, expression):
+    bind = op.get_bind()
+    bounds = bind.execute(sa.text(
+        f'SELECT MIN(id), MAX(id) FROM {table} WHERE amount_minor IS NULL'
+    )).first()
+    if bounds is None or bounds[0] is None:
+        return
+
+    low, high = bounds
+    for start in range(low, high + 1, BATCH_SIZE):
+        with op.get_context().autocommit_block():
+            bind.execute(sa.text(
+                f'UPDATE {table} SET amount_minor = {expression} '
+                f'WHERE id >= :start AND id < :end AND amount_minor IS NULL'
+            ), {'start': start, 'end': start + BATCH_SIZE})
+
+
+def upgrade():
+    # Databases created by create_all() with the new models are already done
+    if 'amount' not in _columns('expense'):
+        return
+
+    for table in ('expense', 'expense_split'):
+        if 'amount_minor' not in _columns(table):
+            op.add_column(table, sa.Column('amount_minor', sa.BigInteger(), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in TRIGGERS.values():
+            op.execute(statement)
+
+    _backfill('expense', EXPENSE_MINOR)
+    _backfill('expense_split', SPLIT_MINOR)
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for name in TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        # Batch mode recreates tables; with foreign keys on, dropping the
+        # old expense table would cascade-delete every split
+        _set_foreign_keys(False)
+    for table in ('expense_split', 'expense'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('amount_minor')
+    if sqlite:
+        _set_foreign_keys(True)
@@ -0,0 +1,42 @@
+"""add balance ledger
+
+Revision ID: c1a8f5d3b702
+Revises: 8d2a4b6e0f13
+Create Date: 2026-10-18 02:26:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1a8f5d3b702'
+down_revision = '8d2a4b6e0f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() already builds the table on fresh databases. Rows are
+    # derived data, filled on the next start by ledger.ensure_populated()
+    if not sa.inspect(op.get_bind()).has_table('balance_ledger'):
+        # Float amounts, as expenses had then; the minor units contract
+        # revision turns them into integers
+        op.create_table('balance_ledger',
+            sa.Column('group_id', sa.Integer(), nullable=False),
+            sa.Column('creditor_id', sa.Integer(), nullable=False),
+            sa.Column('debtor_id', sa.Integer(), nullable=False),
+            sa.Column('net_amount', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['creditor_id'], ['user.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['debtor_id'], ['user.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('group_id', 'creditor_id', 'debtor_id')
+        )
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('balance_ledger')}
+    if 'ix_balance_ledger_creditor_id' not in indexes:
+        op.create_index('ix_balance_ledger_creditor_id', 'balance_ledger', ['creditor_id', 'group_id'])
+
+
+def downgrade():
+    op.drop_index('ix_balance_ledger_creditor_id', table_name='balance_ledger')
+    op.drop_table('balance_ledger')
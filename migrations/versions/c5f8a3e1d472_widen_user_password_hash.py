@@ -0,0 +1,32 @@
+"""widen user password_hash
+
+Revision ID: c5f8a3e1d472
+Revises: e2a9f4c8d6b1
+Create Date: 2026-10-18 14:22:05.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f8a3e1d472'
+down_revision = 'e2a9f4c8d6b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt hashes are longer than 128 characters. SQLite does not enforce
+    # VARCHAR lengths, so only other databases need the change.
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('user', 'password_hash',
+                        existing_type=sa.String(length=128),
+                        type_=sa.String(length=256))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('user', 'password_hash',
+                        existing_type=sa.String(length=256),
+                        type_=sa.String(length=128))
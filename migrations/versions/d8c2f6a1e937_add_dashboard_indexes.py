@@ -0,0 +1,37 @@
+"""add dashboard indexes
+
+Revision ID: d8c2f6a1e937
+Revises: a3d7e5b9c184
+Create Date: 2026-10-18 18:31:12.640553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8c2f6a1e937'
+down_revision = 'a3d7e5b9c184'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table, name):
+    return any(index['name'] == name for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    # create_all() already builds the new indexes on fresh databases
+    if not _has_index('expense', 'ix_expense_payer_id_date'):
+        op.create_index('ix_expense_payer_id_date', 'expense', ['payer_id', 'date', 'id'])
+    if not _has_index('expense_split', 'ix_expense_split_user_id_expense_id'):
+        op.create_index('ix_expense_split_user_id_expense_id', 'expense_split', ['user_id', 'expense_id'])
+    # Superseded: user_id is the leading column of the covering index
+    if _has_index('expense_split', 'ix_expense_split_user_id'):
+        op.drop_index('ix_expense_split_user_id', table_name='expense_split')
+
+
+def downgrade():
+    op.create_index('ix_expense_split_user_id', 'expense_split', ['user_id'])
+    op.drop_index('ix_expense_split_user_id_expense_id', table_name='expense_split')
+    op.drop_index('ix_expense_payer_id_date', table_name='expense')
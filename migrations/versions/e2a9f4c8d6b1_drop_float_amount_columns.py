@@ -0,0 +1,175 @@
+"""drop float amount columns (contract)
+
+Second half of the minor units migration. Finishes any rows the backfill
+did not reach, drops the sync triggers and the legacy float ``amount``
+columns, makes ``amount_minor`` NOT NULL and rebuilds ``balance_ledger``
+with integer amounts. Run together with the release that reads
+``amount_minor``.
+
+Revision ID: e2a9f4c8d6b1
+Revises: b7e4c1d95a20
+Create Date: 2026-10-18 13:41:09.377158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9f4c8d6b1'
+down_revision = 'b7e4c1d95a20'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.money.CURRENCY_EXPONENTS as of this revision
+CURRENCY_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0,
+    'KRW': 0, 'PYG': 0, 'RWF': 0, 'UGX': 0, 'VND': 0, 'VUV': 0, 'XAF': 0,
+    'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+}
+
+SPLIT_CURRENCY = '(SELECT expense.currency FROM expense WHERE expense.id = expense_split.expense_id)'
+
+TRIGGERS = (
+    'expense_amount_minor_insert',
+    'expense_amount_minor_update',
+    'expense_split_amount_minor_insert',
+    'expense_split_amount_minor_update',
+)
+
+REBUILD_LEDGER = """
+    INSERT INTO balance_ledger (group_id, creditor_id, debtor_id, net_amount)
+    SELECT group_id, creditor_id, debtor_id, SUM(amount)
+    FROM (
+        SELECT expense.group_id AS group_id, expense.payer_id AS creditor_id,
+               expense_split.user_id AS debtor_id, expense_split.amount_minor AS amount
+        FROM expense JOIN expense_split ON expense_split.expense_id = expense.id
+        WHERE expense_split.is_settled IS NOT 1 AND expense_split.user_id != expense.payer_id
+        UNION ALL
+        SELECT expense.group_id, expense_split.user_id,
+               expense.payer_id, -expense_split.amount_minor
+        FROM expense JOIN expense_split ON expense_split.expense_id = expense.id
+        WHERE expense_split.is_settled IS NOT 1 AND expense_split.user_id != expense.payer_id
+    ) AS movements
+    GROUP BY group_id, creditor_id, debtor_id
+"""
+
+
+def _scale(currency):
+    """SQL expression for 10 ** exponent of ``currency``"""
+    cases = ' '.join(
+        f"WHEN '{code}' THEN {10 ** places}" for code, places in sorted(CURRENCY_EXPONENTS.items())
+    )
+    return f'(CASE UPPER({currency}) {cases} ELSE 100 END)'
+
+
+def _sync_triggers():
+    """Frozen copy of the expand revision's triggers, for downgrades"""
+    expense_minor = f'CAST(ROUND(amount * {_scale("currency")}) AS INTEGER)'
+    split_minor = f'CAST(ROUND(amount * {_scale(SPLIT_CURRENCY)}) AS INTEGER)'
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS expense_amount_minor_insert
+        AFTER INSERT ON expense WHEN NEW.amount_minor IS NULL
+        BEGIN
+            UPDATE expense SET amount_minor = {expense_minor} WHERE id = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS expense_amount_minor_update
+        AFTER UPDATE OF amount ON expense
+        BEGIN
+            UPDATE expense SET amount_minor = {expense_minor} WHERE id = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS expense_split_amount_minor_insert
+        AFTER INSERT ON expense_split WHEN NEW.amount_minor IS NULL
+        BEGIN
+            UPDATE expense_split SET amount_minor = {split_minor} WHERE id = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS expense_split_amount_minor_update
+        AFTER UPDATE OF amount ON expense_split
+        BEGIN
+            UPDATE expense_split SET amount_minor = {split_minor} WHERE id = NEW.id;
+        END""",
+    ]
+
+
+def _set_foreign_keys(enabled):
+    # The pragma is a no-op inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(f'PRAGMA foreign_keys={"ON" if enabled else "OFF"}')
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if 'amount' not in _columns('expense'):
+        return
+
+    # Rows written after the last backfill batch by code without triggers
+    op.execute(
+        f'UPDATE expense SET amount_minor = CAST(ROUND(amount * {_scale("currency")}) AS INTEGER) '
+        f'WHERE amount_minor IS NULL'
+    )
+    op.execute(
+        f'UPDATE expense_split SET amount_minor = CAST(ROUND(amount * {_scale(SPLIT_CURRENCY)}) AS INTEGER) '
+        f'WHERE amount_minor IS NULL'
+    )
+
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for name in TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        # Batch mode recreates tables; with foreign keys on, dropping the
+        # old expense table would cascade-delete every split
+        _set_foreign_keys(False)
+
+    with op.batch_alter_table('expense') as batch_op:
+        batch_op.drop_column('amount')
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=False)
+
+    with op.batch_alter_table('expense_split') as batch_op:
+        batch_op.drop_constraint('ck_expense_split_amount_positive', type_='check')
+        batch_op.drop_column('amount')
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.create_check_constraint('ck_expense_split_amount_positive', 'amount_minor >= 0')
+
+    # The ledger is derived data: recreate it with integer amounts
+    op.execute('DELETE FROM balance_ledger')
+    with op.batch_alter_table('balance_ledger') as batch_op:
+        batch_op.alter_column('net_amount', existing_type=sa.Float(), type_=sa.BigInteger(),
+                              existing_nullable=False)
+    op.execute(REBUILD_LEDGER)
+
+    if sqlite:
+        _set_foreign_keys(True)
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        _set_foreign_keys(False)
+
+    with op.batch_alter_table('expense') as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=True)
+    # The check moves back to the float column, or the expand downgrade
+    # could not drop amount_minor
+    with op.batch_alter_table('expense_split') as batch_op:
+        batch_op.drop_constraint('ck_expense_split_amount_positive', type_='check')
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=True)
+    op.execute(f'UPDATE expense SET amount = amount_minor / CAST({_scale("currency")} AS FLOAT)')
+    op.execute(f'UPDATE expense_split SET amount = amount_minor / CAST({_scale(SPLIT_CURRENCY)} AS FLOAT)')
+    with op.batch_alter_table('expense_split') as batch_op:
+        batch_op.create_check_constraint('ck_expense_split_amount_positive', 'amount >= 0')
+    op.execute('DELETE FROM balance_ledger')
+    with op.batch_alter_table('balance_ledger') as batch_op:
+        batch_op.alter_column('net_amount', existing_type=sa.BigInteger(), type_=sa.Float(),
+                              existing_nullable=False)
+
+    if sqlite:
+        # The previous release writes only the float columns again
+        for statement in _sync_triggers():
+            op.execute(statement)
+        _set_foreign_keys(True)
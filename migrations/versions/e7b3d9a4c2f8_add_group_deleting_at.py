@@ -0,0 +1,29 @@
+"""add group deleting_at
+
+Revision ID: e7b3d9a4c2f8
+Revises: b4e9a7c2d615
+Create Date: 2026-10-18 21:03:15.640218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3d9a4c2f8'
+down_revision = 'b4e9a7c2d615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() already adds the column on fresh databases
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('group')}
+    if 'deleting_at' not in columns:
+        op.add_column('group', sa.Column('deleting_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    # A plain DROP COLUMN (SQLite 3.35+); batch mode would copy the table
+    # and cascade-delete expenses through the foreign keys
+    op.drop_column('group', 'deleting_at')
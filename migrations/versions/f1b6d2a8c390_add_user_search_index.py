@@ -0,0 +1,62 @@
+"""add user search index
+
+Revision ID: f1b6d2a8c390
+Revises: c5f8a3e1d472
+Create Date: 2026-10-18 15:47:51.902614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d2a8c390'
+down_revision = 'c5f8a3e1d472'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app/user_search.py's DDL
+FTS_STATEMENTS = (
+    "CREATE VIRTUAL TABLE user_search USING fts5("
+    "username, email, content='user', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER user_search_ai AFTER INSERT ON \"user\" BEGIN "
+    "INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email); END",
+    "CREATE TRIGGER user_search_ad AFTER DELETE ON \"user\" BEGIN "
+    "INSERT INTO user_search(user_search, rowid, username, email) "
+    "VALUES ('delete', old.id, old.username, old.email); END",
+    "CREATE TRIGGER user_search_au AFTER UPDATE OF username, email ON \"user\" BEGIN "
+    "INSERT INTO user_search(user_search, rowid, username, email) "
+    "VALUES ('delete', old.id, old.username, old.email); "
+    "INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email); END",
+    "INSERT INTO user_search(user_search) VALUES ('rebuild')",
+)
+
+
+def upgrade():
+    # create_all() already builds the indexes on fresh databases, and the
+    # inspector cannot reflect expression indexes, hence IF NOT EXISTS
+    for name, column in (('ix_user_username_lower', 'username'), ('ix_user_email_lower', 'email')):
+        op.create_index(name, 'user', [sa.text(f'lower({column})')], if_not_exists=True)
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    exists = bind.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+    )).first()
+    if exists is None:
+        for statement in FTS_STATEMENTS:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in (
+            'DROP TRIGGER IF EXISTS user_search_ai',
+            'DROP TRIGGER IF EXISTS user_search_ad',
+            'DROP TRIGGER IF EXISTS user_search_au',
+            'DROP TABLE IF EXISTS user_search',
+        ):
+            op.execute(statement)
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index('ix_user_username_lower', table_name='user')
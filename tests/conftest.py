@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from app import create_app, events, identity
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on a fresh SQLite file, with config overrides."""
+    def make(**overrides):
+        class TestConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+            WTF_CSRF_ENABLED = False
+            PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+        for name, value in overrides.items():
+            setattr(TestConfig, name, value)
+        # Process wide state built from the first app's config
+        events._hub = None
+        identity.clear_cache()
+        return create_app(TestConfig)
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def login():
+    """Register ``username`` with ``app`` and return ``(client, user_id)`` logged in as them."""
+    def login(app, username):
+        client = app.test_client()
+        client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': 'secret'
+        })
+        response = client.post('/api/auth/login', json={'username': username, 'password': 'secret'})
+        assert response.status_code == 200, response.json
+        return client, response.json['data']['user']['id']
+    return login
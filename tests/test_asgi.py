@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+from app.asgi import AsyncApp, create_async_db_engine
+
+
+def asgi_request(asgi_app, client, method, path, query='', body=b'', content_type=None):
+    """Run one request through ``asgi_app`` as the test ``client`` would send
+    it, session included; returns ``(status, headers, body)``."""
+    cookie = client.get_cookie('session')
+    headers = [(b'host', b'localhost'), (b'user-agent', client.environ_base['HTTP_USER_AGENT'].encode())]
+    if cookie is not None:
+        headers.append((b'cookie', f'session={cookie.value}'.encode()))
+    if content_type:
+        headers += [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'root_path': '', 'scheme': 'http',
+        'query_string': query.encode(), 'http_version': '1.1', 'headers': headers,
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 5000),
+    }
+    # The body arrives in two messages, as a server may split it
+    middle = len(body) // 2
+    messages = [
+        {'type': 'http.request', 'body': body[:middle], 'more_body': True},
+        {'type': 'http.request', 'body': body[middle:], 'more_body': False},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await asgi_app(scope, receive, send)
+
+    asyncio.get_event_loop().run_until_complete(run())
+    start, parts = sent[0], sent[1:]
+    assert start['type'] == 'http.response.start'
+    assert parts[-1].get('more_body', False) is False
+    return (start['status'], {name.decode(): value.decode() for name, value in start['headers']},
+            b''.join(part.get('body', b'') for part in parts))
+
+
+@pytest.fixture
+def asgi_app(app):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    asgi_app = AsyncApp(app, create_async_db_engine(app))
+    yield asgi_app
+    loop.run_until_complete(asgi_app.engine.dispose())
+    asgi_app.executor.shutdown()
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def test_asgi_and_wsgi_give_the_same_responses(app, login, asgi_app, monkeypatch):
+    alice, alice_id = login(app, 'alice')
+    _, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+
+    # A write, with a body, goes through the WSGI bridge
+    body = json.dumps({'description': 'Dinner', 'amount': 12.5, 'split_with': [alice_id, bob_id]}).encode()
+    status, headers, created = asgi_request(asgi_app, alice, 'POST', f'/api/expenses/group/{group_id}',
+                                            body=body, content_type='application/json')
+    assert status == 201
+    assert json.loads(created)['expense']['amount'] == 12.5
+
+    bridged = []
+    call_flask = asgi_app._call_flask
+
+    async def record_bridged(scope, receive, send):
+        bridged.append(scope['path'])
+        await call_flask(scope, receive, send)
+    monkeypatch.setattr(asgi_app, '_call_flask', record_bridged)
+
+    for path, query, native in [
+        (f'/api/groups/{group_id}/expenses', 'limit=1', False),
+        ('/api/groups/users', '', False),
+        (f'/api/groups/{group_id}', '', True),
+        ('/api/groups/', 'include_members=true', True),
+        ('/api/dashboard', '', True),
+    ]:
+        expected = alice.get(path, query_string=query)
+        del bridged[:]
+        status, headers, body = asgi_request(asgi_app, alice, 'GET', path, query=query)
+        assert bridged == ([] if native else [path])
+        assert status == expected.status_code, path
+        assert json.loads(body) == expected.json, path
+        assert headers['content-type'] == expected.headers['Content-Type'], path
+        assert headers.get('etag') == expected.headers.get('ETag'), path
+
+
+def test_asgi_passes_flask_errors_through(app, asgi_app):
+    client = app.test_client()
+    expected = client.get('/api/groups/1')
+    status, _, body = asgi_request(asgi_app, client, 'GET', '/api/groups/1')
+    assert status == expected.status_code
+    assert body == expected.data
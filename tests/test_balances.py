@@ -0,0 +1,53 @@
+import pytest
+
+from app.extensions import db
+from app.models import Group
+
+
+@pytest.mark.parametrize('use_ledger', [True, False])
+def test_member_balances_do_not_depend_on_the_ledger(app, login, use_ledger):
+    alice, alice_id = login(app, 'alice')
+    bob, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+    alice.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Dinner', 'amount': 10, 'split_with': [alice_id, bob_id]
+    })
+    bob.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Taxi', 'amount': 4, 'split_with': [alice_id, bob_id]
+    })
+
+    app.config['BALANCE_LEDGER'] = use_ledger
+    with app.app_context():
+        balances = db.session.get(Group, group_id).get_member_balances()
+
+    # Gross per direction, netted only in the details
+    assert (balances[alice_id]['owes'], balances[alice_id]['owed']) == (2, 5)
+    assert (balances[bob_id]['owes'], balances[bob_id]['owed']) == (5, 2)
+    assert balances[alice_id]['details'] == {bob_id: 3}
+    assert balances[bob_id]['details'] == {alice_id: -3}
+
+
+@pytest.mark.parametrize('use_ledger', [True, False])
+def test_settle_plan_nets_each_member(app, login, use_ledger):
+    app.config['BALANCE_LEDGER'] = use_ledger
+    alice, alice_id = login(app, 'alice')
+    bob, bob_id = login(app, 'bob')
+    carol, carol_id = login(app, 'carol')
+    group_id = alice.post('/api/groups/create', json={
+        'name': 'Trip', 'members': [bob_id, carol_id]
+    }).json['data']['id']
+    alice.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Hotel', 'amount': 30, 'split_with': [alice_id, bob_id, carol_id]
+    })
+    bob.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Taxi', 'amount': 6, 'split_with': [bob_id, carol_id]
+    })
+
+    response = carol.get(f'/api/groups/{group_id}/settle-plan')
+
+    assert response.status_code == 200
+    # Alice is owed 20, Bob owes 10 - 3, Carol owes 10 + 3
+    assert sorted(
+        (transfer['from']['username'], transfer['to']['username'], transfer['amount'])
+        for transfer in response.json['data']['transfers']
+    ) == [('bob', 'alice', 7.0), ('carol', 'alice', 13.0)]
@@ -0,0 +1,19 @@
+from app import events
+
+
+def test_head_request_releases_its_subscription(make_app, login):
+    app = make_app(EVENTS_MAX_SUBSCRIBERS=3)
+    client, _ = login(app, 'alice')
+    group_id = client.post('/api/groups/create', json={'name': 'Trip'}).json['data']['id']
+
+    for _ in range(5):
+        response = client.head(f'/api/groups/{group_id}/events')
+        assert response.status_code == 200
+        response.close()
+        assert events.get_hub().stats()['subscribers'] == 0
+
+    response = client.get(f'/api/groups/{group_id}/events', buffered=False)
+    assert response.status_code == 200
+    assert events.get_hub().stats()['subscribers'] == 1
+    response.close()
+    assert events.get_hub().stats()['subscribers'] == 0
@@ -0,0 +1,67 @@
+import warnings
+
+import pytest
+from sqlalchemy.exc import SAWarning
+
+from app.extensions import db
+from app.models import ExpenseSplit
+
+
+@pytest.fixture
+def expense(app, login):
+    """Alice pays 10 split with Bob; returns ``(alice, bob, group_id, expense_id, ids)``."""
+    alice, alice_id = login(app, 'alice')
+    bob, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+    response = alice.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Dinner', 'amount': 10, 'split_with': [alice_id, bob_id]
+    })
+    return alice, bob, group_id, response.json['expense']['id'], (alice_id, bob_id)
+
+
+def split_users(app, expense_id):
+    with app.app_context():
+        return sorted(user_id for (user_id,) in
+                      db.session.query(ExpenseSplit.user_id).filter_by(expense_id=expense_id))
+
+
+def test_delete_expense_deletes_splits_once(app, expense):
+    alice, _, _, expense_id, _ = expense
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', SAWarning)
+        response = alice.delete(f'/api/expenses/{expense_id}')
+    assert response.status_code == 200
+    assert split_users(app, expense_id) == []
+
+
+def test_update_splits_replaces_splits_once(app, expense, monkeypatch):
+    alice, _, _, expense_id, (alice_id, bob_id) = expense
+    # The form posts a real token; the check itself is not under test
+    monkeypatch.setattr('app.expenses.validate_csrf', lambda token: None)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', SAWarning)
+        response = alice.put(f'/api/expenses/{expense_id}/splits', data={'member_ids[]': [bob_id]})
+    assert response.status_code == 302
+    assert split_users(app, expense_id) == [bob_id]
+
+
+@pytest.mark.parametrize('path', ['/api/expenses/{expense_id}/settle',
+                                  '/api/groups/{group_id}/expenses/{expense_id}/settle'])
+def test_settling_twice_writes_once(app, expense, path):
+    _, bob, group_id, expense_id, (_, bob_id) = expense
+    path = path.format(group_id=group_id, expense_id=expense_id)
+
+    assert bob.post(path).status_code == 200
+    with app.app_context():
+        settled_at = ExpenseSplit.query.filter_by(expense_id=expense_id, user_id=bob_id).one().settled_at
+    version = bob.get(f'/api/groups/{group_id}/changes?since=0').json['data']['version']
+
+    response = bob.post(path)
+
+    assert response.status_code == 200
+    assert response.json['message'] == 'Expense already settled'
+    log = bob.get(f'/api/groups/{group_id}/changes?since=0').json['data']
+    assert log['version'] == version
+    assert [change['kind'] for change in log['changes']].count('split_settled') == 1
+    with app.app_context():
+        assert ExpenseSplit.query.filter_by(expense_id=expense_id, user_id=bob_id).one().settled_at == settled_at
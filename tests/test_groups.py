@@ -0,0 +1,66 @@
+def test_group_expenses_pages_follow_the_group_view(app, login):
+    alice, alice_id = login(app, 'alice')
+    _, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+    for number in range(25):
+        alice.post(f'/api/expenses/group/{group_id}', json={
+            'description': f'Expense {number}', 'amount': 1 + number, 'split_with': [alice_id, bob_id]
+        })
+
+    # What the group page does: the view's first page, then the cursor
+    view = alice.get(f'/api/groups/{group_id}').json
+    ids = [expense['id'] for expense in view['expenses']]
+    cursor = view['next_cursor']
+    while cursor:
+        page = alice.get(f'/api/groups/{group_id}/expenses?limit=7&cursor={cursor}').json['data']
+        ids += [expense['id'] for expense in page['expenses']]
+        cursor = page['next_cursor']
+
+    assert len(view['expenses']) == app.config['EXPENSES_PER_PAGE']
+    assert sorted(ids) == sorted(set(ids))
+    assert len(ids) == 25
+
+
+def test_group_listing_counts_members_without_listing_them(app, login):
+    alice, _ = login(app, 'alice')
+    _, bob_id = login(app, 'bob')
+    alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]})
+
+    group, = alice.get('/api/groups/').json['data']['groups']
+    assert group['member_count'] == 2
+    assert 'members' not in group
+
+    group, = alice.get('/api/groups/?include_members=true').json['data']['groups']
+    assert group['member_count'] == 2
+    assert sorted(member['username'] for member in group['members']) == ['alice', 'bob']
+
+
+def test_user_directory_pages_cover_every_user(app, login):
+    alice, _ = login(app, 'alice')
+    for number in range(app.config['USERS_PER_PAGE'] + 5):
+        login(app, f'user{number}')
+
+    # What the add-member picker does: the first page, then the cursor
+    page = alice.get('/api/groups/users').json['data']
+    usernames = [user['username'] for user in page['users']]
+    while page['next_cursor']:
+        page = alice.get(f"/api/groups/users?limit=100&cursor={page['next_cursor']}").json['data']
+        usernames += [user['username'] for user in page['users']]
+
+    assert len(usernames) == app.config['USERS_PER_PAGE'] + 6
+    assert len(set(usernames)) == len(usernames)
+
+
+def test_new_group_syncs_from_version_zero(app, login):
+    alice, _ = login(app, 'alice')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'currency': 'EUR'}).json['data']['id']
+
+    response = alice.get(f'/api/groups/{group_id}/changes?since=0')
+
+    assert response.status_code == 200
+    data = response.json['data']
+    assert data['version'] == 1
+    assert [(change['seq'], change['kind'], change['entity_id'], change['data']) for change in data['changes']] == [
+        (1, 'group_created', group_id, {'name': 'Trip', 'currency': 'EUR'})
+    ]
+    assert alice.get(f'/api/groups/{group_id}/changes?since=1').json['data']['changes'] == []
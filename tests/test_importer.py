@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from app import expense_service
+from app.models import Expense
+
+
+@pytest.fixture
+def group(app, login):
+    """Alice's group with Bob; returns ``(alice, group_id, member_ids)``."""
+    alice, alice_id = login(app, 'alice')
+    _, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+    return alice, group_id, (alice_id, bob_id)
+
+
+def ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+
+def expense_count(app, group_id):
+    with app.app_context():
+        return Expense.query.filter_by(group_id=group_id).count()
+
+
+def post(client, group_id, body, content_type, chunk_size=2):
+    return client.post(f'/api/expenses/group/{group_id}/bulk?chunk_size={chunk_size}',
+                       data=body, content_type=content_type)
+
+
+def test_csv_import(app, group):
+    alice, group_id, (alice_id, bob_id) = group
+    body = 'description,amount,split_with\n' + ''.join(
+        f'Expense {number},{number + 1}.50,{alice_id};{bob_id}\n' for number in range(5))
+
+    response = post(alice, group_id, body.encode(), 'text/csv')
+
+    assert response.status_code == 201
+    assert response.json['data']['imported'] == 5
+    assert response.json['data']['stopped'] is None
+    assert expense_count(app, group_id) == 5
+
+
+def test_ndjson_import(app, group):
+    alice, group_id, member_ids = group
+    rows = [{'description': f'Expense {number}', 'amount': number + 1, 'split_with': list(member_ids)}
+            for number in range(5)]
+
+    response = post(alice, group_id, ndjson(rows), 'application/x-ndjson')
+
+    assert response.status_code == 201
+    assert response.json['data']['imported'] == 5
+    assert expense_count(app, group_id) == 5
+
+
+@pytest.mark.parametrize('amount', ['1e30', 1e30, 'NaN', 'abc'])
+def test_bad_row_in_a_later_chunk_is_skipped(app, group, amount):
+    alice, group_id, member_ids = group
+    rows = [{'description': f'Expense {number}', 'amount': 10, 'split_with': list(member_ids)}
+            for number in range(6)]
+    rows[4]['amount'] = amount
+
+    response = post(alice, group_id, ndjson(rows), 'application/x-ndjson')
+
+    assert response.status_code == 201
+    assert response.json['data']['imported'] == 5
+    assert response.json['data']['errors'] == [{'row': 5, 'error': 'Invalid amount'}]
+    assert expense_count(app, group_id) == 5
+
+
+def test_body_that_stops_being_utf8_reports_the_committed_rows(app, group):
+    alice, group_id, member_ids = group
+    rows = [{'description': f'Expense {number}', 'amount': 10, 'split_with': list(member_ids)}
+            for number in range(1000)]
+
+    # Decoding goes a buffer at a time, so the bad byte has to come after
+    # several buffers' worth of rows
+    response = post(alice, group_id, ndjson(rows) + b'\xff\xfe\n', 'application/x-ndjson', chunk_size=50)
+
+    imported = response.json['data']['imported']
+    assert response.status_code == 207
+    assert response.json['status'] == 'partial'
+    assert 0 < imported < 1000
+    assert imported % 50 == 0
+    assert response.json['data']['stopped'] == {
+        'row': imported + 1, 'reason': 'encoding', 'error': 'Request body must be UTF-8'
+    }
+    assert expense_count(app, group_id) == imported
+
+
+def test_chunk_that_fails_to_insert_reports_the_committed_rows(app, group, monkeypatch):
+    alice, group_id, member_ids = group
+    rows = [{'description': f'Expense {number}', 'amount': 10, 'split_with': list(member_ids)}
+            for number in range(6)]
+    create_expenses = expense_service.create_expenses
+    calls = []
+
+    def fail_second_chunk(group, entries):
+        calls.append(entries)
+        if len(calls) == 2:
+            raise OverflowError('Python int too large to convert to SQLite INTEGER')
+        return create_expenses(group, entries)
+    monkeypatch.setattr(expense_service, 'create_expenses', fail_second_chunk)
+
+    response = post(alice, group_id, ndjson(rows), 'application/x-ndjson')
+
+    assert response.status_code == 207
+    assert response.json['data']['imported'] == 2
+    assert response.json['data']['stopped'] == {'row': 3, 'reason': 'error', 'error': 'Import failed'}
+    assert expense_count(app, group_id) == 2
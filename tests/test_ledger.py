@@ -0,0 +1,86 @@
+"""The incrementally maintained ledger against a full rebuild."""
+import pytest
+
+from app import ledger
+from app.extensions import db
+from app.models import BalanceLedger
+
+
+def ledger_rows(group_id):
+    # Pairs that netted out may keep a zero row; a rebuild writes none
+    return {
+        (row.creditor_id, row.debtor_id): row.net_amount
+        for row in BalanceLedger.query.filter_by(group_id=group_id)
+        if row.net_amount
+    }
+
+
+def assert_matches_rebuild(app, group_id):
+    with app.app_context():
+        maintained = ledger_rows(group_id)
+        ledger.rebuild(group_id)
+        rebuilt = ledger_rows(group_id)
+        db.session.rollback()
+    assert maintained == rebuilt
+
+
+@pytest.fixture
+def trip(app, login, monkeypatch):
+    """Alice, Bob and Carol in one group; returns their clients, ids and the group id."""
+    # update_splits checks a form token; the check itself is not under test
+    monkeypatch.setattr('app.expenses.validate_csrf', lambda token: None)
+    clients, ids = zip(*(login(app, name) for name in ('alice', 'bob', 'carol')))
+    group_id = clients[0].post('/api/groups/create', json={
+        'name': 'Trip', 'members': list(ids[1:])
+    }).json['data']['id']
+    return clients, ids, group_id
+
+
+def add(client, group_id, amount, split_with):
+    response = client.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Expense', 'amount': amount, 'split_with': split_with
+    })
+    assert response.status_code == 201, response.json
+    return response.json['expense']['id']
+
+
+def test_ledger_matches_rebuild_through_every_write_path(app, trip):
+    (alice, bob, carol), (alice_id, bob_id, carol_id), group_id = trip
+
+    dinner = add(alice, group_id, 10, [alice_id, bob_id, carol_id])
+    taxi = add(bob, group_id, 7.5, [alice_id, bob_id])
+    hotel = add(carol, group_id, 100, [alice_id, bob_id, carol_id])
+    assert_matches_rebuild(app, group_id)
+
+    response = alice.put(f'/api/expenses/{dinner}/splits', data={'member_ids[]': [bob_id, carol_id]})
+    assert response.status_code == 302
+    assert_matches_rebuild(app, group_id)
+
+    assert bob.post(f'/api/expenses/{dinner}/settle').status_code == 200
+    assert_matches_rebuild(app, group_id)
+
+    assert alice.post(f'/api/groups/{group_id}/expenses/{hotel}/settle').status_code == 200
+    assert_matches_rebuild(app, group_id)
+
+    # Re-splitting an expense with a settled split
+    response = alice.put(f'/api/expenses/{dinner}/splits', data={'member_ids[]': [alice_id, bob_id]})
+    assert response.status_code == 302
+    assert_matches_rebuild(app, group_id)
+
+    assert bob.delete(f'/api/expenses/{taxi}').status_code == 200
+    assert_matches_rebuild(app, group_id)
+
+    assert carol.delete(f'/api/expenses/{hotel}').status_code == 200
+    assert_matches_rebuild(app, group_id)
+
+
+def test_ledger_matches_rebuild_after_a_bulk_import(app, trip):
+    (alice, _, _), ids, group_id = trip
+    body = ''.join(f'{{"description": "Row {number}", "amount": {number + 1}.01, '
+                   f'"split_with": [{ids[0]}, {ids[1 + number % 2]}]}}\n' for number in range(10))
+
+    response = alice.post(f'/api/expenses/group/{group_id}/bulk?chunk_size=3',
+                          data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    assert_matches_rebuild(app, group_id)
@@ -0,0 +1,184 @@
+"""Alembic revisions run against databases in the shape they expect."""
+import os
+import sqlite3
+
+import flask_migrate
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from app.extensions import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+
+# Tables as they were at revision 8d2a4b6e0f13, before the ledger and
+# integer minor units
+FLOAT_SCHEMA = """
+    CREATE TABLE user (
+        id INTEGER NOT NULL, username VARCHAR(64) NOT NULL, email VARCHAR(120) NOT NULL,
+        password_hash VARCHAR(256),
+        PRIMARY KEY (id)
+    );
+    CREATE TABLE "group" (
+        id INTEGER NOT NULL, name VARCHAR(64) NOT NULL, description VARCHAR(256),
+        created_by_id INTEGER NOT NULL, currency VARCHAR(3) NOT NULL,
+        created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT fk_group_creator_id FOREIGN KEY(created_by_id) REFERENCES user (id)
+    );
+    CREATE TABLE group_members (
+        user_id INTEGER NOT NULL, group_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, group_id),
+        CONSTRAINT fk_group_members_user_id FOREIGN KEY(user_id) REFERENCES user (id),
+        CONSTRAINT fk_group_members_group_id FOREIGN KEY(group_id) REFERENCES "group" (id)
+    );
+    CREATE TABLE expense (
+        id INTEGER NOT NULL, description VARCHAR(255) NOT NULL, amount FLOAT NOT NULL,
+        date DATETIME NOT NULL, group_id INTEGER NOT NULL, payer_id INTEGER NOT NULL,
+        currency VARCHAR(3) NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(group_id) REFERENCES "group" (id) ON DELETE CASCADE,
+        FOREIGN KEY(payer_id) REFERENCES user (id) ON DELETE CASCADE
+    );
+    CREATE TABLE expense_split (
+        id INTEGER NOT NULL, expense_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        amount FLOAT NOT NULL, is_settled BOOLEAN, settled_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(expense_id) REFERENCES expense (id) ON DELETE CASCADE,
+        FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE,
+        CONSTRAINT ck_expense_split_amount_positive CHECK (amount >= 0)
+    );
+    CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL PRIMARY KEY);
+    INSERT INTO alembic_version VALUES ('8d2a4b6e0f13');
+
+    INSERT INTO user (id, username, email) VALUES (1, 'alice', 'a@x'), (2, 'bob', 'b@x');
+    INSERT INTO "group" (id, name, created_by_id, currency) VALUES (1, 'Trip', 1, 'USD'), (2, 'Tokyo', 1, 'JPY');
+    INSERT INTO expense (id, description, amount, date, group_id, payer_id, currency) VALUES
+        (1, 'Dinner', 12.34, '2026-01-01', 1, 1, 'USD'),
+        (2, 'Sushi', 3001, '2026-01-02', 2, 2, 'JPY'),
+        (3, 'Taxi', 10.01, '2026-01-03', 1, 2, 'usd');
+    INSERT INTO expense_split (id, expense_id, user_id, amount, is_settled) VALUES
+        (1, 1, 1, 6.17, 0), (2, 1, 2, 6.17, 0),
+        (3, 2, 1, 1500.5, 0), (4, 2, 2, 1500.5, 0),
+        (5, 3, 1, 5.005, 1), (6, 3, 2, 5.005, 0);
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    connection = sqlite3.connect(path)
+    connection.executescript(FLOAT_SCHEMA)
+    connection.close()
+    return path
+
+
+@pytest.fixture
+def migrate(database):
+    """Return ``migrate(revision)``, which upgrades or downgrades ``database`` to it."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + database
+    db.init_app(app)
+    flask_migrate.Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        # As the app runs: foreign keys enforced, so cascades would show
+        event.listen(db.engine, 'connect',
+                     lambda connection, record: connection.execute('PRAGMA foreign_keys=ON'))
+
+    def migrate(revision, down=False):
+        with app.app_context():
+            (flask_migrate.downgrade if down else flask_migrate.upgrade)(MIGRATIONS, revision)
+            db.engine.dispose()
+    return migrate
+
+
+def query(database, sql):
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+def columns(database, table):
+    return {row[1]: row for row in query(database, f'PRAGMA table_info("{table}")')}
+
+
+def test_ledger_table_is_created_with_its_index(database, migrate):
+    migrate('c1a8f5d3b702')
+
+    assert set(columns(database, 'balance_ledger')) == {'group_id', 'creditor_id', 'debtor_id', 'net_amount'}
+    assert query(database, "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'balance_ledger' "
+                           "AND sql IS NOT NULL") == [('ix_balance_ledger_creditor_id',)]
+
+    migrate('8d2a4b6e0f13', down=True)
+    assert columns(database, 'balance_ledger') == {}
+
+
+def test_expand_backfills_minor_units_in_each_currency(database, migrate):
+    migrate('b7e4c1d95a20')
+
+    assert query(database, 'SELECT id, amount_minor FROM expense ORDER BY id') == [(1, 1234), (2, 3001), (3, 1001)]
+    assert query(database, 'SELECT id, amount_minor FROM expense_split ORDER BY id') == [
+        (1, 617), (2, 617), (3, 1501), (4, 1501), (5, 501), (6, 501)
+    ]
+
+
+def test_expand_keeps_rows_written_by_the_old_release_in_sync(database, migrate):
+    migrate('b7e4c1d95a20')
+
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute("INSERT INTO expense (id, description, amount, date, group_id, payer_id, currency) "
+                           "VALUES (4, 'Hotel', 99.99, '2026-01-04', 1, 1, 'USD')")
+        connection.execute('INSERT INTO expense_split (id, expense_id, user_id, amount) VALUES (7, 4, 2, 49.995)')
+        connection.execute('UPDATE expense SET amount = 7.5 WHERE id = 1')
+    connection.close()
+
+    assert query(database, 'SELECT amount_minor FROM expense WHERE id IN (1, 4) ORDER BY id') == [(750,), (9999,)]
+    assert query(database, 'SELECT amount_minor FROM expense_split WHERE id = 7') == [(5000,)]
+
+
+def test_contract_drops_floats_and_rebuilds_the_ledger(database, migrate):
+    migrate('e2a9f4c8d6b1')
+
+    expense = columns(database, 'expense')
+    split = columns(database, 'expense_split')
+    assert 'amount' not in expense and 'amount' not in split
+    # notnull flag of PRAGMA table_info
+    assert expense['amount_minor'][3] == 1 and split['amount_minor'][3] == 1
+    assert columns(database, 'balance_ledger')['net_amount'][2] == 'BIGINT'
+    assert query(database, "SELECT name FROM sqlite_master WHERE type = 'trigger'") == []
+
+    # Recreating expense must not cascade into its splits
+    assert query(database, 'SELECT COUNT(*) FROM expense_split') == [(6,)]
+    # Expense 3 adds nothing: one split is the payer's, the other settled
+    assert query(database, 'SELECT group_id, creditor_id, debtor_id, net_amount FROM balance_ledger '
+                           'ORDER BY group_id, creditor_id') == [
+        (1, 1, 2, 617), (1, 2, 1, -617), (2, 1, 2, -1501), (2, 2, 1, 1501)
+    ]
+
+
+def test_contract_and_expand_downgrade_back_to_floats(database, migrate):
+    migrate('e2a9f4c8d6b1')
+    migrate('8d2a4b6e0f13', down=True)
+
+    assert 'amount_minor' not in columns(database, 'expense')
+    assert 'amount_minor' not in columns(database, 'expense_split')
+    assert query(database, 'SELECT id, amount FROM expense ORDER BY id') == [(1, 12.34), (2, 3001.0), (3, 10.01)]
+    assert query(database, 'SELECT COUNT(*) FROM expense_split') == [(6,)]
+
+
+def test_contract_downgrade_lets_the_previous_release_write_again(database, migrate):
+    migrate('e2a9f4c8d6b1')
+    migrate('b7e4c1d95a20', down=True)
+
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute("INSERT INTO expense (id, description, amount, date, group_id, payer_id, currency) "
+                           "VALUES (4, 'Hotel', 99.99, '2026-01-04', 1, 1, 'USD')")
+        connection.execute('INSERT INTO expense_split (id, expense_id, user_id, amount) VALUES (7, 4, 2, 49.99)')
+    connection.close()
+
+    assert query(database, 'SELECT amount_minor FROM expense WHERE id = 4') == [(9999,)]
+    assert query(database, 'SELECT amount_minor FROM expense_split WHERE id = 7') == [(4999,)]
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import pytest
+
+from app import money
+
+
+@pytest.mark.parametrize('amount, currency, minor', [
+    (12.34, 'USD', 1234),
+    ('12.345', 'USD', 1235),
+    ('12.344', 'USD', 1234),
+    ('0.005', 'EUR', 1),
+    ('-0.005', 'EUR', -1),
+    (Decimal('1.5'), 'JPY', 2),
+    ('1000', 'jpy', 1000),
+    ('1.2345', 'KWD', 1235),
+    (7, None, 700),
+    # Floats go through their shortest repr, not their binary value
+    (0.1 + 0.2, 'USD', 30),
+    (2.675, 'USD', 268),
+])
+def test_to_minor_rounds_half_up_in_the_currency_exponent(amount, currency, minor):
+    assert money.to_minor(amount, currency) == minor
+
+
+@pytest.mark.parametrize('amount', [None, '', 'abc', '1,5', [], 'NaN', 'Infinity', float('inf'), float('nan')])
+def test_to_minor_rejects_non_numbers(amount):
+    with pytest.raises(ValueError):
+        money.to_minor(amount, 'USD')
+
+
+@pytest.mark.parametrize('amount', ['1e30', 1e30, '1e17', 10 ** 17, 99999999999999999999, '-1e17', '1e999999'])
+def test_to_minor_rejects_amounts_out_of_range(amount):
+    with pytest.raises(ValueError):
+        money.to_minor(amount, 'USD')
+
+
+def test_to_minor_accepts_up_to_max_minor():
+    assert money.to_minor(money.MAX_MINOR, 'JPY') == money.MAX_MINOR
+    assert money.to_minor(money.MAX_MINOR / 100, 'USD') == money.MAX_MINOR
+    with pytest.raises(ValueError):
+        money.to_minor(money.MAX_MINOR + 1, 'JPY')
+    # Sums of many maximal amounts still fit a 64-bit column
+    assert money.MAX_MINOR * 1000 < 2 ** 63
+
+
+@pytest.mark.parametrize('minor, currency, amount', [
+    (1234, 'USD', 12.34),
+    (-5, 'USD', -0.05),
+    (1000, 'JPY', 1000),
+    (1235, 'KWD', 1.235),
+    (None, 'USD', 0.0),
+])
+def test_to_major(minor, currency, amount):
+    assert money.to_major(minor, currency) == amount
+
+
+def test_to_major_is_an_int_for_currencies_without_decimals():
+    assert isinstance(money.to_major(1000, 'JPY'), int)
+
+
+@pytest.mark.parametrize('total, parts, shares', [
+    (1000, 3, [334, 333, 333]),
+    (1001, 3, [334, 334, 333]),
+    (999, 3, [333, 333, 333]),
+    (1, 3, [1, 0, 0]),
+    (0, 2, [0, 0]),
+    (5, 1, [5]),
+])
+def test_allocate_spreads_the_remainder_over_the_first_shares(total, parts, shares):
+    assert money.allocate(total, parts) == shares
+    assert sum(shares) == total
+
+
+def test_allocate_needs_at_least_one_part():
+    with pytest.raises(ValueError):
+        money.allocate(100, 0)
+
+
+@pytest.mark.parametrize('amount', ['1e30', 1e30, 99999999999999999999, 1e17, 'NaN'])
+def test_add_expense_rejects_invalid_amounts(app, login, amount):
+    alice, alice_id = login(app, 'alice')
+    _, bob_id = login(app, 'bob')
+    group_id = alice.post('/api/groups/create', json={'name': 'Trip', 'members': [bob_id]}).json['data']['id']
+
+    response = alice.post(f'/api/expenses/group/{group_id}', json={
+        'description': 'Dinner', 'amount': amount, 'split_with': [alice_id, bob_id]
+    })
+
+    assert response.status_code == 400
+    assert response.json == {'error': 'Invalid amount'}
@@ -0,0 +1,82 @@
+"""Query budgets of the group endpoints; N+1 regressions fail here."""
+import pytest
+
+from app.extensions import db
+from app.testing import assert_max_queries, count_queries
+
+VIEW_GROUP_BUDGET = 8
+GET_GROUPS_BUDGET = 5
+
+
+@pytest.fixture
+def seed(app, login):
+    """Return ``seed(members, expenses)``: a logged-in client and a group of that size."""
+    counter = iter(range(1000))
+
+    def seed(members, expenses):
+        prefix = f'u{next(counter)}'
+        client, user_id = login(app, prefix)
+        others = [login(app, f'{prefix}m{index}') for index in range(members - 1)]
+        member_ids = [user_id] + [member_id for _, member_id in others]
+        group_id = client.post('/api/groups/create', json={
+            'name': 'Trip', 'members': member_ids[1:]
+        }).json['data']['id']
+        for number in range(expenses):
+            response = client.post(f'/api/expenses/group/{group_id}', json={
+                'description': f'Expense {number}',
+                'amount': 10 + number,
+                # Rotate through subsets so splits vary per expense
+                'split_with': member_ids[:2 + number % (members - 1)]
+            })
+            assert response.status_code == 201, response.json
+            expense_id = response.json['expense']['id']
+        # Settled splits take the same paths as open ones
+        member = others[0][0]
+        response = member.post(f'/api/expenses/{expense_id}/settle')
+        assert response.status_code == 200, response.json
+        return client, group_id
+    return seed
+
+
+@pytest.fixture
+def engine(app):
+    # Counted outside an app context, so each request gets its own session
+    with app.app_context():
+        return db.engine
+
+
+def queries(engine, call):
+    with count_queries(engine) as statements:
+        response = call()
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_view_group_budget(seed, engine):
+    client, group_id = seed(members=5, expenses=12)
+    with assert_max_queries(VIEW_GROUP_BUDGET, engine):
+        response = client.get(f'/api/groups/{group_id}')
+    assert response.status_code == 200
+    assert len(response.json['expenses']) == 10
+
+
+@pytest.mark.parametrize('include_members', ['false', 'true'])
+def test_get_groups_budget(seed, engine, include_members):
+    client, _ = seed(members=5, expenses=12)
+    with assert_max_queries(GET_GROUPS_BUDGET, engine):
+        response = client.get(f'/api/groups/?include_members={include_members}')
+    assert response.status_code == 200
+
+
+def test_query_counts_do_not_grow_with_group_size(seed, engine):
+    small, small_id = seed(members=2, expenses=1)
+    large, large_id = seed(members=6, expenses=25)
+    # A second group for the large client's listing; it invalidates the
+    # cached identity, so refill that before counting
+    large.post('/api/groups/create', json={'name': 'Flat'})
+    large.get('/api/auth/user')
+
+    assert queries(engine, lambda: small.get(f'/api/groups/{small_id}')) == \
+        queries(engine, lambda: large.get(f'/api/groups/{large_id}'))
+    assert queries(engine, lambda: small.get('/api/groups/?include_members=true')) == \
+        queries(engine, lambda: large.get('/api/groups/?include_members=true'))